@@ -9,3 +9,7 @@ ONE_TIME_USE_ACCESS_TOKEN_PARAM_NAME: str = "one-time-use-token"
 ONE_TIME_USE_ACCESS_TOKEN_CACHE_PREFIX: str = "OTUT"
 """Prefix for cache keys containing an one time use token
 """
+
+CHUNK_CHECKSUM_HEADER: str = "x-chunk-sha256"
+"""Header which contains the SHA-256 hex digest of an uploaded chunk
+"""
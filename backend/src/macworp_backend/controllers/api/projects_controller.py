@@ -4,15 +4,14 @@
 from collections import defaultdict
 import json
 from pathlib import Path
-from typing import Optional
+from typing import Any, ClassVar, Dict, List, Optional, Union
 from urllib.parse import unquote
 
 # 3rd party imports
-import pandas as pd
 from flask import make_response, request, jsonify, send_file, Response
 from flask_login import login_required  # type: ignore[import-untyped]
-import pika
-import zipstream  # type: ignore[import-untyped]
+from peewee import Tuple
+from pydantic import ValidationError
 
 # internal imports
 from macworp_utils.constants import (
@@ -22,8 +21,21 @@ from macworp_utils.constants import (
 from macworp_backend.models.workflow import Workflow
 from macworp_backend import app, socketio, db_wrapper as db
 from macworp_backend.models.project import Project, LogProcessingResultType
+from macworp_backend.models.run import Run
 from macworp_backend.utility.configuration import Configuration
+from macworp_backend.utility.directory_listing import DirectoryListing
+from macworp_backend.utility.line_index import LineIndex
+from macworp_backend.utility.progress_emitter import ProgressEmitter
+from macworp_backend.utility.rabbit_mq import RabbitMQPublisherPool
+from macworp_backend.utility.table_cache import ParquetTableReader, TableCache
+from macworp_backend.utility.table_query import TableQuery
+from macworp_backend.utility.table_reader import TableReader
+from macworp_backend.utility.table_statistics import TableStatistics
+from macworp_backend.utility.tar_zstd_stream import TarZstdStream
+from macworp_backend.utility.workflow_log_consumer import WorkflowLogConsumer
+from macworp_backend.utility.zip_stream import ZipStream
 from macworp_backend.errors.unknown_table_format import UnknownTableFormat
+from macworp_backend.errors.unknown_table_columns import UnknownTableColumns
 from macworp_utils.exchange.queued_project import QueuedProject  # type: ignore[import-untyped]
 
 
@@ -32,33 +44,69 @@ class ProjectsController:
     Controller for project endpoints.
     """
 
+    ARCHIVE_FORMATS: ClassVar[List[str]] = ["zip", "tar.zst"]
+    """Supported archive formats for folder downloads"""
+
     @staticmethod
     @app.route("/api/projects")
     @login_required
     def index():
         """
-        Endpoint for listing all project.
+        Endpoint for listing all project, sorted by name.
+
+        Query parameters
+        ----------------
+        cursor : str
+            `next_cursor` of the previous page, optional. Pages are selected by the sort key
+            (keyset pagination), so the latency does not depend on the position.
+        offset : int
+            Number of projects to skip, ignored when `cursor` is given, default: 0
+        limit : int
+            Maximum number of projects per page, default: 50
+        search : str
+            Only projects containing this string in their name (case-insensitive), optional
 
         Returns
         -------
         Response
+            * 200 - JSON object with `projects`, `next_cursor` (null on the last page)
+              and `estimated_total` (estimated number of matching projects)
+            * 422 - on malformed cursor
         """
         offset = request.args.get("offset", 0, type=int)
         limit = request.args.get("limit", 50, type=int)
+        cursor: Optional[str] = request.args.get("cursor", None, type=str)
+        search: Optional[str] = request.args.get("search", None, type=str) or None
         if offset < 0:
             offset = 0
         if limit < 1:
             limit = 1
+
+        query = Project.select_dicts().order_by(Project.name, Project.id)
+        if search is not None:
+            query = query.where(Project.name.contains(search))
+        if cursor is not None:
+            try:
+                query = query.where(
+                    Tuple(Project.name, Project.id) > Tuple(*Project.decode_cursor(cursor))
+                )
+            except ValueError as error:
+                return jsonify({"errors": {"cursor": [str(error)]}}), 422
+        else:
+            query = query.offset(offset)
+
+        # Select one more project to determine if there is a next page
+        projects = list(query.limit(limit + 1))
+        next_cursor: Optional[str] = None
+        if len(projects) > limit:
+            projects = projects[:limit]
+            next_cursor = Project.encode_cursor(projects[-1]["name"], projects[-1]["id"])
+
         return jsonify(
             {
-                "projects": [
-                    project.to_dict()
-                    for project in Project.select()
-                    .order_by(Project.id.desc())
-                    .offset(offset)
-                    .limit(limit)
-                    .order_by(Project.name)
-                ]
+                "projects": projects,
+                "next_cursor": next_cursor,
+                "estimated_total": Project.estimate_count(search),
             }
         )
 
@@ -150,18 +198,33 @@ class ProjectsController:
     @login_required
     def files(id: int):
         """
-        List files
+        List files. Folders are listed before files, both sorted by name.
 
         Parameters
         ----------
         id : int
             Project ID
 
+        URL query parameters
+        --------------------
+        dir : str
+            Directory to list, default: `/`
+        cursor : str
+            Cursor returned as `next_cursor` by the previous page, default: first page
+        limit : int
+            Maximum number of entries (folders and files) per page, default: all entries
+        filter : str
+            Only entries containing this string (case-insensitive), default: no filter
+        with-stats : int
+            If true, size and modification time of each entry is returned in `stats`.
+            Values: 0 == False, >0 == True, default: False
+
         Returns
         -------
         Response
             200 - on success
             404 - when project was not found
+            422 - on malformed cursor or limit
         """
         project: Optional[Project] = Project.get_or_none(Project.id == id)
         if project is None:
@@ -169,18 +232,25 @@ class ProjectsController:
         directory = project.get_path(
             Path(unquote(request.args.get("dir", "/", type=str)))
         )
+        limit: Optional[int] = request.args.get("limit", None, type=int)
+        if limit is not None and limit < 1:
+            return jsonify({"errors": {"limit": ["must be greater than 0"]}}), 422
+        if directory == project.file_directory and not directory.exists():
+            # File directory is created with the first upload
+            return jsonify({"folders": [], "files": [], "next_cursor": None})
         if directory.is_dir() and project.in_file_directory(directory):
-            files = []
-            folders = []
-            for entry in directory.iterdir():
-                if entry.is_dir():
-                    folders.append(entry.name)
-                else:
-                    files.append(entry.name)
-
-            folders.sort()
-            files.sort()
-            return jsonify({"folders": folders, "files": files})
+            try:
+                return jsonify(
+                    DirectoryListing.list(
+                        directory,
+                        cursor=request.args.get("cursor", None, type=str),
+                        limit=limit,
+                        name_filter=request.args.get("filter", None, type=str),
+                        with_stats=request.args.get("with-stats", 0, type=int) > 0,
+                    )
+                )
+            except ValueError as error:
+                return jsonify({"errors": {"cursor": [str(error)]}}), 422
         return jsonify({"errors": {"general": "directory not found"}}), 404
 
     @staticmethod
@@ -381,7 +451,6 @@ class ProjectsController:
             409 - project is already in ignore state
             422 - errors
         """
-        errors = defaultdict(list)
         project: Optional[Project] = Project.get_or_none(Project.id == project_id)
 
         if project is None:
@@ -420,6 +489,216 @@ class ProjectsController:
                 422,
             )
 
+        errors = ProjectsController.validate_workflow_parameters(
+            workflow, workflow_parameters
+        )
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        ProjectsController.write_workflow_history(
+            project, workflow, workflow_parameters
+        )
+
+        ProgressEmitter.start_run(project.id)
+
+        with db.database.atomic() as transaction:
+            project.is_scheduled = True  # type: ignore[assignment]
+            project.save()
+            run = Run.create(
+                project_id=project.id,
+                workflow_id=workflow.id,
+                parameter_hash=Run.hash_parameters(workflow_parameters),
+            )
+            queued_project = QueuedProject(
+                id=project.id,
+                workflow_id=workflow.id,
+                workflow_arguments=workflow_parameters,
+                run_id=run.id,
+            )
+            try:
+                RabbitMQPublisherPool.publish(
+                    Configuration.values()["rabbit_mq"]["project_workflow_queue"],
+                    queued_project.model_dump_json().encode(),
+                )
+            except BaseException as exception:
+                transaction.rollback()
+                raise exception
+        return jsonify({"is_scheduled": project.is_scheduled})
+
+    @staticmethod
+    @app.route("/api/projects/schedule/<int:workflow_id>", methods=["POST"])
+    @login_required
+    def bulk_schedule(workflow_id: int):
+        """
+        Endpoint to schedule many projects with the same workflow and parameters at once.
+        Parameters are validated once, all projects are flagged as scheduled with a single `UPDATE`
+        and all messages are published to RabbitMQ as one confirmed batch. If publishing fails, the scheduling is reverted.
+        Projects which do not exist, are ignored or already scheduled are skipped.
+
+        Parameters
+        ----------
+        workflow_id : int
+            Workflow ID
+
+        Request body
+        ------------
+        JSON object with `project_ids` (list of project IDs) and `workflow_arguments`
+        (workflow parameters, same as the body of `schedule`)
+
+        Returns
+        -------
+        Response
+            200 - JSON object with `scheduled_project_ids` and `skipped_project_ids`
+            404 - workflow not found
+            422 - errors
+        """
+        workflow: Optional[Workflow] = Workflow.get_or_none(Workflow.id == workflow_id)
+        if workflow is None:
+            return (
+                jsonify({"errors": {"general": "workflow not found"}}),
+                404,
+            )
+
+        data = request.json if request.is_json else None
+        if not isinstance(data, dict):
+            return jsonify({"errors": {"general": "body must be a JSON object"}}), 422
+
+        project_ids = data.get("project_ids", None)
+        if (
+            not isinstance(project_ids, list)
+            or len(project_ids) == 0
+            or not all(
+                isinstance(project_id, int) and not isinstance(project_id, bool)
+                for project_id in project_ids
+            )
+        ):
+            return (
+                jsonify({"errors": {"project_ids": ["must be a non-empty list of IDs"]}}),
+                422,
+            )
+
+        workflow_parameters = data.get("workflow_arguments", None)
+        if workflow_parameters is None:
+            return (
+                jsonify({"errors": {"general": "workflow parameters cannot be none"}}),
+                422,
+            )
+        if not isinstance(workflow_parameters, list) or not all(
+            isinstance(param, dict) for param in workflow_parameters
+        ):
+            return (
+                jsonify(
+                    {"errors": {"workflow_arguments": ["must be a list of objects"]}}
+                ),
+                422,
+            )
+        errors = ProjectsController.validate_workflow_parameters(
+            workflow, workflow_parameters
+        )
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        with db.database.atomic():
+            scheduled_project_ids: List[int] = [
+                row.id
+                for row in Project.update(is_scheduled=True)
+                .where(
+                    Project.id.in_(project_ids)
+                    & (Project.is_scheduled == False)  # pylint: disable=singleton-comparison
+                    & (Project.ignore == False)  # pylint: disable=singleton-comparison
+                )
+                .returning(Project.id)
+                .execute()
+            ]
+            parameter_hash = Run.hash_parameters(workflow_parameters)
+            run_ids: List[int] = []
+            if len(scheduled_project_ids) > 0:
+                run_ids = [
+                    row[0]
+                    for row in Run.insert_many(
+                        [
+                            {
+                                "project_id": project_id,
+                                "workflow_id": workflow.id,
+                                "parameter_hash": parameter_hash,
+                            }
+                            for project_id in scheduled_project_ids
+                        ]
+                    )
+                    .returning(Run.id)
+                    .tuples()
+                    .execute()
+                ]
+
+        if len(scheduled_project_ids) > 0:
+            # After the commit, so the file I/O does not prolong the row locks,
+            # but before publishing, otherwise the first events of the new runs might be removed
+            for project_id in scheduled_project_ids:
+                ProgressEmitter.start_run(project_id)
+            try:
+                RabbitMQPublisherPool.publish_batch(
+                    Configuration.values()["rabbit_mq"]["project_workflow_queue"],
+                    [
+                        QueuedProject(
+                            id=project_id,
+                            workflow_id=workflow.id,
+                            workflow_arguments=workflow_parameters,
+                            run_id=run_id,
+                        )
+                        .model_dump_json()
+                        .encode()
+                        for project_id, run_id in zip(scheduled_project_ids, run_ids)
+                    ],
+                )
+            except BaseException as exception:
+                # Nothing was queued, so revert the scheduling
+                with db.database.atomic():
+                    Run.delete().where(Run.id.in_(run_ids)).execute()
+                    Project.update(is_scheduled=False).where(
+                        Project.id.in_(scheduled_project_ids)
+                    ).execute()
+                raise exception
+
+        for project in Project.select().where(Project.id.in_(scheduled_project_ids)):
+            ProjectsController.write_workflow_history(
+                project, workflow, workflow_parameters
+            )
+
+        scheduled_project_id_set = set(scheduled_project_ids)
+        return jsonify(
+            {
+                "scheduled_project_ids": sorted(scheduled_project_ids),
+                "skipped_project_ids": sorted(
+                    {
+                        project_id
+                        for project_id in project_ids
+                        if project_id not in scheduled_project_id_set
+                    }
+                ),
+            }
+        )
+
+    @staticmethod
+    def validate_workflow_parameters(
+        workflow: Workflow, workflow_parameters: List[Dict[str, Any]]
+    ) -> Dict[str, List[str]]:
+        """
+        Checks if all dynamic parameters of the workflow are present and have a value.
+
+        Parameters
+        ----------
+        workflow : Workflow
+            Workflow
+        workflow_parameters : List[Dict[str, Any]]
+            Workflow parameters as send by the client
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            Errors by parameter label, empty if parameters are valid
+        """
+        errors = defaultdict(list)
+
         # Check if arguments are present
         present_params = {
             param["name"]
@@ -433,7 +712,7 @@ class ProjectsController:
                 errors[expected_argument["label"]].append("is missing")
 
         if len(errors) > 0:
-            return jsonify({"errors": errors}), 422
+            return errors
 
         for param in workflow_parameters:
             if param["type"] == "separator":
@@ -441,9 +720,24 @@ class ProjectsController:
             if not "value" in param or "value" in param and param["value"] is None:
                 errors[param["label"]].append("cannot be empty")
 
-        if len(errors) > 0:
-            return jsonify({"errors": errors}), 422
+        return errors
+
+    @staticmethod
+    def write_workflow_history(
+        project: Project, workflow: Workflow, workflow_parameters: List[Dict[str, Any]]
+    ):
+        """
+        Saves the workflow parameters and the last executed workflow in the project's history directory.
 
+        Parameters
+        ----------
+        project : Project
+            Project
+        workflow : Workflow
+            Workflow
+        workflow_parameters : List[Dict[str, Any]]
+            Validated workflow parameters
+        """
         # Save params to cache file
         params_cache_file_path = project.get_workflow_params_cache_file(workflow)
         params_cache_file_path.write_text(
@@ -460,36 +754,9 @@ class ProjectsController:
             project.get_last_executed_workflow_cache_file()
         )
         last_executed_workflow_cache_file_path.write_text(
-            json.dumps({"id": workflow_id})
-        )
-
-        queued_project = QueuedProject(
-            id=project.id,
-            workflow_id=workflow.id,
-            workflow_arguments=workflow_parameters,
+            json.dumps({"id": workflow.id})
         )
 
-        with db.database.atomic() as transaction:
-            project.is_scheduled = True  # type: ignore[assignment]
-            project.save()
-            try:
-                connection = pika.BlockingConnection(
-                    pika.URLParameters(Configuration.values()["rabbit_mq"]["url"])
-                )
-                channel = connection.channel()
-                channel.basic_publish(
-                    exchange="",
-                    routing_key=Configuration.values()["rabbit_mq"][
-                        "project_workflow_queue"
-                    ],
-                    body=queued_project.model_dump_json().encode(),
-                )
-                connection.close()
-            except BaseException as exception:
-                transaction.rollback()
-                raise exception
-        return jsonify({"is_scheduled": project.is_scheduled})
-
     @staticmethod
     @app.route("/api/projects/<int:project_id>/is-ignored", methods=["GET"])
     @login_required
@@ -538,6 +805,7 @@ class ProjectsController:
         project.submitted_processes = 0
         project.completed_processes = 0
         project.save()
+        ProgressEmitter.discard(project.id)
         socketio.emit("finished-project", {}, to=f"project{project.id}")
         return "", 200
 
@@ -547,7 +815,8 @@ class ProjectsController:
     def workflow_log(id: int):
         """
         Endpoint for Nextflow to report log.
-        If log is received, a event is send to the browser with submitted and completed processes.
+        If log is received, the submitted and completed processes are send to the browser,
+        coalesced with other logs of the project, see `ProgressEmitter`.
 
         Parameters
         ----------
@@ -584,21 +853,61 @@ class ProjectsController:
 
         match log_processing_result.type:
             case LogProcessingResultType.PROGRESS | LogProcessingResultType.MESSAGE:
-                socketio.emit(
-                    "new-progress",
-                    {
-                        "submitted_processes": project.submitted_processes,
-                        "completed_processes": project.completed_processes,
-                        "details": log_processing_result.message,
-                    },
-                    to=f"project{project.id}",
+                ProgressEmitter.add(
+                    project.id,
+                    project.submitted_processes,
+                    project.completed_processes,
+                    log_processing_result.message,
                 )
             case LogProcessingResultType.ERROR:
-                socketio.emit(
-                    "error",
-                    {"error_report": log_processing_result.message},
-                    to=f"project{project.id}",
-                )
+                ProgressEmitter.error(project.id, log_processing_result.message)
+        return "", 200
+
+    @staticmethod
+    @app.route("/api/projects/<int:id>/workflow-logs", methods=["POST"])
+    @login_required
+    def workflow_logs(id: int):
+        """
+        Endpoint for the worker's log proxy to report many logs of one project at once.
+        Process counters are updated with a single `UPDATE`, afterwards the same events as
+        for `workflow_log` are send to the browser for each log.
+
+        Parameters
+        ----------
+        id : int
+            ID of project
+
+        Request body
+        ------------
+        JSON object with `logs`, a list of log objects in order of creation
+
+        Returns
+        -------
+        Response
+            200 - emtpy, on success
+            404 - project not found
+            422 - on errors
+        """
+        data = request.json if request.is_json else None
+        logs = data.get("logs", None) if isinstance(data, dict) else None
+        if not isinstance(logs, list) or not all(isinstance(log, dict) for log in logs):
+            return (
+                jsonify({"errors": {"logs": ["must be a list of JSON objects"]}}),
+                422,
+            )
+        try:
+            workflow_engine = SupportedWorkflowEngine.from_str(
+                request.headers.get(WEBLOG_WORKFLOW_ENGINE_HEADER, "")
+            )
+        except ValueError as error:
+            return (
+                jsonify({"errors": {WEBLOG_WORKFLOW_ENGINE_HEADER: [str(error)]}}),
+                422,
+            )
+        if not Project.select().where(Project.id == id).exists():
+            return jsonify({"errors": {"general": "project not found"}}), 404
+
+        WorkflowLogConsumer.apply_logs([(id, workflow_engine, log) for log in logs])
         return "", 200
 
     @staticmethod
@@ -631,6 +940,14 @@ class ProjectsController:
         is-table: : int
             If true, the table-file will be returned as JSON table, see: Pandas documentation `DataFrame.to_json(orient="split")`
             Values: 0 == False, >0 == True, default: False
+        offset : int
+            Only with `is-table`. Index of the first row to return, default: 0
+        limit : int
+            Only with `is-table`. Maximum number of rows to return, default: all rows
+        columns : str
+            Only with `is-table`. Comma separated list of columns to return, default: all columns
+        format : str
+            Only for folders. Archive format, `zip` or `tar.zst`, default: `zip`
         """
         # Get project
         project: Optional[Project] = Project.get_or_none(Project.id == project_id)
@@ -655,8 +972,20 @@ class ProjectsController:
             if not is_table:
                 response = ProjectsController.file_download(path_to_download, is_inline)
             else:
+                offset: Optional[int] = request.args.get("offset", None, type=int)
+                limit: Optional[int] = request.args.get("limit", None, type=int)
+                columns_arg: Optional[str] = request.args.get("columns", None, type=str)
+                if offset is not None and offset < 0:
+                    return jsonify({"errors": {"offset": ["must be positive"]}}), 422
+                if limit is not None and limit < 1:
+                    return jsonify({"errors": {"limit": ["must be greater than 0"]}}), 422
                 try:
-                    response = ProjectsController.table_download(path_to_download)
+                    response = ProjectsController.table_download(
+                        ProjectsController.open_table(project, path_to_download),
+                        offset if offset is not None else 0,
+                        limit,
+                        columns_arg.split(",") if columns_arg else None,
+                    )
                 except UnknownTableFormat as error:
                     return (
                         jsonify(
@@ -668,6 +997,19 @@ class ProjectsController:
                         ),
                         422,
                     )
+                except UnknownTableColumns as error:
+                    return (
+                        jsonify(
+                            {
+                                "errors": {
+                                    "columns": [
+                                        f"unknown columns: {', '.join(error.unknown_columns)}"
+                                    ],
+                                }
+                            }
+                        ),
+                        422,
+                    )
 
             if with_metadata:
                 metadata_file_path = path_to_download.with_suffix(
@@ -683,25 +1025,272 @@ class ProjectsController:
 
         elif path_to_download.is_dir():
 
-            def build_stream():
-                stream = zipstream.ZipFile(mode="w", compression=zipstream.ZIP_DEFLATED)
-                project_path_len = len(str(project.file_directory))
-                for path in path_to_download.glob("**/*"):
-                    if path.is_file():
-                        stream.write(
-                            path, arcname=str(path)[project_path_len:]
-                        )  # Remove absolut path before project subfolder, including project id
-                yield from stream
-
-            response = Response(build_stream(), mimetype="application/zip")
+            archive_format: str = request.args.get("format", "zip", type=str)
+            if archive_format not in ProjectsController.ARCHIVE_FORMATS:
+                return (
+                    jsonify(
+                        {
+                            "errors": {
+                                "format": [
+                                    f"must be one of: {', '.join(ProjectsController.ARCHIVE_FORMATS)}"
+                                ]
+                            }
+                        }
+                    ),
+                    422,
+                )
+
+            project_path_len = len(str(project.file_directory))
+            files = [
+                # Remove absolut path before project subfolder, including project id
+                (file_path, str(file_path)[project_path_len:])
+                for file_path in sorted(path_to_download.glob("**/*"))
+                if file_path.is_file()
+            ]
             filename_friendly_path_as_str = str(path).replace("/", "+")
+
+            if archive_format == "tar.zst":
+                response = Response(
+                    iter(TarZstdStream(files)), mimetype="application/zstd"
+                )
+            else:
+                stream = ZipStream(files)
+                content_length = stream.content_length
+                response = Response(iter(stream), mimetype="application/zip")
+                if content_length is not None:
+                    response.headers["Content-Length"] = str(content_length)
+
             response.headers["Content-Disposition"] = (
-                f"attachment; filename={project.name}--{filename_friendly_path_as_str}.zip"
+                f"attachment; filename={project.name}--{filename_friendly_path_as_str}.{archive_format}"
             )
             return response
         else:
             return jsonify({"errors": {"path": ["not found"]}}), 404
 
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/table-query", methods=["POST"])
+    @login_required
+    def table_query(project_id: int):
+        """
+        Filters, groups, aggregates and sorts a table on the server and returns only the requested page.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Request body
+        ------------
+        JSON object as defined by `TableQuery`, e.g.
+        ```json
+        {
+            "path": "results/peptides.tsv",
+            "filters": [{"column": "score", "operator": ">=", "value": 0.9}],
+            "group_by": ["protein"],
+            "aggregations": [{"column": "score", "function": "mean"}],
+            "sort": [{"column": "score_mean", "ascending": false}],
+            "offset": 0,
+            "limit": 500
+        }
+        ```
+
+        Returns
+        -------
+        Response
+            * 200 - on success, JSON table like `download` with `is-table`, `total_rows` is the number of result rows
+            * 404 - on project or path not found
+            * 422 - on invalid query or unknown table format
+        """
+        try:
+            query = TableQuery.model_validate(request.json)
+        except ValidationError as error:
+            errors = defaultdict(list)
+            for validation_error in error.errors():
+                errors[".".join(str(loc) for loc in validation_error["loc"])].append(
+                    validation_error["msg"]
+                )
+            return jsonify({"errors": errors}), 422
+
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return jsonify({"errors": {"project": ["not found"]}}), 404
+
+        path_to_table = project.get_path(Path(query.path))
+        if not path_to_table.is_file():
+            return jsonify({"errors": {"path": ["not found"]}}), 404
+
+        try:
+            page, total_rows = query.execute(
+                ProjectsController.open_table(project, path_to_table)
+            )
+        except UnknownTableFormat as error:
+            return (
+                jsonify(
+                    {
+                        "errors": {
+                            "general": f"unknown table format, supported types are: {', '.join(error.supported_table_formats)}",
+                        }
+                    }
+                ),
+                422,
+            )
+        except UnknownTableColumns as error:
+            return (
+                jsonify(
+                    {
+                        "errors": {
+                            "columns": [
+                                f"unknown columns: {', '.join(error.unknown_columns)}"
+                            ],
+                        }
+                    }
+                ),
+                422,
+            )
+        except ValueError as error:
+            return jsonify({"errors": {"general": str(error)}}), 422
+
+        table = json.loads(page.to_json(orient="split", index=False))
+        table["offset"] = query.offset
+        table["total_rows"] = total_rows
+        return jsonify(table)
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/table-stats", methods=["GET"])
+    @login_required
+    def table_stats(project_id: int):
+        """
+        Returns summary statistics for each column of a table.
+        Statistics are computed once per table version and cached next to the table's Parquet cache entry.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Query parameters
+        ----------------
+        path : str
+            Path to the table within the project directory
+
+        Returns
+        -------
+        Response
+            * 200 - on success, JSON object with `total_rows` and `columns`, mapping each column to its
+              `dtype`, `null_count`, `min`, `max`, `distinct_count` and `histogram`
+              (`edges` and `counts` for numeric columns, otherwise null)
+            * 404 - on project or path not found
+            * 422 - on unknown table format
+        """
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return jsonify({"errors": {"project": ["not found"]}}), 404
+
+        path_to_table = project.get_path(Path(unquote(request.args.get("path", "", type=str))))
+        if not path_to_table.is_file():
+            return jsonify({"errors": {"path": ["not found"]}}), 404
+
+        try:
+            statistics = TableStatistics.get(
+                ProjectsController.open_table(project, path_to_table),
+                ProjectsController.get_table_cache(project).get_sidecar_path(
+                    path_to_table, ".stats.json"
+                ),
+            )
+        except UnknownTableFormat as error:
+            return (
+                jsonify(
+                    {
+                        "errors": {
+                            "general": f"unknown table format, supported types are: {', '.join(error.supported_table_formats)}",
+                        }
+                    }
+                ),
+                422,
+            )
+
+        return jsonify(statistics)
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/text", methods=["GET"])
+    @login_required
+    def text(project_id: int):
+        """
+        Returns a range of lines of a text file, e.g. a log file.
+        Lines are located with a line-offset index, so even huge files are served without reading them completely.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Query parameters
+        ----------------
+        path : str
+            Path to the file within the project directory
+        start : int
+            Index of the first line, default: 0
+        count : int
+            Maximum number of lines, default & maximum: `LineIndex.MAX_LINES_PER_READ`
+        tail : int
+            If true, the last `count` lines are returned and `start` is ignored
+
+        Returns
+        -------
+        Response
+            * 200 - on success, JSON object with `start` (index of the first returned line),
+              `lines` and `total_lines`
+            * 404 - on project or path not found
+            * 422 - on invalid range
+        """
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return jsonify({"errors": {"project": ["not found"]}}), 404
+
+        path_to_file = project.get_path(Path(unquote(request.args.get("path", "", type=str))))
+        if not path_to_file.is_file():
+            return jsonify({"errors": {"path": ["not found"]}}), 404
+
+        start: int = request.args.get("start", 0, type=int)
+        count: int = request.args.get("count", LineIndex.MAX_LINES_PER_READ, type=int)
+        is_tail: bool = request.args.get("tail", 0, type=int) > 0
+        errors = defaultdict(list)
+        if start < 0:
+            errors["start"].append("must be positive")
+        if count < 1 or count > LineIndex.MAX_LINES_PER_READ:
+            errors["count"].append(
+                f"must be between 1 and {LineIndex.MAX_LINES_PER_READ}"
+            )
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        line_index = LineIndex(
+            path_to_file, project.get_cache_directory().joinpath("line_indices")
+        )
+        total_lines = line_index.total_lines
+        if is_tail:
+            start = max(0, total_lines - count)
+
+        return jsonify(
+            {
+                "start": start,
+                "lines": line_index.read_lines(start, count),
+                "total_lines": total_lines,
+            }
+        )
+
     @staticmethod
     def file_download(path: Path, is_inline: bool) -> Response:
         """Downloads a file inline or as attachment
@@ -721,8 +1310,61 @@ class ProjectsController:
         return make_response(send_file(path, as_attachment=not is_inline))
 
     @staticmethod
-    def table_download(path: Path) -> Response:
-        """Downloads table as JSON, created with Pandas `DataFrame.to_json(orient="split")`, e.g.
+    def open_table(project: Project, path: Path) -> Union[TableReader, ParquetTableReader]:
+        """
+        Opens a table of the project. The table is read from the project's Parquet table cache,
+        if it fits into the cache budget, otherwise directly from the source file.
+
+        Parameters
+        ----------
+        project : Project
+            Project
+        path : Path
+            Full path to file crated with `Project.get_path()`
+
+        Returns
+        -------
+        Union[TableReader, ParquetTableReader]
+            Reader for the table
+
+        Raises
+        ------
+        UnknownTableFormat
+            If the table format is not supported
+        """
+        return ProjectsController.get_table_cache(project).open(
+            TableReader(path, project.get_cache_directory().joinpath("table_indices"))
+        )
+
+    @staticmethod
+    def get_table_cache(project: Project) -> TableCache:
+        """
+        Returns the Parquet table cache of the project.
+
+        Parameters
+        ----------
+        project : Project
+            Project
+
+        Returns
+        -------
+        TableCache
+            Table cache
+        """
+        return TableCache(
+            project.get_cache_directory().joinpath("table_cache"),
+            Configuration.values()["table_cache"]["max_bytes_per_project"],
+        )
+
+    @staticmethod
+    def table_download(
+        table_reader: Union[TableReader, ParquetTableReader],
+        offset: int,
+        limit: Optional[int],
+        columns: Optional[List[str]],
+    ) -> Response:
+        """Downloads table (or a slice of it) as JSON, created with Pandas `DataFrame.to_json(orient="split")`
+        with the additional keys `offset` (index of the first row) and `total_rows` (number of rows in the table), e.g.
         ```json
         {
             "columns": ["col1", "col2", ...],
@@ -730,39 +1372,42 @@ class ProjectsController:
                 ["row1col1", "row1col2", ...],
                 ["row2col1", "row2col2", ...],
                 ...
-            ]
+            ],
+            "offset": 0,
+            "total_rows": 1000000
         }
         ```
         Supported are CSV, TSV and XLSX files.
 
         Parameters
         ----------
-        path : Path
-            Full path to file crated with `Project.get_path()`
+        table_reader : Union[TableReader, ParquetTableReader]
+            Reader for the table, see `open_table()`
+        offset : int
+            Index of the first row
+        limit : Optional[int]
+            Maximum number of rows, None for all rows after offset
+        columns : Optional[List[str]]
+            Columns to return, None for all columns
 
         Returns
         -------
         Response
             Response with table data
-        """
-        dataframe: Optional[pd.DataFrame] = None
-        try:
-            match path.suffix.lower():
-                case ".csv":
-                    dataframe = pd.read_csv(path)
-                case ".tsv":
-                    dataframe = pd.read_csv(path, sep="\t")
-                case ".xlsx":
-                    dataframe = pd.read_excel(path)
-        except pd.errors.EmptyDataError:
-            dataframe = pd.DataFrame()
-
-        if dataframe is None:
-            raise UnknownTableFormat(["CSV", "TSV", "XLSX"])
 
-        return Response(
-            dataframe.to_json(orient="split", index=False), mimetype="application/json"
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        """
+        table = json.loads(
+            table_reader.read(offset, limit, columns).to_json(
+                orient="split", index=False
+            )
         )
+        table["offset"] = offset
+        table["total_rows"] = table_reader.total_rows
+        return jsonify(table)
 
     @staticmethod
     @app.route("/api/projects/<int:project_id>/file-size")
@@ -0,0 +1,699 @@
+"""Endpoints for the run history."""
+
+# std imports
+from datetime import datetime
+import math
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+import uuid
+
+# 3rd party imports
+from flask import request, jsonify
+from flask_login import login_required  # type: ignore[import-untyped]
+import pandas as pd
+
+# internal imports
+from macworp_backend import app, db_wrapper as db
+from macworp_backend.models.project import Project
+from macworp_backend.models.run import Run
+from macworp_backend.models.workflow import Workflow
+from macworp_backend.utility.configuration import Configuration
+from macworp_backend.utility.task_metrics import TaskMetrics
+
+
+class RunsController:
+    """
+    Controller for the run history, i.e. queue wait, runtime and exit status of each workflow execution.
+    """
+
+    MAX_LIMIT: ClassVar[int] = 1000
+    """Maximum number of runs per page"""
+
+    MAX_TASK_METRICS_RUNS: ClassVar[int] = 200
+    """Maximum number of runs aggregated by `workflow_task_metrics`"""
+
+    STATISTICS_GROUPS: ClassVar[Dict[str, str]] = {
+        "workflow": "workflow_id",
+        "worker-host": "worker_host",
+        "day": "date_trunc('day', queued_at)",
+    }
+    """Supported values of `group-by` for the statistics and the SQL expression to group by"""
+
+    @staticmethod
+    @app.route("/api/runs", methods=["GET"])
+    @login_required
+    def index():
+        """
+        Lists runs, newest first.
+
+        Method
+        ------
+        GET
+
+        Query parameters
+        ----------------
+        project-id : int
+            Only runs of this project, optional
+        workflow-id : int
+            Only runs of this workflow, optional
+        worker-host : str
+            Only runs executed on this host, optional
+        sweep-id : int
+            Only runs of this parameter sweep, optional
+        status : str
+            Only runs with this status: `queued`, `running`, `succeeded` or `failed`, optional
+        since : str
+            Only runs queued at or after this ISO timestamp, optional
+        until : str
+            Only runs queued before this ISO timestamp, optional
+        cursor : int
+            `next_cursor` of the previous page, optional
+        limit : int
+            Maximum number of runs, default: 50, maximum: `MAX_LIMIT`
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `runs` and `next_cursor` (null on the last page)
+            * 422 - on invalid query parameters
+        """
+        errors: Dict[str, List[str]] = {}
+        query = RunsController.apply_filters(Run.select(), errors)
+        status: Optional[str] = request.args.get("status", None, type=str)
+        match status:
+            case None:
+                pass
+            case "queued":
+                query = query.where(
+                    Run.started_at.is_null() & Run.finished_at.is_null()
+                )
+            case "running":
+                query = query.where(
+                    Run.started_at.is_null(False) & Run.finished_at.is_null()
+                )
+            case "succeeded":
+                query = query.where(Run.finished_at.is_null(False) & (Run.exit_code == 0))
+            case "failed":
+                query = query.where(
+                    Run.finished_at.is_null(False)
+                    & (Run.exit_code.is_null() | (Run.exit_code != 0))
+                )
+            case _:
+                errors["status"] = ["must be queued, running, succeeded or failed"]
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        cursor: Optional[int] = request.args.get("cursor", None, type=int)
+        limit = min(
+            max(request.args.get("limit", 50, type=int), 1), RunsController.MAX_LIMIT
+        )
+        if cursor is not None:
+            query = query.where(Run.id < cursor)
+
+        # Select one more run to determine if there is a next page
+        runs: List[Run] = list(query.order_by(Run.id.desc()).limit(limit + 1))
+        next_cursor: Optional[int] = None
+        if len(runs) > limit:
+            runs = runs[:limit]
+            next_cursor = runs[-1].id
+        return jsonify(
+            {"runs": [run.to_dict() for run in runs], "next_cursor": next_cursor}
+        )
+
+    @staticmethod
+    @app.route("/api/runs/<int:run_id>", methods=["GET"])
+    @login_required
+    def show(run_id: int):
+        """
+        Returns a run.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `run`
+            * 404 - on run not found
+        """
+        run: Optional[Run] = Run.get_or_none(Run.id == run_id)
+        if run is None:
+            return jsonify({"errors": {"general": "run not found"}}), 404
+        return jsonify({"run": run.to_dict()})
+
+    @staticmethod
+    @app.route("/api/runs/statistics", methods=["GET"])
+    @login_required
+    def statistics():
+        """
+        Aggregates queue wait and runtime of runs, e.g. to observe trends under load.
+
+        Method
+        ------
+        GET
+
+        Query parameters
+        ----------------
+        group-by : str
+            `workflow`, `worker-host` or `day`, default: `day`
+        project-id, workflow-id, worker-host, sweep-id, since, until
+            Filters, see `index`
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `statistics`, a list of objects with `group`, `runs`, `queued`, `running`,
+              `succeeded`, `failed`, `queue_wait` and `runtime`. The latter two contain `avg`, `p50`, `p95`
+              and `max` in seconds, null if no run of the group has started / finished.
+            * 422 - on invalid query parameters
+        """
+        errors: Dict[str, List[str]] = {}
+        group_by: str = request.args.get("group-by", "day", type=str)
+        if group_by not in RunsController.STATISTICS_GROUPS:
+            errors["group-by"] = [
+                f"must be one of {', '.join(RunsController.STATISTICS_GROUPS.keys())}"
+            ]
+        conditions, params = RunsController.get_sql_filters(errors)
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        group_expression = RunsController.STATISTICS_GROUPS[group_by]
+        where_clause = f"where {' and '.join(conditions)}" if len(conditions) > 0 else ""
+        queue_wait = "extract(epoch from started_at - queued_at)"
+        runtime = "extract(epoch from finished_at - started_at)"
+        # Group expression is taken from the whitelist above, values are passed as parameters
+        cursor = db.database.execute_sql(
+            f"""
+            select
+                {group_expression} as run_group,
+                count(*),
+                count(*) filter (where started_at is null and finished_at is null),
+                count(*) filter (where started_at is not null and finished_at is null),
+                count(*) filter (where finished_at is not null and exit_code = 0),
+                count(*) filter (where finished_at is not null and (exit_code is null or exit_code <> 0)),
+                avg({queue_wait}),
+                percentile_cont(0.5) within group (order by {queue_wait}),
+                percentile_cont(0.95) within group (order by {queue_wait}),
+                max({queue_wait}),
+                avg({runtime}),
+                percentile_cont(0.5) within group (order by {runtime}),
+                percentile_cont(0.95) within group (order by {runtime}),
+                max({runtime})
+            from runs
+            {where_clause}
+            group by run_group
+            order by run_group
+            """,
+            params,
+        )
+        statistics = []
+        for row in cursor.fetchall():
+            group = row[0]
+            if isinstance(group, datetime):
+                group = group.date().isoformat()
+            statistics.append(
+                {
+                    "group": group,
+                    "runs": row[1],
+                    "queued": row[2],
+                    "running": row[3],
+                    "succeeded": row[4],
+                    "failed": row[5],
+                    "queue_wait": RunsController.to_duration_statistics(row[6:10]),
+                    "runtime": RunsController.to_duration_statistics(row[10:14]),
+                }
+            )
+        return jsonify({"statistics": statistics})
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/claim", methods=["POST"])
+    @login_required
+    def claim(project_id: int):
+        """
+        Endpoint for the worker to claim a queued run before executing it. Replaces the ignore check,
+        the workflow request and the start report by a single request: checks that the project exists
+        and is not ignored, records the start with a lease and returns the workflow.
+        The lease must be renewed within `runs.lease_seconds`, see `renew_lease`.
+        Messages without run ID (queued before the run history existed) get a new run.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Request body
+        ------------
+        JSON object with `workflow_id`, `worker_host`, `run_id` (null for messages without run ID),
+        `workflow_arguments` (only used for new runs) and `workflow_revision` (revision of the worker's
+        cached workflow, optional)
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `run_id`, `lease_token`, `lease_seconds`, `workflow_revision` and `workflow`
+              (same as `GET /api/workflows/<id>`, null if `workflow_revision` is the current revision)
+            * 404 - on project, workflow or run not found, the job should be dropped
+            * 409 - on project ignored or run already finished, the job should be dropped
+            * 422 - on invalid body
+            * 423 - on run claimed by another worker, JSON object with `retry_after` (seconds until the lease expires,
+              also as `Retry-After` header). The job should be requeued, so it is executed if the other worker crashes.
+
+            If the job is dropped because the project is ignored or deleted or the workflow is deleted,
+            the run is finished without exit code (cancelled).
+        """
+        data = request.json if request.is_json else None
+        if not isinstance(data, dict):
+            return jsonify({"errors": {"general": "body must be a JSON object"}}), 422
+        errors: Dict[str, List[str]] = {}
+        workflow_id = data.get("workflow_id", None)
+        if not isinstance(workflow_id, int) or isinstance(workflow_id, bool):
+            errors["workflow_id"] = ["must be an integer"]
+        run_id = data.get("run_id", None)
+        if run_id is not None and (not isinstance(run_id, int) or isinstance(run_id, bool)):
+            errors["run_id"] = ["must be an integer or null"]
+        worker_host = data.get("worker_host", None)
+        if not isinstance(worker_host, str) or not 0 < len(worker_host) <= 255:
+            errors["worker_host"] = ["must be a string of 1 to 255 characters"]
+        workflow_arguments = data.get("workflow_arguments", [])
+        if not isinstance(workflow_arguments, list):
+            errors["workflow_arguments"] = ["must be a list"]
+        cached_workflow_revision = data.get("workflow_revision", None)
+        if cached_workflow_revision is not None and (
+            not isinstance(cached_workflow_revision, int)
+            or isinstance(cached_workflow_revision, bool)
+        ):
+            errors["workflow_revision"] = ["must be an integer or null"]
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        workflow: Optional[Workflow] = Workflow.get_or_none(Workflow.id == workflow_id)
+        if project is None or project.ignore or workflow is None:
+            # The job is dropped, so the run would be queued forever
+            if run_id is not None:
+                Run.cancel(run_id, project_id)
+            if project is None:
+                return jsonify({"errors": {"general": "project not found"}}), 404
+            if project.ignore:
+                return jsonify({"errors": {"general": "project is ignored"}}), 409
+            return jsonify({"errors": {"general": "workflow not found"}}), 404
+
+        if run_id is None:
+            run_id = Run.create(
+                project_id=project.id,
+                workflow_id=workflow.id,
+                parameter_hash=Run.hash_parameters(workflow_arguments),
+            ).id
+        lease_seconds: int = Configuration.values()["runs"]["lease_seconds"]
+        run = Run.claim(run_id, project.id, worker_host, lease_seconds)
+        if run is None:
+            run = Run.get_or_none((Run.id == run_id) & (Run.project_id == project.id))
+            if run is None:
+                return jsonify({"errors": {"general": "run not found"}}), 404
+            if run.finished_at is not None:
+                return jsonify({"errors": {"general": "run is already finished"}}), 409
+            # Lease held by another worker, which might crash before finishing the run
+            retry_after = 0
+            if run.lease_expires_at is not None:
+                retry_after = max(
+                    math.ceil((run.lease_expires_at - datetime.now()).total_seconds()),
+                    0,
+                )
+            response = jsonify(
+                {
+                    "errors": {"general": "run is claimed by another worker"},
+                    "retry_after": retry_after,
+                }
+            )
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 423
+        return jsonify(
+            {
+                "run_id": run.id,
+                "lease_token": str(run.lease_token),
+                "lease_seconds": lease_seconds,
+                "workflow_revision": workflow.revision,
+                "workflow": (
+                    workflow.to_dict()
+                    if cached_workflow_revision != workflow.revision
+                    else None
+                ),
+            }
+        )
+
+    @staticmethod
+    @app.route("/api/runs/<int:run_id>/lease", methods=["POST"])
+    @login_required
+    def renew_lease(run_id: int):
+        """
+        Endpoint for the worker to renew the lease of a claimed run while executing it.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+
+        Request body
+        ------------
+        JSON object with `lease_token`, see `claim`
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `lease_seconds`
+            * 409 - on run finished or lease taken over by another claim
+            * 422 - on invalid body
+        """
+        data = request.json if request.is_json else None
+        try:
+            lease_token = uuid.UUID(data["lease_token"])  # type: ignore[index]
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return jsonify({"errors": {"lease_token": ["must be a UUID"]}}), 422
+        lease_seconds: int = Configuration.values()["runs"]["lease_seconds"]
+        if Run.renew_lease(run_id, lease_token, lease_seconds) is None:
+            return jsonify({"errors": {"general": "lease is lost"}}), 409
+        return jsonify({"lease_seconds": lease_seconds})
+
+    @staticmethod
+    @app.route("/api/runs/<int:run_id>/started", methods=["POST"])
+    @login_required
+    def started(run_id: int):
+        """
+        Endpoint for the worker to report the start of a run.
+        Superseded by `claim`, kept for workers of older versions.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+
+        Request body
+        ------------
+        JSON object with `worker_host`
+
+        Returns
+        -------
+        Response
+            * 200 - empty, on success
+            * 404 - on run not found
+            * 422 - on invalid body
+        """
+        data = request.json if request.is_json else None
+        worker_host = data.get("worker_host", None) if isinstance(data, dict) else None
+        if not isinstance(worker_host, str) or not 0 < len(worker_host) <= 255:
+            return (
+                jsonify(
+                    {"errors": {"worker_host": ["must be a string of 1 to 255 characters"]}}
+                ),
+                422,
+            )
+        if Run.mark_started(run_id, worker_host) is None:
+            return "", 404
+        return "", 200
+
+    @staticmethod
+    @app.route("/api/runs/<int:run_id>/finished", methods=["POST"])
+    @login_required
+    def finished(run_id: int):
+        """
+        Endpoint for the worker to report the end of a run.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+
+        Request body
+        ------------
+        JSON object with `exit_code` (int or null if the workflow engine was not executed),
+        `phase_durations` (object mapping phase names to seconds, optional) and
+        `lease_token` (see `claim`, optional for workers of older versions)
+
+        Returns
+        -------
+        Response
+            * 200 - empty, on success
+            * 404 - on run not found
+            * 409 - on lease taken over by another claim, the run is reported by the other worker
+            * 422 - on invalid body
+        """
+        data = request.json if request.is_json else None
+        if not isinstance(data, dict):
+            return jsonify({"errors": {"general": "body must be a JSON object"}}), 422
+        errors: Dict[str, List[str]] = {}
+        exit_code = data.get("exit_code", None)
+        if exit_code is not None and (
+            not isinstance(exit_code, int) or isinstance(exit_code, bool)
+        ):
+            errors["exit_code"] = ["must be an integer or null"]
+        phase_durations = data.get("phase_durations", None)
+        if phase_durations is not None and (
+            not isinstance(phase_durations, dict)
+            or not all(
+                isinstance(duration, (int, float)) and not isinstance(duration, bool)
+                for duration in phase_durations.values()
+            )
+        ):
+            errors["phase_durations"] = ["must be an object with numeric values"]
+        lease_token: Optional[uuid.UUID] = None
+        if data.get("lease_token", None) is not None:
+            try:
+                lease_token = uuid.UUID(data["lease_token"])
+            except (TypeError, ValueError, AttributeError):
+                errors["lease_token"] = ["must be a UUID or null"]
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+        run = Run.mark_finished(run_id, exit_code, phase_durations, lease_token)
+        if run is None:
+            if lease_token is not None and Run.select().where(Run.id == run_id).exists():
+                return jsonify({"errors": {"general": "lease is lost"}}), 409
+            return "", 404
+        try:
+            TaskMetrics.store(run.project_id, run.id)
+        except (OSError, ValueError) as error:
+            # Metrics are still read from the trace
+            app.logger.warning(  # pylint: disable=no-member
+                "Cannot convert task metrics of run %i: %s", run.id, error
+            )
+        return "", 200
+
+    @staticmethod
+    @app.route("/api/runs/<int:run_id>/task-metrics", methods=["GET"])
+    @login_required
+    def task_metrics(run_id: int):
+        """
+        Aggregates the resource usage of the tasks of a Nextflow run per process, see `TaskMetrics.aggregate()`.
+        Available while the run is running.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `processes`
+            * 404 - on run or metrics not found
+        """
+        run: Optional[Run] = Run.get_or_none(Run.id == run_id)
+        if run is None:
+            return jsonify({"errors": {"general": "run not found"}}), 404
+        metrics = TaskMetrics.load(run.project_id, run.id)
+        if metrics is None:
+            return jsonify({"errors": {"general": "no task metrics for this run"}}), 404
+        return jsonify({"processes": TaskMetrics.aggregate(metrics)})
+
+    @staticmethod
+    @app.route("/api/workflows/<int:workflow_id>/task-metrics", methods=["GET"])
+    @login_required
+    def workflow_task_metrics(workflow_id: int):
+        """
+        Aggregates the resource usage per process over the last finished runs of a workflow,
+        e.g. to right-size the resources of each process.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        workflow_id : int
+            Workflow ID
+
+        Query parameters
+        ----------------
+        runs : int
+            Number of latest finished runs to aggregate, default: 20, maximum: `MAX_TASK_METRICS_RUNS`
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `run_ids` (runs with metrics) and `processes`, see `task_metrics`
+        """
+        run_count = min(
+            max(request.args.get("runs", 20, type=int), 1),
+            RunsController.MAX_TASK_METRICS_RUNS,
+        )
+        run_ids: List[int] = []
+        metrics: List[pd.DataFrame] = []
+        for run in (
+            Run.select(Run.id, Run.project_id)
+            .where((Run.workflow_id == workflow_id) & Run.finished_at.is_null(False))
+            .order_by(Run.id.desc())
+            .limit(run_count)
+        ):
+            run_metrics = TaskMetrics.load(run.project_id, run.id)
+            if run_metrics is not None:
+                run_ids.append(run.id)
+                metrics.append(run_metrics)
+        return jsonify(
+            {
+                "run_ids": run_ids,
+                "processes": (
+                    TaskMetrics.aggregate(pd.concat(metrics, ignore_index=True))
+                    if len(metrics) > 0
+                    else []
+                ),
+            }
+        )
+
+    @staticmethod
+    def parse_filters(errors: Dict[str, List[str]]) -> Dict[str, Any]:
+        """
+        Parses the filter query parameters shared by `index` and `statistics`.
+
+        Parameters
+        ----------
+        errors : Dict[str, List[str]]
+            Errors are added to this dictionary
+
+        Returns
+        -------
+        Dict[str, Any]
+            Given filters, keys are the column names, `since` and `until`
+        """
+        filters: Dict[str, Any] = {}
+        for argument, column in [
+            ("project-id", "project_id"),
+            ("workflow-id", "workflow_id"),
+            ("sweep-id", "sweep_id"),
+        ]:
+            if argument in request.args:
+                value = request.args.get(argument, None, type=int)
+                if value is None:
+                    errors[argument] = ["must be an integer"]
+                else:
+                    filters[column] = value
+        worker_host = request.args.get("worker-host", None, type=str)
+        if worker_host:
+            filters["worker_host"] = worker_host
+        for argument in ["since", "until"]:
+            if argument in request.args:
+                try:
+                    filters[argument] = datetime.fromisoformat(request.args[argument])
+                except ValueError:
+                    errors[argument] = ["must be an ISO timestamp"]
+        return filters
+
+    @staticmethod
+    def apply_filters(query, errors: Dict[str, List[str]]):
+        """
+        Applies the filter query parameters to a run query.
+
+        Parameters
+        ----------
+        query : ModelSelect
+            Run query
+        errors : Dict[str, List[str]]
+            Errors are added to this dictionary
+
+        Returns
+        -------
+        ModelSelect
+            Filtered query
+        """
+        for key, value in RunsController.parse_filters(errors).items():
+            match key:
+                case "since":
+                    query = query.where(Run.queued_at >= value)
+                case "until":
+                    query = query.where(Run.queued_at < value)
+                case _:
+                    query = query.where(getattr(Run, key) == value)
+        return query
+
+    @staticmethod
+    def get_sql_filters(
+        errors: Dict[str, List[str]]
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        Converts the filter query parameters to SQL conditions.
+
+        Parameters
+        ----------
+        errors : Dict[str, List[str]]
+            Errors are added to this dictionary
+
+        Returns
+        -------
+        Tuple[List[str], List[Any]]
+            Conditions with placeholders and their parameters
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        for key, value in RunsController.parse_filters(errors).items():
+            match key:
+                case "since":
+                    conditions.append("queued_at >= %s")
+                case "until":
+                    conditions.append("queued_at < %s")
+                case _:
+                    # Keys are column names from `parse_filters`, not user input
+                    conditions.append(f"{key} = %s")
+            params.append(value)
+        return conditions, params
+
+    @staticmethod
+    def to_duration_statistics(values: Tuple[Any, ...]) -> Optional[Dict[str, float]]:
+        """
+        Parameters
+        ----------
+        values : Tuple[Any, ...]
+            Average, median, 95th percentile and maximum as returned by the database
+
+        Returns
+        -------
+        Optional[Dict[str, float]]
+            Dictionary with `avg`, `p50`, `p95` and `max`, None if there are no values
+        """
+        if values[0] is None:
+            return None
+        return {
+            key: float(value) for key, value in zip(["avg", "p50", "p95", "max"], values)
+        }
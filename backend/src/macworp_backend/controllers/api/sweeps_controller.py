@@ -0,0 +1,329 @@
+"""Endpoints for parameter sweeps."""
+
+# std imports
+import json
+from typing import Any, Dict, List, Optional
+
+# 3rd party imports
+from flask import request, jsonify
+from flask_login import login_required  # type: ignore[import-untyped]
+
+# internal imports
+from macworp_backend import app, socketio, db_wrapper as db
+from macworp_backend.controllers.api.projects_controller import ProjectsController
+from macworp_backend.models.project import Project
+from macworp_backend.models.run import Run
+from macworp_backend.models.sweep import Sweep
+from macworp_backend.models.workflow import Workflow
+from macworp_backend.utility.configuration import Configuration
+from macworp_backend.utility.parameter_sweep import ParameterSweep
+from macworp_backend.utility.progress_emitter import ProgressEmitter
+from macworp_backend.utility.rabbit_mq import RabbitMQPublisherPool
+from macworp_utils.exchange.queued_project import QueuedProject  # type: ignore[import-untyped]
+
+
+class SweepsController:
+    """
+    Controller for parameter sweeps. A sweep runs one workflow on a project once for each
+    combination of the swept parameter values, each run writing into its own folder.
+    The project stays scheduled until all runs are finished.
+    """
+
+    @staticmethod
+    @app.route(
+        "/api/projects/<int:project_id>/sweeps/<int:workflow_id>", methods=["POST"]
+    )
+    @login_required
+    def create(project_id: int, workflow_id: int):
+        """
+        Expands the parameter grid and schedules one run per parameter combination.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_id : int
+            Workflow ID
+
+        Request body
+        ------------
+        Workflow parameters, same as for `ProjectsController.schedule`. Swept parameters contain
+        a `sweep` object, see `ParameterSweep`.
+
+        Returns
+        -------
+        Response
+            * 200 - on success, the sweep, see `show`
+            * 404 - on project or workflow not found
+            * 409 - on project is ignored or already scheduled
+            * 422 - on invalid parameters or too many runs
+        """
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return jsonify({"errors": {"general": "project not found"}}), 404
+        if project.ignore or project.is_scheduled:
+            return (
+                jsonify(
+                    {"errors": {"general": "project is ignored or already scheduled"}}
+                ),
+                409,
+            )
+
+        workflow: Optional[Workflow] = Workflow.get_or_none(Workflow.id == workflow_id)
+        if workflow is None:
+            return jsonify({"errors": {"general": "workflow not found"}}), 404
+
+        workflow_parameters = request.json if request.is_json else None
+        if not isinstance(workflow_parameters, list):
+            return (
+                jsonify({"errors": {"general": "workflow parameters cannot be none"}}),
+                422,
+            )
+
+        max_runs: int = Configuration.values()["sweeps"]["max_runs"]
+        try:
+            # Counting first prevents materializing huge grids
+            run_count = ParameterSweep.count_runs(workflow_parameters)
+            if run_count > max_runs:
+                return (
+                    jsonify(
+                        {
+                            "errors": {
+                                "sweep": [
+                                    f"expands to {run_count} runs, maximum is {max_runs}"
+                                ]
+                            }
+                        }
+                    ),
+                    422,
+                )
+            runs = ParameterSweep.expand(workflow_parameters)
+        except ValueError as error:
+            return jsonify({"errors": {"sweep": [str(error)]}}), 422
+
+        # Runs only differ in swept values, so validating the first one is sufficient
+        errors = ProjectsController.validate_workflow_parameters(workflow, runs[0])
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        ProgressEmitter.start_run(project.id)
+
+        with db.database.atomic() as transaction:
+            sweep = Sweep.create(
+                project_id=project.id,
+                workflow_id=workflow.id,
+                total_runs=len(runs),
+            )
+            project.is_scheduled = True  # type: ignore[assignment]
+            project.save()
+            run_ids: List[int] = [
+                row[0]
+                for row in Run.insert_many(
+                    [
+                        {
+                            "project_id": project.id,
+                            "workflow_id": workflow.id,
+                            "sweep_id": sweep.id,
+                            "run_index": run_index,
+                            "parameter_hash": Run.hash_parameters(run_parameters),
+                        }
+                        for run_index, run_parameters in enumerate(runs)
+                    ]
+                )
+                .returning(Run.id)
+                .tuples()
+                .execute()
+            ]
+            try:
+                RabbitMQPublisherPool.publish_batch(
+                    Configuration.values()["rabbit_mq"]["project_workflow_queue"],
+                    [
+                        QueuedProject(
+                            id=project.id,
+                            workflow_id=workflow.id,
+                            workflow_arguments=run_parameters,
+                            sweep_id=sweep.id,
+                            run_index=run_index,
+                            run_directory=str(sweep.get_run_directory(run_index)),
+                            run_id=run_id,
+                        )
+                        .model_dump_json()
+                        .encode()
+                        for run_index, (run_parameters, run_id) in enumerate(
+                            zip(runs, run_ids)
+                        )
+                    ],
+                )
+            except BaseException as exception:
+                transaction.rollback()
+                raise exception
+
+        ProjectsController.write_workflow_history(project, workflow, runs[0])
+        SweepsController.write_run_manifest(project, sweep, runs)
+
+        return jsonify({"sweep": sweep.to_dict()})
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/sweeps", methods=["GET"])
+    @login_required
+    def index(project_id: int):
+        """
+        Lists the sweeps of a project, newest first.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `sweeps`
+        """
+        return jsonify(
+            {
+                "sweeps": [
+                    sweep.to_dict()
+                    for sweep in Sweep.select()
+                    .where(Sweep.project_id == project_id)
+                    .order_by(Sweep.id.desc())
+                ]
+            }
+        )
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/sweeps/<int:sweep_id>", methods=["GET"])
+    @login_required
+    def show(project_id: int, sweep_id: int):
+        """
+        Returns the progress of a sweep.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        sweep_id : int
+            Sweep ID
+
+        Returns
+        -------
+        Response
+            * 200 - JSON object with `sweep` (`id`, `project_id`, `workflow_id`, `total_runs`,
+              `finished_runs`, `created_at` and `directory`)
+            * 404 - on sweep not found
+        """
+        sweep: Optional[Sweep] = Sweep.get_or_none(
+            (Sweep.id == sweep_id) & (Sweep.project_id == project_id)
+        )
+        if sweep is None:
+            return jsonify({"errors": {"general": "sweep not found"}}), 404
+        return jsonify({"sweep": sweep.to_dict()})
+
+    @staticmethod
+    @app.route(
+        "/api/projects/<int:project_id>/sweeps/<int:sweep_id>/runs/<int:run_index>/finished",
+        methods=["POST"],
+    )
+    @login_required
+    def finished_run(project_id: int, sweep_id: int, run_index: int):
+        """
+        Endpoint for the worker to report a finished sweep run. Repeated reports of the same run are ignored.
+        After the last run the project is finalized like a single run, see `ProjectsController.finished`.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        sweep_id : int
+            Sweep ID
+        run_index : int
+            Index of the finished run
+
+        Returns
+        -------
+        Response
+            * 200 - empty, on success or if the run was already reported
+            * 404 - on sweep or run not found
+        """
+        sweep = Sweep.finish_run(sweep_id, project_id, run_index)
+        if sweep is None:
+            sweep = Sweep.get_or_none(
+                (Sweep.id == sweep_id) & (Sweep.project_id == project_id)
+            )
+            if sweep is None or run_index < 0 or run_index >= sweep.total_runs:
+                return "", 404
+            # Already reported, e.g. retried request
+            return "", 200
+
+        socketio.emit(
+            "sweep-progress",
+            {
+                "sweep_id": sweep.id,
+                "run_index": run_index,
+                "finished_runs": sweep.finished_runs,
+                "total_runs": sweep.total_runs,
+            },
+            to=f"project{project_id}",
+        )
+
+        if sweep.is_finished:
+            Project.update(
+                is_scheduled=False, submitted_processes=0, completed_processes=0
+            ).where(Project.id == project_id).execute()
+            ProgressEmitter.discard(project_id)
+            socketio.emit("finished-project", {}, to=f"project{project_id}")
+        return "", 200
+
+    @staticmethod
+    def write_run_manifest(
+        project: Project, sweep: Sweep, runs: List[List[Dict[str, Any]]]
+    ):
+        """
+        Writes `runs.json` into the sweep folder, mapping each run folder to its parameter values,
+        so the results can be assigned to the parameters later.
+
+        Parameters
+        ----------
+        project : Project
+            Project
+        sweep : Sweep
+            Sweep
+        runs : List[List[Dict[str, Any]]]
+            Workflow parameters of each run
+        """
+        sweep_directory = project.get_path(sweep.get_directory())
+        sweep_directory.mkdir(parents=True, exist_ok=True)
+        sweep_directory.joinpath("runs.json").write_text(
+            json.dumps(
+                [
+                    {
+                        "run_index": run_index,
+                        "directory": str(sweep.get_run_directory(run_index)),
+                        "parameters": {
+                            param["name"]: param["value"]
+                            for param in run_parameters
+                            if param["type"] != "separator"
+                        },
+                    }
+                    for run_index, run_parameters in enumerate(runs)
+                ],
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
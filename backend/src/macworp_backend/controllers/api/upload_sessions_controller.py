@@ -0,0 +1,265 @@
+"""Endpoints for resumable, parallel chunk uploads."""
+
+# std imports
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+# 3rd party imports
+from flask import request, jsonify
+from flask_login import login_required  # type: ignore[import-untyped]
+
+# internal imports
+from macworp_backend import app
+from macworp_backend.constants import CHUNK_CHECKSUM_HEADER
+from macworp_backend.models.project import Project
+from macworp_backend.utility.upload_session import UploadSession
+
+
+class UploadSessionsController:
+    """
+    Controller for upload sessions. A session uploads a single file in chunks,
+    which can be sent in parallel, in any order and repeated after failures.
+    """
+
+    @staticmethod
+    @app.route("/api/projects/<int:project_id>/upload-sessions", methods=["POST"])
+    @login_required
+    def create(project_id: int):
+        """
+        Creates a new upload session and preallocates the file.
+
+        Method
+        ------
+        POST
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Request body
+        ------------
+        JSON object with `file_path` (path within the project directory) and `size` (file size in bytes)
+
+        Returns
+        -------
+        Response
+            * 200 - on success, upload status, see `show`
+            * 404 - on project not found
+            * 422 - on invalid file path or size
+        """
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return jsonify({"errors": {"project": ["not found"]}}), 404
+
+        errors = defaultdict(list)
+        data = request.json if request.is_json else {}
+        file_path = data.get("file_path", "")
+        size = data.get("size", None)
+        if not isinstance(file_path, str) or len(file_path.strip("/")) == 0:
+            errors["file_path"].append("cannot be empty")
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            errors["size"].append("must be a positive integer")
+        if len(errors) > 0:
+            return jsonify({"errors": errors}), 422
+
+        try:
+            target_path = project.get_path(Path(file_path))
+        except PermissionError:
+            return jsonify({"errors": {"file_path": ["outside of project directory"]}}), 422
+        if target_path.is_dir():
+            return jsonify({"errors": {"file_path": ["is a directory"]}}), 422
+
+        try:
+            return jsonify(
+                UploadSession.create(
+                    UploadSessionsController.get_sessions_directory(project),
+                    project.file_directory,
+                    Path(file_path),
+                    size,
+                )
+            )
+        except PermissionError:
+            return jsonify({"errors": {"file_path": ["outside of project directory"]}}), 422
+
+    @staticmethod
+    @app.route(
+        "/api/projects/<int:project_id>/upload-sessions/<string:session_id>",
+        methods=["GET"],
+    )
+    @login_required
+    def show(project_id: int, session_id: str):
+        """
+        Returns the status of an upload session.
+
+        Method
+        ------
+        GET
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        session_id : str
+            Session ID
+
+        Returns
+        -------
+        Response
+            * 200 - on success, JSON object with `session_id`, `size`, `received` & `missing`
+              (lists of `[start, end)` byte ranges) and `is_complete`
+            * 404 - on project or session not found (sessions are removed after completion)
+        """
+        session = UploadSessionsController.get_session(project_id, session_id)
+        if session is None:
+            return jsonify({"errors": {"session": ["not found"]}}), 404
+        try:
+            return jsonify(session.get_status())
+        except FileNotFoundError:
+            return jsonify({"errors": {"session": ["not found"]}}), 404
+
+    @staticmethod
+    @app.route(
+        "/api/projects/<int:project_id>/upload-sessions/<string:session_id>",
+        methods=["PUT"],
+    )
+    @login_required
+    def upload_chunk(project_id: int, session_id: str):
+        """
+        Writes a chunk at the given offset. The request body is the raw chunk.
+
+        Method
+        ------
+        PUT
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        session_id : str
+            Session ID
+
+        Query parameters
+        ----------------
+        offset : int
+            Byte offset of the chunk
+
+        Headers
+        -------
+        Content-Length : int
+            Size of the chunk
+        x-chunk-sha256 : str
+            SHA-256 hex digest of the chunk
+
+        Returns
+        -------
+        Response
+            * 200 - on success, upload status, see `show`. If `is_complete` is true, the file was moved to its path.
+            * 404 - on project or session not found
+            * 422 - on invalid offset, missing checksum, incomplete chunk or checksum mismatch
+              (the chunk needs to be sent again)
+        """
+        session = UploadSessionsController.get_session(project_id, session_id)
+        if session is None:
+            return jsonify({"errors": {"session": ["not found"]}}), 404
+
+        offset: Optional[int] = request.args.get("offset", None, type=int)
+        if offset is None:
+            return jsonify({"errors": {"offset": ["cannot be empty"]}}), 422
+        if request.content_length is None:
+            return jsonify({"errors": {"Content-Length": ["cannot be empty"]}}), 422
+        checksum: Optional[str] = request.headers.get(CHUNK_CHECKSUM_HEADER, None)
+        if checksum is None or len(checksum) == 0:
+            return jsonify({"errors": {CHUNK_CHECKSUM_HEADER: ["cannot be empty"]}}), 422
+
+        try:
+            return jsonify(
+                session.write_chunk(
+                    offset,
+                    request.stream,
+                    request.content_length,
+                    checksum,
+                )
+            )
+        except FileNotFoundError:
+            return jsonify({"errors": {"session": ["not found"]}}), 404
+        except PermissionError:
+            return jsonify({"errors": {"file_path": ["outside of project directory"]}}), 422
+        except ValueError as error:
+            return jsonify({"errors": {"chunk": [str(error)]}}), 422
+
+    @staticmethod
+    @app.route(
+        "/api/projects/<int:project_id>/upload-sessions/<string:session_id>",
+        methods=["DELETE"],
+    )
+    @login_required
+    def delete(project_id: int, session_id: str):
+        """
+        Aborts an upload session and removes the uploaded data.
+
+        Method
+        ------
+        DELETE
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        session_id : str
+            Session ID
+
+        Returns
+        -------
+        Response
+            * 200 - on success
+            * 404 - on project or session not found
+        """
+        session = UploadSessionsController.get_session(project_id, session_id)
+        if session is None:
+            return jsonify({"errors": {"session": ["not found"]}}), 404
+        session.remove()
+        return "", 200
+
+    @staticmethod
+    def get_sessions_directory(project: Project) -> Path:
+        """
+        Parameters
+        ----------
+        project : Project
+            Project
+
+        Returns
+        -------
+        Path
+            Directory of the project's upload sessions
+        """
+        return project.get_cache_directory().joinpath("uploads")
+
+    @staticmethod
+    def get_session(project_id: int, session_id: str) -> Optional[UploadSession]:
+        """
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        session_id : str
+            Session ID
+
+        Returns
+        -------
+        Optional[UploadSession]
+            Upload session or None if project or session does not exist
+        """
+        project: Optional[Project] = Project.get_or_none(Project.id == project_id)
+        if project is None:
+            return None
+        try:
+            return UploadSession(
+                UploadSessionsController.get_sessions_directory(project),
+                project.file_directory,
+                session_id,
+            )
+        except FileNotFoundError:
+            return None
@@ -121,7 +121,11 @@ class WorkflowsControllers:
         workflow_dict = workflow.to_dict()
         if request.args.get("definition_as_text", 0, type=int) > 0:
             workflow_dict["definition"] = json.dumps(workflow.definition, indent=4)
-        return jsonify(workflow_dict)
+            return jsonify(workflow_dict)
+        # The revision is the ETag, so clients can revalidate their copy with `If-None-Match` and receive 304
+        response = jsonify(workflow_dict)
+        response.set_etag(workflow.etag)
+        return response.make_conditional(request)
 
     @staticmethod
     @app.route(
@@ -171,6 +175,8 @@ class WorkflowsControllers:
         if len(errors) > 0:
             return jsonify({"errors": errors}), 422
 
+        # Incremented by the database, so concurrent updates result in distinct revisions
+        workflow.revision = Workflow.revision + 1  # type: ignore[assignment]
         workflow.save()
 
         return "", 200
@@ -1,9 +1,10 @@
 # 3rd party imports
-from flask_socketio import join_room, leave_room
+from flask_socketio import emit, join_room, leave_room
 
 # internal imports
 from macworp_backend import socketio, app
 from macworp_backend.authorization import jwt
+from macworp_backend.utility.event_log import EventLog
 
 
 class SocketIoController:
@@ -15,7 +16,8 @@ class SocketIoController:
     @socketio.on("join_project_updates")
     def on_join(data: dict):
         """
-        Joining a room
+        Joining a room. Afterwards the joining client receives a `progress-replay` event
+        with the snapshot and the last events of the project's current run, see `EventLog.replay()`.
 
         Parameters
         ----------
@@ -24,6 +26,9 @@ class SocketIoController:
         """
         room = f"project{data['project_id']}"
         join_room(room)
+        event_log = EventLog.for_project(int(data["project_id"]))
+        if event_log is not None:
+            emit("progress-replay", event_log.replay())
 
     @staticmethod
     @socketio.on("leave_project_updates")
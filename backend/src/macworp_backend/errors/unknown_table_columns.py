@@ -0,0 +1,18 @@
+"""Errors regarding unknown table columns"""
+
+# std imports
+from typing import List
+
+
+class UnknownTableColumns(Exception):
+    """Error raised when requested columns are not part of a table. As hint the unknown columns are provided."""
+
+    def __init__(self, unknown_columns: List[str]):
+        """Create new instance of UnknownTableColumns.
+
+        Parameters
+        ----------
+        unknown_columns : List[str]
+            Requested columns which are not part of the table
+        """
+        self.unknown_columns = unknown_columns
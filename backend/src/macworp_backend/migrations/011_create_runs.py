@@ -0,0 +1,70 @@
+"""Peewee migrations -- 011_create_runs.py.
+
+Some examples (model - class or model name)::
+
+    > Model = migrator.orm['table_name']            # Return model in current state by name
+    > Model = migrator.ModelClass                   # Return model in current state by name
+
+    > migrator.sql(sql)                             # Run custom SQL
+    > migrator.run(func, *args, **kwargs)           # Run python function with the given args
+    > migrator.create_model(Model)                  # Create a model (could be used as decorator)
+    > migrator.remove_model(model, cascade=True)    # Remove a model
+    > migrator.add_fields(model, **fields)          # Add fields to a model
+    > migrator.change_fields(model, **fields)       # Change fields
+    > migrator.remove_fields(model, *field_names, cascade=True)
+    > migrator.rename_field(model, old_field_name, new_field_name)
+    > migrator.rename_table(model, new_table_name)
+    > migrator.add_index(model, *col_names, unique=False)
+    > migrator.add_not_null(model, *field_names)
+    > migrator.add_default(model, field_name, default)
+    > migrator.add_constraint(model, name, sql)
+    > migrator.drop_index(model, *col_names)
+    > migrator.drop_not_null(model, *field_names)
+    > migrator.drop_constraints(model, *constraints)
+
+"""
+
+from contextlib import suppress
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+with suppress(ImportError):
+    import playhouse.postgres_ext as pw_pext
+
+
+def migrate(migrator, database, fake=False, **kwargs):
+    """Write your migrations here."""
+    migrator.sql(
+        """
+        create table runs (
+            id bigserial primary key,
+            project_id bigint not null references projects (id) on delete cascade,
+            workflow_id bigint not null references workflows (id) on delete cascade,
+            sweep_id bigint references sweeps (id) on delete cascade,
+            run_index integer,
+            parameter_hash char(64) not null,
+            queued_at timestamp not null default now(),
+            started_at timestamp,
+            finished_at timestamp,
+            exit_code integer,
+            worker_host varchar(255),
+            phase_durations jsonb
+        );
+        create index runs_project_id_id_idx on runs (project_id, id desc);
+        create index runs_workflow_id_id_idx on runs (workflow_id, id desc);
+        create index runs_worker_host_id_idx on runs (worker_host, id desc);
+        create index runs_sweep_id_idx on runs (sweep_id);
+        create index runs_queued_at_idx on runs (queued_at);
+        """
+    )
+
+
+def rollback(migrator, database, fake=False, **kwargs):
+    """Write your rollback migrations here."""
+    migrator.sql(
+        """
+        drop table runs;
+        """
+    )
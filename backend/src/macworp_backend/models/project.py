@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 import argparse
+import base64
 from enum import unique, Enum
+import json
+import os
 from pathlib import Path
 import shutil
-from typing import IO, Any, Dict, Optional
+from typing import IO, Any, Dict, Optional, Tuple
 
 from macworp_backend.models.workflow import Workflow
 from macworp_utils.path import is_within_path, secure_joinpath
@@ -37,6 +40,12 @@ class LogProcessingResult(BaseModel):
     message: str
     """Log message"""
 
+    submitted_processes: int = 0
+    """Number of processes submitted since the previous log entry"""
+
+    completed_processes: int = 0
+    """Number of processes completed since the previous log entry"""
+
 
 class Project(db.Model):  # type: ignore[name-defined]
     """Handling project data"""
@@ -53,34 +62,23 @@ class Project(db.Model):  # type: ignore[name-defined]
 
         db_table = "projects"
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.__file_directory = None
-        self.__create_file_directory()
-
     @property
     def file_directory(self) -> Path:
         """
         Returns the project's file/work directory.
+        The path is only computed, the directory is created by the first file operation which needs it
+        (upload, new folder, cache files or the worker).
 
         Returns
         -------
         Path
             Root path of the project's file directory.
         """
-        return self.__file_directory
-
-    def __create_file_directory(self):
-        self.__file_directory = (
-            Path(Configuration.values()["upload_path"])
-            .joinpath(str(self.id))
-            .absolute()
-        )
-        self.__file_directory.mkdir(parents=True, exist_ok=True)
+        return Path(Configuration.values()["upload_path"]).joinpath(str(self.id)).absolute()
 
     def __delete_file_directory(self):
-        shutil.rmtree(self.file_directory)
-        self.__file_directory = None
+        if self.file_directory.is_dir():
+            shutil.rmtree(self.file_directory)
 
     def delete_instance(self, recursive=False, delete_nullable=False):
         """
@@ -99,6 +97,108 @@ class Project(db.Model):  # type: ignore[name-defined]
         if deleted_rows > 0:
             self.__delete_file_directory()
 
+    @classmethod
+    def select_dicts(cls):
+        """
+        Selects the attributes returned by `to_dict()` as plain dictionaries.
+        No model instances are created, useful for listing many projects.
+
+        Returns
+        -------
+        ModelSelect
+            Query returning dictionaries
+        """
+        return cls.select(
+            cls.id,
+            cls.name,
+            cls.submitted_processes,
+            cls.completed_processes,
+            cls.is_scheduled,
+            cls.ignore,
+        ).dicts()
+
+    @staticmethod
+    def encode_cursor(name: str, project_id: int) -> str:
+        """
+        Encodes the sort key of a project as cursor for keyset pagination.
+
+        Parameters
+        ----------
+        name : str
+            Project name
+        project_id : int
+            Project ID
+
+        Returns
+        -------
+        str
+            URL safe cursor
+        """
+        return base64.urlsafe_b64encode(json.dumps([name, project_id]).encode("utf-8")).decode(
+            "ascii"
+        )
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, int]:
+        """
+        Decodes a cursor created by `encode_cursor()`.
+
+        Parameters
+        ----------
+        cursor : str
+            Cursor
+
+        Returns
+        -------
+        Tuple[str, int]
+            Project name and ID
+
+        Raises
+        ------
+        ValueError
+            If the cursor is malformed
+        """
+        try:
+            name, project_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (TypeError, ValueError) as error:
+            raise ValueError("malformed cursor") from error
+        if not isinstance(name, str) or not isinstance(project_id, int):
+            raise ValueError("malformed cursor")
+        return name, project_id
+
+    @classmethod
+    def estimate_count(cls, search: Optional[str] = None) -> int:
+        """
+        Estimates the number of projects without counting rows.
+        Without search the row estimate of the table statistics is used,
+        with search the row estimate of the query planner.
+        Falls back to an exact count if the table was never analyzed.
+
+        Parameters
+        ----------
+        search : Optional[str], optional
+            Only projects containing this string in their name (case-insensitive), by default None
+
+        Returns
+        -------
+        int
+            Estimated number of projects
+        """
+        if search is None:
+            row = db.database.execute_sql(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                (cls._meta.table_name,),
+            ).fetchone()
+            if row is not None and row[0] >= 0:
+                return row[0]
+            return cls.select().count()
+
+        sql, params = cls.select(cls.id).where(cls.name.contains(search)).sql()
+        plan = db.database.execute_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     def to_dict(self) -> dict:
         """
         Returns
@@ -208,11 +308,16 @@ class Project(db.Model):  # type: ignore[name-defined]
         target_directory = self.get_path(target_file_path.parent)
         if not target_directory.is_dir():
             target_directory.mkdir(parents=True, exist_ok=True)
-        with target_directory.joinpath(target_file_path.name).open(
-            "ab"
-        ) as project_file:
-            project_file.seek(chunk_offset)
-            project_file.write(file_chunk.read())
+        # Append mode would ignore the offset, so the chunk is written at its offset explicitly
+        file_descriptor = os.open(
+            target_directory.joinpath(target_file_path.name),
+            os.O_WRONLY | os.O_CREAT,
+            0o644,
+        )
+        try:
+            os.pwrite(file_descriptor, file_chunk.read(), chunk_offset)
+        finally:
+            os.close(file_descriptor)
 
         return target_directory
 
@@ -312,11 +417,76 @@ class Project(db.Model):  # type: ignore[name-defined]
         """
         return self.get_history_directory().joinpath("last_executed_workflow.json")
 
+    @classmethod
+    def increment_processes(
+        cls, increments: Dict[int, Tuple[int, int]]
+    ) -> Dict[int, Tuple[int, int]]:
+        """
+        Adds the given numbers to the submitted and completed processes of each project with
+        `SET x = x + n`, so concurrent updates are not lost. Projects are updated in ID order
+        within one transaction, preventing deadlocks between concurrent batches.
+
+        Parameters
+        ----------
+        increments : Dict[int, Tuple[int, int]]
+            Number of submitted and completed processes to add by project ID
+
+        Returns
+        -------
+        Dict[int, Tuple[int, int]]
+            New number of submitted and completed processes by project ID, deleted projects are missing
+        """
+        counters: Dict[int, Tuple[int, int]] = {}
+        with db.database.atomic():
+            for project_id in sorted(increments):
+                submitted, completed = increments[project_id]
+                for row in (
+                    cls.update(
+                        submitted_processes=cls.submitted_processes + submitted,
+                        completed_processes=cls.completed_processes + completed,
+                    )
+                    .where(cls.id == project_id)
+                    .returning(cls.submitted_processes, cls.completed_processes)
+                    .dicts()
+                    .execute()
+                ):
+                    counters[project_id] = (
+                        row["submitted_processes"],
+                        row["completed_processes"],
+                    )
+        return counters
+
     def process_workflow_log(
         self, log: Dict[str, Any], workflow_engine: SupportedWorkflowEngine
     ) -> LogProcessingResult:
         """
-        Processes the workflow log and sends it to the web log proxy.
+        Processes the workflow log and updates the process counters of this project.
+
+        Parameters
+        ----------
+        log : Dict[str, Any]
+            Log
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine
+        """
+        result = self.parse_workflow_log(log, workflow_engine)
+        if result.submitted_processes != 0 or result.completed_processes != 0:
+            counters = self.increment_processes(
+                {self.id: (result.submitted_processes, result.completed_processes)}
+            )
+            if self.id in counters:
+                (
+                    self.submitted_processes,  # type: ignore[assignment]
+                    self.completed_processes,  # type: ignore[assignment]
+                ) = counters[self.id]
+        return result
+
+    @classmethod
+    def parse_workflow_log(
+        cls, log: Dict[str, Any], workflow_engine: SupportedWorkflowEngine
+    ) -> LogProcessingResult:
+        """
+        Computes message and process counter changes of a workflow log entry without touching the database.
 
         Parameters
         ----------
@@ -327,14 +497,15 @@ class Project(db.Model):  # type: ignore[name-defined]
         """
         match workflow_engine:
             case SupportedWorkflowEngine.NEXTFLOW:
-                return self.process_nextflow_log(log)
+                return cls.parse_nextflow_log(log)
             case SupportedWorkflowEngine.SNAKEMAKE:
-                return self.process_snakemake_log(log)
+                return cls.parse_snakemake_log(log)
         return LogProcessingResult(type=LogProcessingResultType.NONE, message="")
 
-    def process_nextflow_log(self, log: Dict[str, Any]) -> LogProcessingResult:
+    @staticmethod
+    def parse_nextflow_log(log: Dict[str, Any]) -> LogProcessingResult:
         """
-        Processes the Nextflow log and sends it to the web log proxy.
+        Computes message and process counter changes of a Nextflow log entry.
 
         Parameters
         ----------
@@ -342,18 +513,14 @@ class Project(db.Model):  # type: ignore[name-defined]
             Log
         """
         if "trace" in log and "event" in log:
-            match log["event"]:
-                case "process_submitted":
-                    self.submitted_processes += 1  # type: ignore[assignment]
-                case "process_completed":
-                    self.completed_processes += 1  # type: ignore[assignment]
-            self.save()
             return LogProcessingResult(
                 type=LogProcessingResultType.PROGRESS,
                 message=(
                     f"Task {log['trace']['task_id']}: "
                     f"{log['trace']['name']} - {log['trace']['status']}"
                 ),
+                submitted_processes=int(log["event"] == "process_submitted"),
+                completed_processes=int(log["event"] == "process_completed"),
             )
         elif "metadata" in log and "event" in log:
             error_report: Optional[str] = log["metadata"]["workflow"].get(
@@ -365,9 +532,10 @@ class Project(db.Model):  # type: ignore[name-defined]
                 )
         return LogProcessingResult(type=LogProcessingResultType.NONE, message="")
 
-    def process_snakemake_log(self, log: Dict[str, Any]) -> LogProcessingResult:
+    @staticmethod
+    def parse_snakemake_log(log: Dict[str, Any]) -> LogProcessingResult:
         """
-        Processes the Nextflow log and sends it to the web log proxy.
+        Computes message and process counter changes of a Snakemake log entry.
 
         Parameters
         ----------
@@ -377,12 +545,11 @@ class Project(db.Model):  # type: ignore[name-defined]
         if "level" in log:
             match log["level"]:
                 case "progress":
-                    self.submitted_processes += log["done"]  # type: ignore[assignment]
-                    self.completed_processes += log["total"]  # type: ignore[assignment]
-                    self.save()
                     return LogProcessingResult(
                         type=LogProcessingResultType.PROGRESS,
                         message="",
+                        submitted_processes=log["done"],
+                        completed_processes=log["total"],
                     )
                 case "job_info":
                     msg = f"- {log['msg']}" if log["msg"] is not None else ""
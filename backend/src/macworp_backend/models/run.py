@@ -0,0 +1,327 @@
+"""History of workflow executions"""
+
+# std imports
+from datetime import datetime, timedelta
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+import uuid
+
+# 3rd party imports
+from peewee import (
+    BigAutoField,
+    BigIntegerField,
+    CharField,
+    DateTimeField,
+    IntegerField,
+    UUIDField,
+    fn,
+)
+from playhouse.postgres_ext import JSONField
+
+# internal imports
+from macworp_backend import db_wrapper as db
+
+
+class Run(db.Model):  # type: ignore[name-defined]
+    """
+    One execution of a workflow on a project. Created when the project is scheduled,
+    the worker reports start and end, so queue wait and runtime can be evaluated later.
+    Runs are kept when the project is finished, unlike the process counters of `Project`.
+
+    A worker claims a run with a lease (`claim()`), which it renews while the workflow is running.
+    As long as the lease is valid or the run is finished, redelivered messages of the run are not executed again.
+    If the worker crashes, the lease expires and the run can be claimed by the next delivery of the message.
+    """
+
+    id = BigAutoField(primary_key=True)
+    project_id = BigIntegerField(null=False)
+    workflow_id = BigIntegerField(null=False)
+    sweep_id = BigIntegerField(null=True)
+    run_index = IntegerField(null=True)
+    parameter_hash = CharField(max_length=64, null=False)
+    queued_at = DateTimeField(null=False, default=datetime.now)
+    started_at = DateTimeField(null=True)
+    finished_at = DateTimeField(null=True)
+    exit_code = IntegerField(null=True)
+    worker_host = CharField(max_length=255, null=True)
+    phase_durations = JSONField(null=True)
+    lease_token = UUIDField(null=True)
+    lease_expires_at = DateTimeField(null=True)
+
+    class Meta:
+        """Peewee meta class"""
+
+        db_table = "runs"
+
+    @staticmethod
+    def hash_parameters(workflow_arguments: List[Dict[str, Any]]) -> str:
+        """
+        Hashes the workflow parameters independently of key order,
+        so runs with the same parameters can be grouped.
+
+        Parameters
+        ----------
+        workflow_arguments : List[Dict[str, Any]]
+            Workflow parameters
+
+        Returns
+        -------
+        str
+            SHA256 hex digest
+        """
+        return hashlib.sha256(
+            json.dumps(
+                workflow_arguments, sort_keys=True, separators=(",", ":")
+            ).encode("utf-8")
+        ).hexdigest()
+
+    @property
+    def queue_wait(self) -> Optional[float]:
+        """
+        Returns
+        -------
+        Optional[float]
+            Seconds between queuing and start, None if not started
+        """
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.queued_at).total_seconds()
+
+    @property
+    def runtime(self) -> Optional[float]:
+        """
+        Returns
+        -------
+        Optional[float]
+            Seconds between start and end, None if not finished
+        """
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    @classmethod
+    def mark_started(cls, run_id: int, worker_host: str) -> Optional["Run"]:
+        """
+        Sets the start time and worker host. A redelivered run is simply started again.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        worker_host : str
+            Host name of the worker
+
+        Returns
+        -------
+        Optional[Run]
+            Updated run or None if not found
+        """
+        updated_runs = list(
+            cls.update(
+                started_at=datetime.now(),
+                finished_at=None,
+                exit_code=None,
+                worker_host=worker_host,
+            )
+            .where(cls.id == run_id)
+            .returning(cls)
+            .execute()
+        )
+        return updated_runs[0] if len(updated_runs) > 0 else None
+
+    @classmethod
+    def claim(
+        cls, run_id: int, project_id: int, worker_host: str, lease_seconds: int
+    ) -> Optional["Run"]:
+        """
+        Records the start of the run with a new lease, in a single `UPDATE`,
+        unless the run is finished or its lease is held by another claim.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        project_id : int
+            Project ID, the run must belong to it
+        worker_host : str
+            Host name of the worker
+        lease_seconds : int
+            Validity of the lease
+
+        Returns
+        -------
+        Optional[Run]
+            Claimed run with `lease_token` or None if not found, finished or claimed
+        """
+        now = datetime.now()
+        claimed_runs = list(
+            cls.update(
+                started_at=now,
+                exit_code=None,
+                worker_host=worker_host,
+                lease_token=uuid.uuid4(),
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+            )
+            .where(
+                (cls.id == run_id)
+                & (cls.project_id == project_id)
+                & cls.finished_at.is_null()
+                & (cls.lease_expires_at.is_null() | (cls.lease_expires_at < now))
+            )
+            .returning(cls)
+            .execute()
+        )
+        return claimed_runs[0] if len(claimed_runs) > 0 else None
+
+    @classmethod
+    def renew_lease(
+        cls, run_id: int, lease_token: uuid.UUID, lease_seconds: int
+    ) -> Optional["Run"]:
+        """
+        Extends the lease of a running run.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        lease_token : uuid.UUID
+            Token returned by `claim()`
+        lease_seconds : int
+            Validity of the lease from now on
+
+        Returns
+        -------
+        Optional[Run]
+            Updated run or None if not found, finished or the lease was taken over by another claim
+        """
+        renewed_runs = list(
+            cls.update(
+                lease_expires_at=datetime.now() + timedelta(seconds=lease_seconds)
+            )
+            .where(
+                (cls.id == run_id)
+                & (cls.lease_token == lease_token)
+                & cls.finished_at.is_null()
+            )
+            .returning(cls)
+            .execute()
+        )
+        return renewed_runs[0] if len(renewed_runs) > 0 else None
+
+    @classmethod
+    def mark_finished(
+        cls,
+        run_id: int,
+        exit_code: Optional[int],
+        phase_durations: Optional[Dict[str, float]],
+        lease_token: Optional[uuid.UUID] = None,
+    ) -> Optional["Run"]:
+        """
+        Sets end time, exit code and phase durations.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        exit_code : Optional[int]
+            Exit code of the workflow engine, None if it was not executed
+        phase_durations : Optional[Dict[str, float]]
+            Seconds spent in each phase of the execution, e.g. `setup`, `execution` & `cleanup`
+        lease_token : Optional[uuid.UUID], optional
+            Token returned by `claim()`. If given, the run is only updated if the lease was not taken over
+            by another claim, so the report of a worker whose lease expired does not finish the run
+            executed by another worker. None for workers of older versions, by default None
+
+        Returns
+        -------
+        Optional[Run]
+            Updated run or None if not found or the lease was taken over by another claim
+        """
+        now = datetime.now()
+        condition = cls.id == run_id
+        if lease_token is not None:
+            condition &= cls.lease_token == lease_token
+        updated_runs = list(
+            cls.update(
+                # Start report might have been lost, the end is the best estimate then
+                started_at=fn.COALESCE(cls.started_at, now),
+                finished_at=now,
+                exit_code=exit_code,
+                phase_durations=phase_durations,
+                lease_expires_at=None,
+            )
+            .where(condition)
+            .returning(cls)
+            .execute()
+        )
+        return updated_runs[0] if len(updated_runs) > 0 else None
+
+    @classmethod
+    def cancel(cls, run_id: int, project_id: int) -> Optional["Run"]:
+        """
+        Finishes a run without exit code, e.g. when its job is dropped because the project is ignored or deleted,
+        so it is not counted as queued forever. Runs which are finished or claimed by a valid lease are not changed.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        project_id : int
+            Project ID, the run must belong to it
+
+        Returns
+        -------
+        Optional[Run]
+            Cancelled run or None if not found, finished or claimed
+        """
+        now = datetime.now()
+        cancelled_runs = list(
+            cls.update(
+                finished_at=now,
+                exit_code=None,
+                lease_expires_at=None,
+            )
+            .where(
+                (cls.id == run_id)
+                & (cls.project_id == project_id)
+                & cls.finished_at.is_null()
+                & (cls.lease_expires_at.is_null() | (cls.lease_expires_at < now))
+            )
+            .returning(cls)
+            .execute()
+        )
+        return cancelled_runs[0] if len(cancelled_runs) > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary representation, timestamps in ISO format, durations in seconds
+        """
+        return {
+            "id": self.id,
+            "project_id": self.project_id,
+            "workflow_id": self.workflow_id,
+            "sweep_id": self.sweep_id,
+            "run_index": self.run_index,
+            "parameter_hash": self.parameter_hash,
+            "queued_at": self.queued_at.isoformat(),
+            "started_at": (
+                self.started_at.isoformat() if self.started_at is not None else None
+            ),
+            "finished_at": (
+                self.finished_at.isoformat() if self.finished_at is not None else None
+            ),
+            "exit_code": self.exit_code,
+            "worker_host": self.worker_host,
+            "queue_wait": self.queue_wait,
+            "runtime": self.runtime,
+            "phase_durations": self.phase_durations,
+            "lease_expires_at": (
+                self.lease_expires_at.isoformat()
+                if self.lease_expires_at is not None
+                else None
+            ),
+        }
@@ -0,0 +1,129 @@
+"""Parameter sweeps, i.e. many runs of one workflow on a project with different parameters"""
+
+# std imports
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, ClassVar, Dict, Optional
+
+# 3rd party imports
+from peewee import BigAutoField, BigIntegerField, DateTimeField, IntegerField, fn
+from playhouse.postgres_ext import ArrayField
+
+# internal imports
+from macworp_backend import db_wrapper as db
+
+
+class Sweep(db.Model):  # type: ignore[name-defined]
+    """
+    Parameter sweep of a project. Each run writes into its own folder within the project directory,
+    see `get_run_directory()`. The number of finished runs is incremented atomically by the workers,
+    once per run index, so retried reports are not counted twice.
+    """
+
+    RUNS_DIRECTORY: ClassVar[str] = "sweeps"
+    """Folder within the project directory containing the run folders of all sweeps"""
+
+    id = BigAutoField(primary_key=True)
+    project_id = BigIntegerField(null=False, index=True)
+    workflow_id = BigIntegerField(null=False)
+    total_runs = IntegerField(null=False)
+    finished_runs = IntegerField(null=False, default=0)
+    finished_run_indexes = ArrayField(IntegerField, null=False, default=list)
+    created_at = DateTimeField(null=False, default=datetime.now)
+
+    class Meta:
+        """Peewee meta class"""
+
+        db_table = "sweeps"
+
+    @property
+    def is_finished(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if all runs are finished
+        """
+        return self.finished_runs >= self.total_runs
+
+    def get_directory(self) -> PurePosixPath:
+        """
+        Returns
+        -------
+        PurePosixPath
+            Folder containing the run folders, relative to the project directory
+        """
+        return PurePosixPath(self.__class__.RUNS_DIRECTORY, str(self.id))
+
+    def get_run_directory(self, run_index: int) -> PurePosixPath:
+        """
+        Parameters
+        ----------
+        run_index : int
+            Index of the run within the sweep
+
+        Returns
+        -------
+        PurePosixPath
+            Output folder of the run, relative to the project directory
+        """
+        return self.get_directory().joinpath(f"run_{run_index}")
+
+    @classmethod
+    def finish_run(
+        cls, sweep_id: int, project_id: int, run_index: int
+    ) -> Optional["Sweep"]:
+        """
+        Records the run as finished and increments the number of finished runs with a single `UPDATE`,
+        so concurrent workers do not lose updates and a repeated report of the same run is not counted again.
+
+        Parameters
+        ----------
+        sweep_id : int
+            Sweep ID
+        project_id : int
+            Project ID, the sweep must belong to it
+        run_index : int
+            Index of the finished run
+
+        Returns
+        -------
+        Optional[Sweep]
+            Updated sweep or None if not found, the run index is invalid or the run was already recorded
+        """
+        if run_index < 0:
+            return None
+        updated_sweeps = list(
+            cls.update(
+                finished_runs=cls.finished_runs + 1,
+                finished_run_indexes=fn.array_append(
+                    cls.finished_run_indexes, run_index
+                ),
+            )
+            .where(
+                (cls.id == sweep_id)
+                & (cls.project_id == project_id)
+                & (cls.total_runs > run_index)
+                & ~cls.finished_run_indexes.contains(run_index)
+            )
+            .returning(cls)
+            .execute()
+        )
+        return updated_sweeps[0] if len(updated_sweeps) > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary representation
+        """
+        return {
+            "id": self.id,
+            "project_id": self.project_id,
+            "workflow_id": self.workflow_id,
+            "total_runs": self.total_runs,
+            "finished_runs": self.finished_runs,
+            "created_at": self.created_at.isoformat(),
+            "directory": str(self.get_directory()),
+        }
@@ -5,7 +5,7 @@ from typing import Any, ClassVar, Dict, Union, DefaultDict, List
 
 # 3rd party imports
 import jsonschema
-from peewee import BigAutoField, CharField, TextField, BooleanField
+from peewee import BigAutoField, CharField, TextField, BooleanField, IntegerField
 from playhouse.postgres_ext import JSONField
 
 # internal import
@@ -31,6 +31,7 @@ class Workflow(db.Model):
     )  # Has property definition to make sure it is parsed dict before inserting into database
     is_validated = BooleanField(null=False, default=False)
     is_published = BooleanField(null=False, default=False)
+    revision = IntegerField(null=False, default=1)
 
     class Meta:
         db_table = "workflows"
@@ -84,8 +85,19 @@ class Workflow(db.Model):
             "description": self.description,
             "is_published": self.is_published,
             "is_validated": self.is_validated,
+            "revision": self.revision,
         }
 
+    @property
+    def etag(self) -> str:
+        """
+        Returns
+        -------
+        str
+            Entity tag (without quotes) of the workflow, changes with each update
+        """
+        return str(self.revision)
+
     @classmethod
     def validate_name(
         cls, name: Any, errors: DefaultDict[str, List[str]]
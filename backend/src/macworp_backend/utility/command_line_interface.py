@@ -4,6 +4,7 @@ import argparse
 # internal imports
 from macworp_backend.utility.configuration import Configuration
 from macworp_backend.utility.rabbit_mq import RabbitMQ
+from macworp_backend.utility.workflow_log_consumer import WorkflowLogConsumer
 
 
 class ComandLineInterface:
@@ -35,6 +36,17 @@ class ComandLineInterface:
         )
         prepare_parser.set_defaults(func=lambda _cli_args: RabbitMQ.prepare_queues())
 
+        consume_workflow_logs_parser = local_subparsers.add_parser(
+            "consume-workflow-logs",
+            help=(
+                "Consumes the workflow log queue and applies the logs in batches. "
+                "Required if workers publish their logs to RabbitMQ."
+            ),
+        )
+        consume_workflow_logs_parser.set_defaults(
+            func=lambda _cli_args: WorkflowLogConsumer.consume()
+        )
+
     @staticmethod
     def add_configuration_cli_arguments(subparsers: argparse._SubParsersAction):
         """
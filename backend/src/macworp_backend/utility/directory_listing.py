@@ -0,0 +1,188 @@
+"""Cached, paginated directory listings for project file browsers."""
+
+# std imports
+from bisect import bisect_right
+from collections import OrderedDict
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+DirectoryEntry = Tuple[bool, str]
+"""Listing entry `(is_file, name)`. Sorting these tuples puts folders before files."""
+
+
+class DirectoryListing:
+    """
+    Lists directories using `os.scandir` and caches the sorted entry names per directory.
+    A cached listing is reused as long as the directory's modification time is unchanged,
+    so opening a large folder again only costs a single `stat()`.
+    Sizes and modification times of entries are never cached. They are only read for the
+    entries of the requested page.
+    """
+
+    MAX_CACHED_DIRECTORIES: ClassVar[int] = 256
+    """Maximum number of directory listings kept in memory (least recently used are dropped)"""
+
+    CURSOR_SEPARATOR: ClassVar[str] = "/"
+    """Separator between entry type and entry name in a cursor. Can not be part of a file name."""
+
+    __cache: ClassVar["OrderedDict[str, Tuple[int, List[DirectoryEntry]]]"] = OrderedDict()
+    __cache_lock: ClassVar[Lock] = Lock()
+
+    @classmethod
+    def entries(cls, directory: Path) -> List[DirectoryEntry]:
+        """
+        Returns the sorted entries of the given directory, from cache if the directory was not modified.
+
+        Parameters
+        ----------
+        directory : Path
+            Absolute path of the directory
+
+        Returns
+        -------
+        List[DirectoryEntry]
+            Sorted list of `(is_file, name)`
+        """
+        cache_key = str(directory)
+        modification_time = os.stat(directory).st_mtime_ns
+        with cls.__cache_lock:
+            cached = cls.__cache.get(cache_key, None)
+            if cached is not None and cached[0] == modification_time:
+                cls.__cache.move_to_end(cache_key)
+                return cached[1]
+
+        entries: List[DirectoryEntry] = []
+        with os.scandir(directory) as scanner:
+            for entry in scanner:
+                # `is_dir()` uses the file type of the directory entry if available, so no `stat()` per entry
+                entries.append((not entry.is_dir(), entry.name))
+        entries.sort()
+
+        with cls.__cache_lock:
+            cls.__cache[cache_key] = (modification_time, entries)
+            cls.__cache.move_to_end(cache_key)
+            while len(cls.__cache) > cls.MAX_CACHED_DIRECTORIES:
+                cls.__cache.popitem(last=False)
+        return entries
+
+    @classmethod
+    def encode_cursor(cls, entry: DirectoryEntry) -> str:
+        """
+        Encodes the given entry as cursor, pointing behind this entry.
+
+        Parameters
+        ----------
+        entry : DirectoryEntry
+            Last entry of the current page
+
+        Returns
+        -------
+        str
+            Cursor
+        """
+        return f"{int(entry[0])}{cls.CURSOR_SEPARATOR}{entry[1]}"
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> DirectoryEntry:
+        """
+        Decodes the given cursor.
+
+        Parameters
+        ----------
+        cursor : str
+            Cursor created by `encode_cursor`
+
+        Returns
+        -------
+        DirectoryEntry
+            Entry the cursor is pointing to
+
+        Raises
+        ------
+        ValueError
+            If the cursor is malformed
+        """
+        is_file, separator, name = cursor.partition(cls.CURSOR_SEPARATOR)
+        if separator != cls.CURSOR_SEPARATOR or is_file not in ("0", "1"):
+            raise ValueError("malformed cursor")
+        return (is_file == "1", name)
+
+    @classmethod
+    def list(
+        cls,
+        directory: Path,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        name_filter: Optional[str] = None,
+        with_stats: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Lists a page of the given directory.
+
+        Parameters
+        ----------
+        directory : Path
+            Absolute path of the directory
+        cursor : Optional[str], optional
+            Cursor returned by the previous page, by default None (first page)
+        limit : Optional[int], optional
+            Maximum number of entries, by default None (all entries)
+        name_filter : Optional[str], optional
+            Only entries containing this string (case-insensitive) are listed, by default None
+        with_stats : bool, optional
+            If True, size and modification time of each listed entry are added, by default False
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with keys `folders` and `files` (names), `next_cursor` (None on last page)
+            and `stats` (name to `size` and `mtime`, only when `with_stats` is set).
+
+        Raises
+        ------
+        ValueError
+            If the cursor is malformed
+        """
+        entries = cls.entries(directory)
+
+        start = 0
+        if cursor is not None:
+            start = bisect_right(entries, cls.decode_cursor(cursor))
+
+        folders: List[str] = []
+        files: List[str] = []
+        stats: Dict[str, Dict[str, Any]] = {}
+        next_cursor: Optional[str] = None
+        lowered_filter = name_filter.lower() if name_filter else None
+        for idx in range(start, len(entries)):
+            entry = entries[idx]
+            if lowered_filter is not None and lowered_filter not in entry[1].lower():
+                continue
+            if limit is not None and len(folders) + len(files) >= limit:
+                next_cursor = cls.encode_cursor(entries[idx - 1])
+                break
+            if entry[0]:
+                files.append(entry[1])
+            else:
+                folders.append(entry[1])
+            if with_stats:
+                try:
+                    entry_stat = os.stat(directory.joinpath(entry[1]))
+                    stats[entry[1]] = {
+                        "size": entry_stat.st_size,
+                        "mtime": entry_stat.st_mtime,
+                    }
+                except FileNotFoundError:
+                    # Removed since the listing was cached
+                    stats[entry[1]] = {"size": None, "mtime": None}
+
+        listing: Dict[str, Any] = {
+            "folders": folders,
+            "files": files,
+            "next_cursor": next_cursor,
+        }
+        if with_stats:
+            listing["stats"] = stats
+        return listing
@@ -0,0 +1,228 @@
+"""Append-only log of the progress events of a project's current run."""
+
+# std imports
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import struct
+from typing import Any, ClassVar, Dict, Iterator, List, Optional
+
+# internal imports
+from macworp_backend.models.project import Project
+from macworp_backend.utility.file_lock import FileLock
+
+
+class EventLog:
+    """
+    Persists the Socket.IO events of the current run, so browsers joining mid-run can be brought up to date
+    with a single bounded read instead of a page reload.
+
+    The events are appended as JSON lines to `events.jsonl`. Every `INDEX_INTERVAL`th event
+    the byte offset is appended to `events.idx` (little endian uint64), so the tail can be read by seeking
+    instead of scanning the whole log. `snapshot.json` contains the number of events, the log size,
+    the newest process counters and the error report. Appends are serialized across processes with `FileLock`.
+    """
+
+    INDEX_INTERVAL: ClassVar[int] = 64
+    """Number of events between two index entries"""
+
+    REPLAY_EVENTS: ClassVar[int] = 50
+    """Number of events replayed on join"""
+
+    MAX_ERROR_REPORT_LENGTH: ClassVar[int] = 65536
+    """Maximum number of characters of the error report in the snapshot, only the end is kept"""
+
+    OFFSET_FORMAT: ClassVar[struct.Struct] = struct.Struct("<Q")
+    """Format of an index entry"""
+
+    def __init__(self, directory: Path):
+        """
+        Parameters
+        ----------
+        directory : Path
+            Directory of the event log, created on first append
+        """
+        self.__directory = directory
+        self.__log_path = directory.joinpath("events.jsonl")
+        self.__index_path = directory.joinpath("events.idx")
+        self.__snapshot_path = directory.joinpath("snapshot.json")
+        self.__lock_path = directory.joinpath("events.lock")
+
+    @classmethod
+    def for_project(cls, project_id: int) -> Optional["EventLog"]:
+        """
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Returns
+        -------
+        Optional[EventLog]
+            Event log of the project or None if the project directory does not exist (anymore)
+        """
+        # Only the ID is needed to compute the project directory, no need to query the database
+        project_directory = Project(id=project_id).file_directory
+        if not project_directory.is_dir():
+            return None
+        return cls(project_directory.joinpath(".macworp_cache", "events"))
+
+    def append(self, event: str, data: Dict[str, Any]):
+        """
+        Appends an event and updates index and snapshot.
+
+        Parameters
+        ----------
+        event : str
+            Socket.IO event name, e.g. `new-progress`
+        data : Dict[str, Any]
+            Event data
+        """
+        line = (json.dumps({"event": event, "data": data}) + "\n").encode("utf-8")
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        with self.__lock():
+            snapshot = self.get_snapshot()
+            with self.__log_path.open("ab") as log_file:
+                offset = log_file.tell()
+                log_file.write(line)
+            if snapshot["events"] % self.__class__.INDEX_INTERVAL == 0:
+                with self.__index_path.open("ab") as index_file:
+                    index_file.write(self.__class__.OFFSET_FORMAT.pack(offset))
+
+            snapshot["events"] += 1
+            snapshot["size"] = offset + len(line)
+            if "submitted_processes" in data:
+                snapshot["submitted_processes"] = data["submitted_processes"]
+                snapshot["completed_processes"] = data["completed_processes"]
+            if "error_report" in data:
+                snapshot["error_report"] = (
+                    f"{snapshot['error_report']}{data['error_report']}\n"
+                )[-self.__class__.MAX_ERROR_REPORT_LENGTH :]
+            temporary_snapshot_path = self.__snapshot_path.with_suffix(
+                f".{os.getpid()}.tmp"
+            )
+            temporary_snapshot_path.write_text(json.dumps(snapshot), encoding="utf-8")
+            os.replace(temporary_snapshot_path, self.__snapshot_path)
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Snapshot with `events`, `size`, `submitted_processes`, `completed_processes` and `error_report`
+        """
+        snapshot = {
+            "events": 0,
+            "size": 0,
+            "submitted_processes": 0,
+            "completed_processes": 0,
+            "error_report": "",
+        }
+        try:
+            stored_snapshot = json.loads(
+                self.__snapshot_path.read_text(encoding="utf-8")
+            )
+        except (FileNotFoundError, UnicodeDecodeError, ValueError):
+            # Missing or corrupted, the project folder is writable by the workflows
+            return snapshot
+        if not isinstance(stored_snapshot, dict):
+            return snapshot
+        for key, default in snapshot.items():
+            value = stored_snapshot.get(key)
+            if isinstance(default, int):
+                if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+                    snapshot[key] = value
+            elif isinstance(value, str):
+                snapshot[key] = value
+        return snapshot
+
+    def replay(self, max_events: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Reads the snapshot and the last events. Only the log from the index entry preceding the first
+        requested event up to the size recorded in the snapshot (at most the actual log size) is read.
+        Lines which are no JSON objects with `event` and `data` are skipped.
+
+        Parameters
+        ----------
+        max_events : Optional[int], optional
+            Maximum number of events, by default `REPLAY_EVENTS`
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `snapshot` and `events` (list of dictionaries with `event` and `data`)
+        """
+        if max_events is None:
+            max_events = self.__class__.REPLAY_EVENTS
+        snapshot = self.get_snapshot()
+        first_event = max(0, snapshot["events"] - max_events)
+        index_entry = first_event // self.__class__.INDEX_INTERVAL
+        events: List[Dict[str, Any]] = []
+        if snapshot["events"] > 0:
+            try:
+                with self.__index_path.open("rb") as index_file:
+                    index_file.seek(index_entry * self.__class__.OFFSET_FORMAT.size)
+                    (offset,) = self.__class__.OFFSET_FORMAT.unpack(
+                        index_file.read(self.__class__.OFFSET_FORMAT.size)
+                    )
+                with self.__log_path.open("rb") as log_file:
+                    size = min(snapshot["size"], os.fstat(log_file.fileno()).st_size)
+                    if offset < size:
+                        log_file.seek(offset)
+                        lines = log_file.read(size - offset).splitlines()
+                    else:
+                        lines = []
+            except (FileNotFoundError, struct.error):
+                # Reset meanwhile
+                lines = []
+            skip = first_event - index_entry * self.__class__.INDEX_INTERVAL
+            for line in lines[skip:]:
+                event = self.__class__.__parse_event(line)
+                if event is not None:
+                    events.append(event)
+        return {"snapshot": snapshot, "events": events}
+
+    @classmethod
+    def __parse_event(cls, line: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Parameters
+        ----------
+        line : bytes
+            Line of the log
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            Event with `event` and `data` or None if the line is corrupted
+        """
+        try:
+            event = json.loads(line)
+        except (UnicodeDecodeError, ValueError):
+            return None
+        if (
+            not isinstance(event, dict)
+            or not isinstance(event.get("event"), str)
+            or not isinstance(event.get("data"), dict)
+        ):
+            return None
+        return event
+
+    def reset(self):
+        """
+        Removes all events, e.g. when a new run is scheduled.
+        """
+        if not self.__directory.is_dir():
+            return
+        with self.__lock():
+            self.__snapshot_path.unlink(missing_ok=True)
+            self.__index_path.unlink(missing_ok=True)
+            self.__log_path.unlink(missing_ok=True)
+
+    @contextmanager
+    def __lock(self) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the event log, shared across processes, see `FileLock`.
+        """
+        with FileLock.exclusive(self.__lock_path):
+            yield
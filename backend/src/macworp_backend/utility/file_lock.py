@@ -0,0 +1,42 @@
+"""Inter-process file locks which do not block the eventlet hub."""
+
+# std imports
+from contextlib import contextmanager
+import fcntl
+from pathlib import Path
+import time
+from typing import ClassVar, Iterator
+
+
+class FileLock:
+    """
+    Exclusive `flock` on a lock file, shared across processes.
+    The lock is polled instead of blocking, as a blocking `flock` would also block
+    all other green threads of the process when running with eventlet.
+    """
+
+    POLL_INTERVAL: ClassVar[float] = 0.1
+    """Seconds between attempts to acquire a lock"""
+
+    @classmethod
+    @contextmanager
+    def exclusive(cls, lock_path: Path) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the given file, created if missing.
+
+        Parameters
+        ----------
+        lock_path : Path
+            Lock file
+        """
+        with lock_path.open("a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    time.sleep(cls.POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,250 @@
+"""Line-offset index for serving line ranges of large text files."""
+
+# std imports
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import ClassVar, Dict, List, Optional
+
+
+class LineIndex:
+    """
+    Sparse line-offset index of a text file, which records the byte offset of every
+    `LINE_INDEX_INTERVAL`-th line. Reading a line range only needs a seek to the closest
+    indexed line and skipping at most `LINE_INDEX_INTERVAL` lines.
+
+    The index is stored in the given index directory and is built lazily on first access.
+    Log files usually only grow, so an existing index is extended from the last indexed byte
+    instead of scanning the whole file again. If the file was replaced (other inode), shrank,
+    its beginning changed or the last indexed byte is no longer a line break, the index is rebuilt.
+    """
+
+    LINE_INDEX_INTERVAL: ClassVar[int] = 10_000
+    """Number of lines between two entries of the index"""
+
+    MAX_LINES_PER_READ: ClassVar[int] = 10_000
+    """Maximum number of lines served per request"""
+
+    FINGERPRINT_SIZE: ClassVar[int] = 4096
+    """Number of bytes at the beginning of the file used to detect a replaced file"""
+
+    def __init__(self, path: Path, index_directory: Path):
+        """
+        Creates a new LineIndex.
+
+        Parameters
+        ----------
+        path : Path
+            Full path to the text file crated with `Project.get_path()`
+        index_directory : Path
+            Directory for storing the index
+        """
+        self.__path = path
+        self.__index_path = index_directory.joinpath(
+            f"{hashlib.sha1(str(path).encode('utf-8')).hexdigest()}.lines.json"
+        )
+        self.__index: Optional[Dict] = None
+        self.__file_size: int = 0
+
+    @property
+    def total_lines(self) -> int:
+        """
+        Returns
+        -------
+        int
+            Number of lines, including an unterminated last line
+        """
+        index = self.__get_index()
+        return index["line_count"] + int(self.__file_size > index["indexed_bytes"])
+
+    def read_lines(self, start: int, count: int) -> List[str]:
+        """
+        Reads a range of lines.
+
+        Parameters
+        ----------
+        start : int
+            Index of the first line
+        count : int
+            Maximum number of lines
+
+        Returns
+        -------
+        List[str]
+            Lines without line breaks, invalid UTF-8 is replaced
+        """
+        index = self.__get_index()
+        if start < 0 or count < 1 or start >= self.total_lines:
+            return []
+
+        indexed_line = min(
+            start // self.__class__.LINE_INDEX_INTERVAL, len(index["offsets"]) - 1
+        )
+        lines: List[str] = []
+        with self.__path.open("rb") as text_file:
+            if indexed_line >= 0:
+                text_file.seek(index["offsets"][indexed_line])
+                skip = start - indexed_line * self.__class__.LINE_INDEX_INTERVAL
+            else:
+                # Only an unterminated first line
+                skip = start
+            for line in text_file:
+                if skip > 0:
+                    skip -= 1
+                    continue
+                lines.append(line.decode("utf-8", errors="replace").rstrip("\r\n"))
+                if len(lines) >= count:
+                    break
+        return lines
+
+    def head(self, count: int) -> List[str]:
+        """
+        Parameters
+        ----------
+        count : int
+            Maximum number of lines
+
+        Returns
+        -------
+        List[str]
+            First lines of the file
+        """
+        return self.read_lines(0, count)
+
+    def tail(self, count: int) -> List[str]:
+        """
+        Parameters
+        ----------
+        count : int
+            Maximum number of lines
+
+        Returns
+        -------
+        List[str]
+            Last lines of the file
+        """
+        return self.read_lines(max(0, self.total_lines - count), count)
+
+    def __get_fingerprint(self, length: int) -> str:
+        """
+        Parameters
+        ----------
+        length : int
+            Number of bytes from the beginning of the file, at most `FINGERPRINT_SIZE`
+
+        Returns
+        -------
+        str
+            SHA1 of the first bytes of the file
+        """
+        with self.__path.open("rb") as text_file:
+            return hashlib.sha1(
+                text_file.read(min(length, self.__class__.FINGERPRINT_SIZE))
+            ).hexdigest()
+
+    def __is_up_to_date(self, index: Dict, inode: int) -> bool:
+        """
+        Checks if the index still matches the beginning of the file, i.e. the file was only appended to.
+
+        Parameters
+        ----------
+        index : Dict
+            Stored index
+        inode : int
+            Current inode of the file
+
+        Returns
+        -------
+        bool
+            True if the index can be used or extended
+        """
+        if index["inode"] != inode or index["indexed_bytes"] > self.__file_size:
+            return False
+        if index["fingerprint"] != self.__get_fingerprint(index["indexed_bytes"]):
+            return False
+        if index["indexed_bytes"] == 0:
+            return True
+        # The indexed part ends with a complete line
+        with self.__path.open("rb") as text_file:
+            text_file.seek(index["indexed_bytes"] - 1)
+            return text_file.read(1) == b"\n"
+
+    def __get_index(self) -> Dict:
+        """
+        Returns the index. Loads it from the index directory, extends it if the file grew
+        or (re)builds it, if missing or outdated.
+
+        Returns
+        -------
+        Dict
+            Index with keys `indexed_bytes` (bytes up to the end of the last complete line),
+            `line_count` (complete lines), `offsets`, `fingerprint` and `inode`
+        """
+        if self.__index is not None:
+            return self.__index
+
+        file_stat = self.__path.stat()
+        self.__file_size = file_stat.st_size
+        index: Optional[Dict] = None
+        if self.__index_path.is_file():
+            try:
+                stored_index = json.loads(self.__index_path.read_text(encoding="utf-8"))
+                if self.__is_up_to_date(stored_index, file_stat.st_ino):
+                    index = stored_index
+            except (ValueError, KeyError):
+                pass
+
+        if index is None:
+            index = {
+                "indexed_bytes": 0,
+                "line_count": 0,
+                "offsets": [],
+                "fingerprint": "",
+                "inode": file_stat.st_ino,
+            }
+
+        if index["indexed_bytes"] < self.__file_size and self.__extend(index):
+            index["fingerprint"] = self.__get_fingerprint(index["indexed_bytes"])
+            self.__index_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_index_path = self.__index_path.with_suffix(f".{os.getpid()}.tmp")
+            temporary_index_path.write_text(json.dumps(index), encoding="utf-8")
+            os.replace(temporary_index_path, self.__index_path)
+
+        self.__index = index
+        return index
+
+    def __extend(self, index: Dict) -> bool:
+        """
+        Scans the file from the last indexed byte up to the current file size and
+        adds the complete lines to the index.
+
+        Parameters
+        ----------
+        index : Dict
+            Index to extend in place
+
+        Returns
+        -------
+        bool
+            True if lines were added
+        """
+        position = index["indexed_bytes"]
+        line_count = index["line_count"]
+        offsets = index["offsets"]
+        with self.__path.open("rb") as text_file:
+            text_file.seek(position)
+            for line in text_file:
+                if position + len(line) > self.__file_size or not line.endswith(b"\n"):
+                    # Unterminated last line or data appended while scanning
+                    break
+                if line_count % self.__class__.LINE_INDEX_INTERVAL == 0:
+                    offsets.append(position)
+                line_count += 1
+                position += len(line)
+
+        if position == index["indexed_bytes"]:
+            return False
+        index["indexed_bytes"] = position
+        index["line_count"] = line_count
+        return True
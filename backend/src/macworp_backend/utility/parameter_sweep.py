@@ -0,0 +1,158 @@
+"""Expansion of parameter sweeps into single workflow runs."""
+
+# std imports
+from copy import deepcopy
+import itertools
+import math
+from typing import Any, ClassVar, Dict, List, Union
+
+Number = Union[int, float]
+"""Numeric parameter value"""
+
+
+class ParameterSweep:
+    """
+    Expands workflow parameters with sweep definitions into the Cartesian product of all values.
+
+    A dynamic parameter is swept by adding a `sweep` key to it, either with a list of values
+    (`{"sweep": {"values": [...]}}`, any parameter type) or an inclusive range
+    (`{"sweep": {"start": 0.1, "stop": 0.5, "step": 0.1}}`, only `number` parameters).
+    Parameters without `sweep` have the same value in every run.
+    """
+
+    SWEEP_KEY: ClassVar[str] = "sweep"
+    """Key of the sweep definition within a workflow parameter"""
+
+    MAX_RANGE_VALUES: ClassVar[int] = 100_000
+    """Maximum number of values of a range, checked before the values are created"""
+
+    FLOAT_PRECISION: ClassVar[int] = 12
+    """Number of decimals range values are rounded to, avoiding floating point artifacts like `0.30000000000000004`"""
+
+    @classmethod
+    def get_sweep_values(cls, param: Dict[str, Any]) -> List[Any]:
+        """
+        Returns the values of a swept parameter.
+
+        Parameters
+        ----------
+        param : Dict[str, Any]
+            Workflow parameter with sweep definition
+
+        Returns
+        -------
+        List[Any]
+            Values
+
+        Raises
+        ------
+        ValueError
+            If the sweep definition is invalid
+        """
+        sweep = param[cls.SWEEP_KEY]
+        if not isinstance(sweep, dict):
+            raise ValueError("must be an object")
+        if "values" in sweep:
+            values = sweep["values"]
+            if not isinstance(values, list) or len(values) == 0:
+                raise ValueError("values must be a non-empty list")
+            if any(value is None for value in values):
+                raise ValueError("values cannot be empty")
+            return values
+        if param["type"] != "number":
+            raise ValueError("ranges are only supported for numbers, use values instead")
+        try:
+            start: Number = sweep["start"]
+            stop: Number = sweep["stop"]
+            step: Number = sweep["step"]
+        except KeyError as key_error:
+            raise ValueError(f"range is missing {key_error}") from key_error
+        if not all(
+            isinstance(value, (int, float)) and not isinstance(value, bool)
+            for value in (start, stop, step)
+        ):
+            raise ValueError("start, stop and step must be numbers")
+        if step <= 0 or stop < start:
+            raise ValueError("step must be positive and stop not smaller than start")
+        # Small tolerance, so an inclusive stop is not lost to floating point errors
+        count = math.floor((stop - start) / step + 1e-9) + 1
+        if count > cls.MAX_RANGE_VALUES:
+            raise ValueError(f"range exceeds {cls.MAX_RANGE_VALUES} values")
+        if all(isinstance(value, int) for value in (start, stop, step)):
+            return [start + index * step for index in range(count)]
+        return [round(start + index * step, cls.FLOAT_PRECISION) for index in range(count)]
+
+    @classmethod
+    def count_runs(cls, workflow_parameters: List[Dict[str, Any]]) -> int:
+        """
+        Returns the number of runs without expanding them.
+
+        Parameters
+        ----------
+        workflow_parameters : List[Dict[str, Any]]
+            Workflow parameters as send by the client
+
+        Returns
+        -------
+        int
+            Number of runs
+
+        Raises
+        ------
+        ValueError
+            If a sweep definition is invalid, the message is prefixed by the parameter label
+        """
+        run_count = 1
+        for param in workflow_parameters:
+            if cls.SWEEP_KEY not in param:
+                continue
+            try:
+                run_count *= len(cls.get_sweep_values(param))
+            except ValueError as error:
+                raise ValueError(f"{param.get('label', param['name'])}: {error}") from error
+        return run_count
+
+    @classmethod
+    def expand(cls, workflow_parameters: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Expands the parameters into one parameter list per run.
+        The sweep definitions are replaced by the respective `value`.
+        The last swept parameter varies fastest.
+
+        Parameters
+        ----------
+        workflow_parameters : List[Dict[str, Any]]
+            Workflow parameters as send by the client
+
+        Returns
+        -------
+        List[List[Dict[str, Any]]]
+            Workflow parameters of each run
+
+        Raises
+        ------
+        ValueError
+            If a sweep definition is invalid, the message is prefixed by the parameter label
+        """
+        swept_indices: List[int] = []
+        swept_values: List[List[Any]] = []
+        for index, param in enumerate(workflow_parameters):
+            if cls.SWEEP_KEY not in param:
+                continue
+            try:
+                swept_values.append(cls.get_sweep_values(param))
+            except ValueError as error:
+                raise ValueError(f"{param.get('label', param['name'])}: {error}") from error
+            swept_indices.append(index)
+
+        template = [
+            {key: value for key, value in param.items() if key != cls.SWEEP_KEY}
+            for param in workflow_parameters
+        ]
+        runs: List[List[Dict[str, Any]]] = []
+        for combination in itertools.product(*swept_values):
+            run = deepcopy(template)
+            for index, value in zip(swept_indices, combination):
+                run[index]["value"] = value
+            runs.append(run)
+        return runs
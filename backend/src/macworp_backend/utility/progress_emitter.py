@@ -0,0 +1,230 @@
+"""Coalesced and throttled progress events for the browser."""
+
+# std imports
+from collections import deque
+import os
+from threading import Lock
+import time
+from typing import Any, ClassVar, Deque, Dict, List, Optional, Tuple
+
+# internal imports
+from macworp_backend import app, socketio
+from macworp_backend.utility.event_log import EventLog
+
+
+class ProgressEmitter:
+    """
+    Merges the progress of a project into one `new-progress` event per project and interval,
+    instead of one event per workflow log. Each event contains the newest process counters,
+    the last message as `details` and up to `MAX_MESSAGES_PER_EVENT` of the messages since the
+    previous event as `messages`. Older messages are dropped and counted in `dropped_messages`.
+
+    Within the web server pending events are sent by a background task. Processes which do not
+    run the Socket.IO event loop (e.g. the workflow log consumer) pass `start_flusher=False`
+    to `add()` and call `flush()` regularly.
+
+    Every sent event is also appended to the project's `EventLog`, so browsers joining later can be caught up.
+    """
+
+    MAX_EVENTS_PER_SECOND: ClassVar[int] = 4
+    """Maximum number of progress events per project and second"""
+
+    MAX_MESSAGES_PER_EVENT: ClassVar[int] = 100
+    """Maximum number of messages per event, only the newest are kept"""
+
+    __pid: ClassVar[Optional[int]] = None
+    __pending: ClassVar[Dict[int, Dict[str, Any]]] = {}
+    __last_emitted_at: ClassVar[Dict[int, float]] = {}
+    __is_flusher_running: ClassVar[bool] = False
+    __lock: ClassVar[Lock] = Lock()
+
+    @classmethod
+    def add(
+        cls,
+        project_id: int,
+        submitted_processes: int,
+        completed_processes: int,
+        message: str,
+        start_flusher: bool = True,
+    ):
+        """
+        Adds the progress of a project to its next event.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        submitted_processes : int
+            Current number of submitted processes
+        completed_processes : int
+            Current number of completed processes
+        message : str
+            Log message, empty messages are only used as `details`
+        start_flusher : bool, optional
+            Start the background task sending the events if not running, by default True
+        """
+        with cls.__lock:
+            cls.__reset_after_fork()
+            pending = cls.__pending.get(project_id, None)
+            if pending is None:
+                pending = {
+                    "messages": deque(maxlen=cls.MAX_MESSAGES_PER_EVENT),
+                    "dropped_messages": 0,
+                }
+                cls.__pending[project_id] = pending
+            pending["submitted_processes"] = submitted_processes
+            pending["completed_processes"] = completed_processes
+            pending["details"] = message
+            if len(message) > 0:
+                messages: Deque[str] = pending["messages"]
+                if len(messages) == messages.maxlen:
+                    pending["dropped_messages"] += 1
+                messages.append(message)
+
+            start_flusher = start_flusher and not cls.__is_flusher_running
+            if start_flusher:
+                cls.__is_flusher_running = True
+        if start_flusher:
+            socketio.start_background_task(cls.__flush_continuously)
+
+    @classmethod
+    def flush(cls, force: bool = False) -> Optional[float]:
+        """
+        Sends the events of all projects whose previous event is at least one interval ago.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Send all pending events regardless of the interval, by default False
+
+        Returns
+        -------
+        Optional[float]
+            Seconds until the next pending event is due, None if nothing is pending
+        """
+        interval = 1 / cls.MAX_EVENTS_PER_SECOND
+        due_events: List[Tuple[int, Dict[str, Any]]] = []
+        next_due_in: Optional[float] = None
+        with cls.__lock:
+            cls.__reset_after_fork()
+            now = time.monotonic()
+            for project_id in list(cls.__pending.keys()):
+                wait = cls.__last_emitted_at.get(project_id, 0.0) + interval - now
+                if force or wait <= 0:
+                    due_events.append((project_id, cls.__pending.pop(project_id)))
+                    cls.__last_emitted_at[project_id] = now
+                elif next_due_in is None or wait < next_due_in:
+                    next_due_in = wait
+            # Forget projects without recent events
+            for project_id, emitted_at in list(cls.__last_emitted_at.items()):
+                if now - emitted_at > interval and project_id not in cls.__pending:
+                    del cls.__last_emitted_at[project_id]
+
+        for project_id, pending in due_events:
+            cls.__emit(
+                project_id,
+                "new-progress",
+                {
+                    "submitted_processes": pending["submitted_processes"],
+                    "completed_processes": pending["completed_processes"],
+                    "details": pending["details"],
+                    "messages": list(pending["messages"]),
+                    "dropped_messages": pending["dropped_messages"],
+                },
+            )
+        return next_due_in
+
+    @classmethod
+    def error(cls, project_id: int, error_report: str):
+        """
+        Sends an `error` event immediately, errors are neither coalesced nor throttled.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        error_report : str
+            Error report
+        """
+        cls.__emit(project_id, "error", {"error_report": error_report})
+
+    @classmethod
+    def start_run(cls, project_id: int):
+        """
+        Drops the pending event and the event log of the previous run. Must be called before the new run
+        is queued, otherwise its first events might be removed.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        """
+        cls.discard(project_id)
+        event_log = EventLog.for_project(project_id)
+        if event_log is not None:
+            event_log.reset()
+
+    @classmethod
+    def discard(cls, project_id: int):
+        """
+        Drops the pending event of a project, e.g. when the project is finished and the counters are reset.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        """
+        with cls.__lock:
+            cls.__pending.pop(project_id, None)
+
+    @staticmethod
+    def __emit(project_id: int, event: str, data: Dict[str, Any]):
+        """
+        Appends the event to the project's event log and sends it to the project's room.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        event : str
+            Event name
+        data : Dict[str, Any]
+            Event data
+        """
+        event_log = EventLog.for_project(project_id)
+        if event_log is not None:
+            try:
+                event_log.append(event, data)
+            except OSError as error:
+                # Replay is best effort, the live event is sent anyway
+                app.logger.warning(  # pylint: disable=no-member
+                    "Cannot append to event log of project %i: %s", project_id, error
+                )
+        socketio.emit(event, data, to=f"project{project_id}")
+
+    @classmethod
+    def __flush_continuously(cls):
+        """
+        Sends pending events until nothing is pending anymore.
+        """
+        while True:
+            next_due_in = cls.flush()
+            if next_due_in is None:
+                with cls.__lock:
+                    if len(cls.__pending) == 0:
+                        cls.__is_flusher_running = False
+                        return
+                continue
+            socketio.sleep(next_due_in)
+
+    @classmethod
+    def __reset_after_fork(cls):
+        """
+        Resets the state inherited from the parent process, as its background task does not exist in this process.
+        Must be called under lock.
+        """
+        if cls.__pid != os.getpid():
+            cls.__pid = os.getpid()
+            cls.__pending = {}
+            cls.__last_emitted_at = {}
+            cls.__is_flusher_running = False
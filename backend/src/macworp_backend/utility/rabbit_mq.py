@@ -1,12 +1,271 @@
+from contextlib import contextmanager
+import os
 import pika
+from pika.adapters.blocking_connection import BlockingChannel, ReturnedMessage
+from threading import Lock
 import time
 import traceback
-from typing import Tuple
+from typing import ClassVar, Iterator, List, Optional, Tuple
 
 from macworp_backend import app
 from macworp_backend.utility.configuration import Configuration
 
 
+class RabbitMQPublisherPool:
+    """
+    Per process pool of long-lived RabbitMQ connections, each with a single channel in confirm mode.
+
+    `BlockingConnection` is neither thread- nor greenlet-safe, so a channel (and its connection) is
+    handed out exclusively and returned to the pool afterwards. Broken connections are dropped and
+    replaced on the next acquire. After a fork (e.g. gunicorn workers) the inherited connections
+    are discarded, as sockets must not be shared between processes.
+    """
+
+    MAX_IDLE_CHANNELS: ClassVar[int] = 8
+    """Maximum number of idle channels kept open per process"""
+
+    PUBLISH_ATTEMPTS: ClassVar[int] = 3
+    """Number of attempts to publish a message, reconnecting in between"""
+
+    RECOVERABLE_ERRORS: ClassVar[Tuple[type, ...]] = (
+        pika.exceptions.AMQPConnectionError,
+        pika.exceptions.AMQPChannelError,
+        pika.exceptions.StreamLostError,
+        ConnectionError,
+    )
+    """Errors after which the channel is reopened and the operation is retried"""
+
+    __pid: ClassVar[Optional[int]] = None
+    __idle_channels: ClassVar[List[BlockingChannel]] = []
+    __lock: ClassVar[Lock] = Lock()
+
+    @classmethod
+    @contextmanager
+    def channel(cls) -> Iterator[BlockingChannel]:
+        """
+        Acquires a channel in confirm mode for exclusive use.
+        The channel is returned to the pool afterwards or closed if an error occurred.
+
+        Yields
+        ------
+        Iterator[BlockingChannel]
+            Channel with publisher confirms
+        """
+        channel = cls.__acquire()
+        try:
+            yield channel
+        except BaseException:
+            cls.__close(channel)
+            raise
+        cls.__release(channel)
+
+    @classmethod
+    def publish(
+        cls,
+        routing_key: str,
+        body: bytes,
+        properties: Optional[pika.BasicProperties] = None,
+    ):
+        """
+        Publishes a message to the default exchange and waits for the broker's confirmation.
+        The message is persisted by the broker, if the queue is durable.
+
+        Parameters
+        ----------
+        routing_key : str
+            Queue name
+        body : bytes
+            Message
+        properties : Optional[pika.BasicProperties], optional
+            Message properties, by default persistent delivery
+
+        Raises
+        ------
+        pika.exceptions.UnroutableError
+            If the queue does not exist
+        pika.exceptions.NackError
+            If the broker rejected the message
+        pika.exceptions.AMQPError
+            If the message could not be published after `PUBLISH_ATTEMPTS` attempts
+        """
+        if properties is None:
+            properties = pika.BasicProperties(delivery_mode=2)
+        for attempt in range(1, cls.PUBLISH_ATTEMPTS + 1):
+            try:
+                with cls.channel() as channel:
+                    channel.basic_publish(
+                        exchange="",
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties,
+                        mandatory=True,
+                    )
+                return
+            except (pika.exceptions.UnroutableError, pika.exceptions.NackError):
+                # Rejected by the broker, retrying would not change the outcome
+                raise
+            except cls.RECOVERABLE_ERRORS:
+                if attempt == cls.PUBLISH_ATTEMPTS:
+                    raise
+                app.logger.warning(  # pylint: disable=no-member
+                    "Publishing to RabbitMQ failed (attempt %i of %i), reconnecting.",
+                    attempt,
+                    cls.PUBLISH_ATTEMPTS,
+                )
+
+    @classmethod
+    def publish_batch(cls, routing_key: str, bodies: List[bytes]):
+        """
+        Publishes many messages to the default exchange in a single AMQP transaction, so either all or
+        none of the messages are enqueued and only one round trip is needed for the confirmation.
+        A channel in confirm mode can not be used for transactions, so a short-lived transactional
+        channel is opened on a pooled connection. The messages are published as mandatory,
+        like `publish()`, the returns of unroutable messages are received before the commit is confirmed.
+
+        If the connection is lost after the broker committed but before the confirmation was received,
+        the whole batch is published again. The duplicates are not executed twice, as they carry the
+        same run IDs and a run can only be claimed once, see `RunsController.claim`.
+
+        Parameters
+        ----------
+        routing_key : str
+            Queue name
+        bodies : List[bytes]
+            Messages, persisted by the broker if the queue is durable
+
+        Raises
+        ------
+        pika.exceptions.UnroutableError
+            If the queue does not exist
+        pika.exceptions.AMQPError
+            If the messages could not be published after `PUBLISH_ATTEMPTS` attempts
+        """
+        if len(bodies) == 0:
+            return
+        properties = pika.BasicProperties(delivery_mode=2)
+        for attempt in range(1, cls.PUBLISH_ATTEMPTS + 1):
+            try:
+                with cls.channel() as channel:
+                    returned_messages: List[ReturnedMessage] = []
+
+                    def on_return(_channel, method, return_properties, body):
+                        returned_messages.append(
+                            ReturnedMessage(method, return_properties, body)
+                        )
+
+                    transaction_channel = channel.connection.channel()
+                    transaction_channel.add_on_return_callback(on_return)
+                    transaction_channel.tx_select()
+                    for body in bodies:
+                        transaction_channel.basic_publish(
+                            exchange="",
+                            routing_key=routing_key,
+                            body=body,
+                            properties=properties,
+                            mandatory=True,
+                        )
+                    transaction_channel.tx_commit()
+                    # Dispatches the returns received before the commit was confirmed
+                    channel.connection.process_data_events(time_limit=0)
+                    transaction_channel.close()
+                    if len(returned_messages) > 0:
+                        raise pika.exceptions.UnroutableError(returned_messages)
+                return
+            except pika.exceptions.UnroutableError:
+                # Retrying would not change the outcome
+                raise
+            except cls.RECOVERABLE_ERRORS:
+                if attempt == cls.PUBLISH_ATTEMPTS:
+                    raise
+                app.logger.warning(  # pylint: disable=no-member
+                    "Publishing batch to RabbitMQ failed (attempt %i of %i), reconnecting.",
+                    attempt,
+                    cls.PUBLISH_ATTEMPTS,
+                )
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes all idle channels of this process.
+        """
+        with cls.__lock:
+            idle_channels = cls.__idle_channels if cls.__pid == os.getpid() else []
+            cls.__idle_channels = []
+        for channel in idle_channels:
+            cls.__close(channel)
+
+    @classmethod
+    def __acquire(cls) -> BlockingChannel:
+        """
+        Returns an idle channel which is still open or opens a new one.
+
+        Returns
+        -------
+        BlockingChannel
+            Channel in confirm mode
+        """
+        while True:
+            with cls.__lock:
+                if cls.__pid != os.getpid():
+                    # Forked, connections belong to the parent process
+                    cls.__pid = os.getpid()
+                    cls.__idle_channels = []
+                if len(cls.__idle_channels) == 0:
+                    break
+                channel = cls.__idle_channels.pop()
+            try:
+                # Handles heartbeats and detects connections closed by the broker while idle
+                channel.connection.process_data_events(time_limit=0)
+                if channel.is_open:
+                    return channel
+            except cls.RECOVERABLE_ERRORS:
+                pass
+            cls.__close(channel)
+
+        connection = pika.BlockingConnection(
+            pika.URLParameters(Configuration.values()["rabbit_mq"]["url"])
+        )
+        channel = connection.channel()
+        channel.confirm_delivery()
+        return channel
+
+    @classmethod
+    def __release(cls, channel: BlockingChannel):
+        """
+        Returns the channel to the pool or closes it, if the pool is full or the channel is closed.
+
+        Parameters
+        ----------
+        channel : BlockingChannel
+            Channel
+        """
+        if channel.is_open:
+            with cls.__lock:
+                if (
+                    cls.__pid == os.getpid()
+                    and len(cls.__idle_channels) < cls.MAX_IDLE_CHANNELS
+                ):
+                    cls.__idle_channels.append(channel)
+                    return
+        cls.__close(channel)
+
+    @staticmethod
+    def __close(channel: BlockingChannel):
+        """
+        Closes the channel's connection, ignoring errors of already broken connections.
+
+        Parameters
+        ----------
+        channel : BlockingChannel
+            Channel
+        """
+        try:
+            if channel.connection.is_open:
+                channel.connection.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
 class RabbitMQ:
     @staticmethod
     def prepare_queues():
@@ -15,17 +274,17 @@ class RabbitMQ:
         """
         while True:
             try:
-                # Establish connection
-                connection = pika.BlockingConnection(
-                    pika.URLParameters(Configuration.values()["rabbit_mq"]["url"])
-                )
-                channel = connection.channel()
-
-                # Create main queue
-                channel.queue_declare(
-                    queue=Configuration.values()["rabbit_mq"]["project_workflow_queue"],
-                    durable=True,
-                )
+                with RabbitMQPublisherPool.channel() as channel:
+                    # Create main queue
+                    channel.queue_declare(
+                        queue=Configuration.values()["rabbit_mq"]["project_workflow_queue"],
+                        durable=True,
+                    )
+                    # Create workflow log queue
+                    channel.queue_declare(
+                        queue=Configuration.values()["rabbit_mq"]["workflow_log_queue"],
+                        durable=True,
+                    )
 
                 break
             except pika.exceptions.AMQPConnectionError:
@@ -38,7 +297,7 @@ class RabbitMQ:
                 raise BaseException(traceback.format_exc())
 
     @staticmethod
-    def get_queue_statistics(queue: str) -> Tuple[int, int]:
+    def get_queue_statistics(queue: str) -> Optional[Tuple[int, int]]:
         """
         Get the consumer and message count of the given queue.
 
@@ -49,22 +308,16 @@ class RabbitMQ:
 
         Returns
         -------
-        Returns a tuple with consumer count and message count
+        Returns a tuple with consumer count and message count or None if the queue is not available
         """
         try:
-            # Establish connection
-            connection = pika.BlockingConnection(
-                pika.URLParameters(Configuration.values()["rabbit_mq"]["url"])
-            )
-            channel = connection.channel()
-
-            # Get queue statistics
-            queue_state = channel.queue_declare(
-                queue=Configuration.values()["rabbit_mq"]["project_workflow_queue"],
-                durable=True,
-                passive=True,
-            )
-            connection.close()
+            with RabbitMQPublisherPool.channel() as channel:
+                # Get queue statistics
+                queue_state = channel.queue_declare(
+                    queue=queue,
+                    durable=True,
+                    passive=True,
+                )
 
             return queue_state.method.consumer_count, queue_state.method.message_count
         except:
@@ -0,0 +1,579 @@
+"""Columnar (Parquet) sidecar cache for result tables."""
+
+# std imports
+from contextlib import contextmanager
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import ClassVar, Dict, Iterator, List, Optional, Tuple, Union
+
+# 3rd party imports
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+from pyarrow import csv as pa_csv  # type: ignore[import-untyped]
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+# internal imports
+from macworp_backend.errors.unknown_table_columns import UnknownTableColumns
+from macworp_backend.utility.file_lock import FileLock
+from macworp_backend.utility.table_reader import TableFilter, TableReader, apply_filters
+
+
+class ParquetTableReader:
+    """
+    Reads slices of a table converted to Parquet by `TableCache`.
+    Offers the same interface as `TableReader` but only reads the row groups and columns
+    which are actually requested.
+    """
+
+    PUSHDOWN_FILTER_OPERATORS: ClassVar[Tuple[str, ...]] = (
+        "==",
+        "<",
+        "<=",
+        ">",
+        ">=",
+        "in",
+    )
+    """
+    Filter operators evaluated by the Parquet reader. `!=` and `not in` are only applied by pandas,
+    as the Parquet reader drops null rows for them while pandas keeps them.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Creates a new ParquetTableReader.
+
+        Parameters
+        ----------
+        path : Path
+            Path to the Parquet file
+        """
+        self.__path = path
+        self.__parquet_file = pq.ParquetFile(path)
+
+    @property
+    def path(self) -> Path:
+        """
+        Returns
+        -------
+        Path
+            Path to the Parquet file
+        """
+        return self.__path
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Returns
+        -------
+        List[str]
+            Column names of the table
+        """
+        return list(self.__parquet_file.schema_arrow.names)
+
+    @property
+    def total_rows(self) -> int:
+        """
+        Returns
+        -------
+        int
+            Number of rows
+        """
+        return self.__parquet_file.metadata.num_rows
+
+    def read_filtered(
+        self, columns: Optional[List[str]], filters: List[TableFilter]
+    ) -> pd.DataFrame:
+        """
+        Reads all rows matching the given filters.
+        Filters are pushed down to the Parquet reader, so row groups which can not
+        match (by their column statistics) are skipped.
+
+        Parameters
+        ----------
+        columns : Optional[List[str]]
+            Columns to read, None for all columns. Must contain the filtered columns.
+        filters : List[TableFilter]
+            Filters, combined with logical AND
+
+        Returns
+        -------
+        pd.DataFrame
+            Matching rows
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        ValueError
+            If a filter can not be applied
+        """
+        self.validate_columns(columns)
+        pushdown_filters = [
+            (column, operator, value)
+            for column, operator, value in filters
+            if operator in self.PUSHDOWN_FILTER_OPERATORS
+        ]
+        try:
+            table = pq.read_table(
+                self.__path,
+                columns=columns,
+                filters=pushdown_filters if len(pushdown_filters) > 0 else None,
+            )
+        except (
+            pa.ArrowInvalid,
+            pa.ArrowNotImplementedError,
+            pa.ArrowTypeError,
+            TypeError,
+        ):
+            # Filter value does not match the column type, let pandas decide
+            table = pq.read_table(self.__path, columns=columns)
+        return apply_filters(table.to_pandas(), filters)
+
+    def validate_columns(self, columns: Optional[List[str]]):
+        """
+        Checks if the given columns are part of the table.
+
+        Parameters
+        ----------
+        columns : Optional[List[str]]
+            Columns to check, None for all columns
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        """
+        if columns is not None:
+            unknown_columns = set(columns) - set(self.columns)
+            if len(unknown_columns) > 0:
+                raise UnknownTableColumns(sorted(unknown_columns))
+
+    def read(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Reads a slice of rows, touching only the row groups containing the slice.
+
+        Parameters
+        ----------
+        offset : int, optional
+            Index of the first row, by default 0
+        limit : Optional[int], optional
+            Maximum number of rows, by default None (all rows after offset)
+        columns : Optional[List[str]], optional
+            Columns to read, by default None (all columns)
+
+        Returns
+        -------
+        pd.DataFrame
+            Requested rows
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        """
+        self.validate_columns(columns)
+
+        end = self.total_rows if limit is None else min(offset + limit, self.total_rows)
+        row_groups: List[int] = []
+        first_row_group_start = 0
+        row_group_start = 0
+        for row_group in range(self.__parquet_file.num_row_groups):
+            row_group_end = (
+                row_group_start
+                + self.__parquet_file.metadata.row_group(row_group).num_rows
+            )
+            if row_group_end > offset and row_group_start < end:
+                if len(row_groups) == 0:
+                    first_row_group_start = row_group_start
+                row_groups.append(row_group)
+            row_group_start = row_group_end
+
+        if len(row_groups) == 0:
+            return (
+                self.__parquet_file.schema_arrow.empty_table()
+                .select(columns if columns is not None else self.columns)
+                .to_pandas()
+            )
+
+        return (
+            self.__parquet_file.read_row_groups(row_groups, columns=columns)
+            .slice(offset - first_row_group_start, end - offset)
+            .to_pandas()
+        )
+
+
+class TableCache:
+    """
+    Converts tables once into Parquet files and keeps them in the given cache directory.
+    Cache entries are keyed by the table path, size and modification time, so a changed table
+    is converted again. When the cache directory exceeds its byte budget, the least recently
+    used entries (by modification time, which is updated on each access) are removed.
+    """
+
+    SUFFIX: ClassVar[str] = ".parquet"
+    """Suffix of cache entries"""
+
+    CSV_BLOCK_SIZE: ClassVar[int] = 16 << 20
+    """Bytes per block when streaming CSV/TSV files into Parquet (roughly one row group per block)"""
+
+    EXCEL_ROW_GROUP_SIZE: ClassVar[int] = 65_536
+    """Rows per row group for converted XLSX files"""
+
+    NULL_VALUES: ClassVar[List[str]] = [
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    ]
+    """Values read as null, same as pandas' default `na_values`, so cached and uncached tables are equal"""
+
+    TEMPORARY_SUFFIX: ClassVar[str] = ".tmp"
+    """Suffix of files which are currently written"""
+
+    def __init__(self, cache_directory: Path, max_bytes: int):
+        """
+        Creates a new TableCache.
+
+        Parameters
+        ----------
+        cache_directory : Path
+            Directory for the Parquet files, created when needed
+        max_bytes : int
+            Byte budget of the cache directory
+        """
+        self.__cache_directory = cache_directory
+        self.__max_bytes = max_bytes
+
+    @classmethod
+    def get_path_key(cls, table_path: Path) -> str:
+        """
+        Returns the part of the cache key depending on the table path only.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+
+        Returns
+        -------
+        str
+            Key
+        """
+        return hashlib.sha1(str(table_path).encode("utf-8")).hexdigest()
+
+    def get_entry_path(self, table_path: Path) -> Path:
+        """
+        Returns the cache entry path for the current version of the table.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+
+        Returns
+        -------
+        Path
+            Path of the Parquet file (may not exist)
+        """
+        table_stat = table_path.stat()
+        return self.__cache_directory.joinpath(
+            f"{self.get_path_key(table_path)}-{table_stat.st_size}-{table_stat.st_mtime_ns}{self.SUFFIX}"
+        )
+
+    def get_sidecar_path(self, table_path: Path, suffix: str) -> Path:
+        """
+        Returns the path of a file derived from the current version of the table, e.g. statistics.
+        Sidecar files are removed together with the cache entry and when the table changes.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+        suffix : str
+            Suffix of the sidecar file, e.g. `.stats.json`
+
+        Returns
+        -------
+        Path
+            Path of the sidecar file (may not exist)
+        """
+        return self.get_entry_path(table_path).with_suffix(suffix)
+
+    def get(self, table_reader: TableReader) -> Optional[Path]:
+        """
+        Returns the Parquet file for the given table, converts it if necessary.
+
+        Parameters
+        ----------
+        table_reader : TableReader
+            Reader of the source table
+
+        Returns
+        -------
+        Optional[Path]
+            Path to the Parquet file or None if the table is larger than the
+            cache budget or could not be converted.
+        """
+        table_path = table_reader.path
+        if table_path.stat().st_size > self.__max_bytes:
+            return None
+
+        entry_path = self.get_entry_path(table_path)
+        if entry_path.is_file():
+            os.utime(entry_path)
+            return entry_path
+
+        self.__cache_directory.mkdir(parents=True, exist_ok=True)
+        with self.__lock(self.get_path_key(table_path)):
+            # Converted by a concurrent request meanwhile
+            if entry_path.is_file():
+                os.utime(entry_path)
+                return entry_path
+
+            # Remove outdated versions of the same table
+            for outdated_entry in self.__cache_directory.glob(
+                f"{self.get_path_key(table_path)}-*"
+            ):
+                if outdated_entry.suffix != self.TEMPORARY_SUFFIX:
+                    outdated_entry.unlink(missing_ok=True)
+
+            (temporary_file, temporary_name) = tempfile.mkstemp(
+                suffix=self.TEMPORARY_SUFFIX, prefix="tmp-", dir=self.__cache_directory
+            )
+            os.close(temporary_file)
+            temporary_path = Path(temporary_name)
+            try:
+                if table_reader.is_excel:
+                    self.__convert_excel(table_path, temporary_path)
+                else:
+                    self.__convert_csv(
+                        table_path,
+                        temporary_path,
+                        TableReader.SEPARATORS[table_path.suffix.lower()],
+                    )
+            except (pa.ArrowException, ValueError):
+                temporary_path.unlink(missing_ok=True)
+                return None
+            os.replace(temporary_path, entry_path)
+
+        self.evict(keep=entry_path)
+        return entry_path
+
+    def open(self, table_reader: TableReader) -> Union[TableReader, ParquetTableReader]:
+        """
+        Returns a reader for the cached Parquet file or the given reader if the table can not be cached.
+
+        Parameters
+        ----------
+        table_reader : TableReader
+            Reader of the source table
+
+        Returns
+        -------
+        Union[TableReader, ParquetTableReader]
+            Reader for the table
+        """
+        entry_path = self.get(table_reader)
+        if entry_path is None:
+            return table_reader
+        return ParquetTableReader(entry_path)
+
+    def evict(self, keep: Optional[Path] = None):
+        """
+        Removes the least recently used entries (including their sidecar files)
+        until the cache directory is within its byte budget.
+
+        Parameters
+        ----------
+        keep : Optional[Path], optional
+            Entry which is never removed, by default None
+        """
+        if not self.__cache_directory.is_dir():
+            return
+        files = [
+            (file_stat.st_mtime_ns, file_stat.st_size, file_path)
+            for file_path in self.__cache_directory.iterdir()
+            if file_path.is_file()
+            for file_stat in (file_path.stat(),)
+        ]
+        total_bytes = sum(file_size for _, file_size, _ in files)
+        for _, _, file_path in sorted(files):
+            if total_bytes <= self.__max_bytes:
+                break
+            if file_path.suffix != self.SUFFIX or file_path == keep:
+                continue
+            for entry_file in self.__cache_directory.glob(f"{file_path.stem}*"):
+                total_bytes -= entry_file.stat().st_size
+                entry_file.unlink(missing_ok=True)
+
+    @contextmanager
+    def __lock(self, key: str) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the conversion of a table, shared across processes, see `FileLock`.
+
+        Parameters
+        ----------
+        key : str
+            Path key of the table, see `get_path_key()`
+        """
+        with FileLock.exclusive(self.__cache_directory.joinpath(f"{key}.lock")):
+            yield
+
+    @classmethod
+    def __convert_csv(cls, table_path: Path, parquet_path: Path, separator: str):
+        """
+        Streams a CSV/TSV file into a Parquet file with bounded memory.
+        Values are parsed like `pandas.read_csv()` does by default, so the cached table matches the uncached one:
+        dates and times are kept as strings and `NULL_VALUES` are null in all columns.
+        If type inference from the first block does not hold for later blocks,
+        the conversion is repeated with all columns as strings.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+        parquet_path : Path
+            Path of the Parquet file to write
+        separator : str
+            Column separator
+        """
+        read_options = pa_csv.ReadOptions(block_size=cls.CSV_BLOCK_SIZE)
+        parse_options = pa_csv.ParseOptions(
+            delimiter=separator, newlines_in_values=True
+        )
+        with pa_csv.open_csv(
+            table_path,
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=cls.__get_convert_options({}),
+        ) as reader:
+            inferred_schema = reader.schema
+        try:
+            cls.__write_csv_batches(
+                table_path,
+                parquet_path,
+                read_options,
+                parse_options,
+                cls.__get_convert_options(
+                    {
+                        field.name: pa.string()
+                        for field in inferred_schema
+                        if pa.types.is_temporal(field.type)
+                    }
+                ),
+            )
+        except pa.ArrowInvalid:
+            cls.__write_csv_batches(
+                table_path,
+                parquet_path,
+                read_options,
+                parse_options,
+                cls.__get_convert_options(
+                    {name: pa.string() for name in inferred_schema.names}
+                ),
+            )
+
+    @classmethod
+    def __get_convert_options(
+        cls, column_types: Dict[str, pa.DataType]
+    ) -> pa_csv.ConvertOptions:
+        """
+        Parameters
+        ----------
+        column_types : Dict[str, pa.DataType]
+            Explicit column types, other columns are inferred
+
+        Returns
+        -------
+        pa_csv.ConvertOptions
+            Arrow CSV convert options with the null handling of pandas
+        """
+        return pa_csv.ConvertOptions(
+            column_types=column_types,
+            null_values=cls.NULL_VALUES,
+            strings_can_be_null=True,
+        )
+
+    @staticmethod
+    def __write_csv_batches(
+        table_path: Path,
+        parquet_path: Path,
+        read_options: pa_csv.ReadOptions,
+        parse_options: pa_csv.ParseOptions,
+        convert_options: pa_csv.ConvertOptions,
+    ):
+        """
+        Writes the record batches of a streaming CSV reader into a Parquet file.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+        parquet_path : Path
+            Path of the Parquet file to write
+        read_options : pa_csv.ReadOptions
+            Arrow CSV read options
+        parse_options : pa_csv.ParseOptions
+            Arrow CSV parse options
+        convert_options : pa_csv.ConvertOptions
+            Arrow CSV convert options
+        """
+        with pa_csv.open_csv(
+            table_path,
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=convert_options,
+        ) as reader:
+            with pq.ParquetWriter(parquet_path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+
+    @classmethod
+    def __convert_excel(cls, table_path: Path, parquet_path: Path):
+        """
+        Converts the first sheet of a XLSX file into a Parquet file.
+        Columns with mixed types are stored as strings.
+
+        Parameters
+        ----------
+        table_path : Path
+            Path to the table
+        parquet_path : Path
+            Path of the Parquet file to write
+        """
+        dataframe = pd.read_excel(table_path)
+        dataframe.columns = [str(column) for column in dataframe.columns]
+        try:
+            table = pa.Table.from_pandas(dataframe, preserve_index=False)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            dataframe = dataframe.astype(
+                {
+                    column: str
+                    for column in dataframe.columns
+                    if dataframe[column].dtype == object
+                }
+            )
+            table = pa.Table.from_pandas(dataframe, preserve_index=False)
+        pq.write_table(table, parquet_path, row_group_size=cls.EXCEL_ROW_GROUP_SIZE)
@@ -0,0 +1,239 @@
+"""Server-side filtering, sorting and aggregation of result tables."""
+
+# std imports
+from typing import Any, ClassVar, List, Literal, Optional, Tuple, Union
+
+# 3rd party imports
+import pandas as pd
+from pydantic import BaseModel, Field, model_validator
+
+# internal imports
+from macworp_backend.errors.unknown_table_columns import UnknownTableColumns
+from macworp_backend.utility.table_cache import ParquetTableReader
+from macworp_backend.utility.table_reader import TableFilter, TableReader
+
+
+class TableQueryFilter(BaseModel):
+    """Filter on a single column"""
+
+    column: str
+    """Column name"""
+
+    operator: Literal["==", "!=", "<", "<=", ">", ">=", "in", "not in", "contains"]
+    """Comparison operator. `in` and `not in` expect a list as value, `contains` is a case-insensitive substring match."""
+
+    value: Any
+    """Value to compare with"""
+
+    @model_validator(mode="after")
+    def check_list_value(self) -> "TableQueryFilter":
+        """
+        Checks that `in` and `not in` are used with a list.
+
+        Returns
+        -------
+        TableQueryFilter
+            Validated filter
+
+        Raises
+        ------
+        ValueError
+            If the value of `in` or `not in` is not a list
+        """
+        if self.operator in ("in", "not in") and not isinstance(self.value, list):
+            raise ValueError(f"operator '{self.operator}' expects a list as value")
+        return self
+
+
+class TableQuerySort(BaseModel):
+    """Sort key"""
+
+    column: str
+    """Column name, after aggregation the aggregated column names can be used"""
+
+    ascending: bool = True
+    """Sort direction"""
+
+
+class TableQueryAggregation(BaseModel):
+    """Aggregation of a column within each group. The result column is named `<column>_<function>`."""
+
+    column: str
+    """Column name"""
+
+    function: Literal["count", "sum", "mean", "median", "min", "max", "nunique"]
+    """Aggregation function"""
+
+
+class TableQuery(BaseModel):
+    """
+    Query on a table, executed in the following order:
+    filter (all filters must match) -> group & aggregate -> sort -> page.
+    """
+
+    MAX_LIMIT: ClassVar[int] = 10_000
+    """Maximum number of rows per page"""
+
+    path: str
+    """Path to the table within the project directory"""
+
+    filters: List[TableQueryFilter] = Field(default_factory=list)
+    """Filters, combined with logical AND"""
+
+    group_by: List[str] = Field(default_factory=list)
+    """Columns to group by"""
+
+    aggregations: List[TableQueryAggregation] = Field(default_factory=list)
+    """Aggregations per group. If `group_by` is set without aggregations the number of rows per group is returned as `count`."""
+
+    sort: List[TableQuerySort] = Field(default_factory=list)
+    """Sort keys, the first has the highest priority"""
+
+    columns: Optional[List[str]] = None
+    """Columns to return, only without grouping or aggregations. By default all columns."""
+
+    offset: int = Field(default=0, ge=0)
+    """Index of the first row of the page"""
+
+    limit: int = Field(default=500, ge=1, le=MAX_LIMIT)
+    """Maximum number of rows of the page"""
+
+    @property
+    def is_aggregating(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if the query groups or aggregates rows
+        """
+        return len(self.group_by) > 0 or len(self.aggregations) > 0
+
+    def get_table_filters(self) -> List[TableFilter]:
+        """
+        Returns
+        -------
+        List[TableFilter]
+            Filters as `(column, operator, value)`
+        """
+        return [
+            (table_filter.column, table_filter.operator, table_filter.value)
+            for table_filter in self.filters
+        ]
+
+    def get_required_columns(self, table_columns: List[str]) -> List[str]:
+        """
+        Returns the columns which need to be read from the table to execute the query.
+
+        Parameters
+        ----------
+        table_columns : List[str]
+            All columns of the table, to keep the original order
+
+        Returns
+        -------
+        List[str]
+            Required columns
+        """
+        required_columns = {table_filter.column for table_filter in self.filters}
+        if self.is_aggregating:
+            required_columns.update(self.group_by)
+            required_columns.update(
+                aggregation.column for aggregation in self.aggregations
+            )
+        else:
+            required_columns.update(
+                self.columns if self.columns is not None else table_columns
+            )
+            required_columns.update(sort.column for sort in self.sort)
+        return [column for column in table_columns if column in required_columns] + sorted(
+            required_columns - set(table_columns)
+        )
+
+    def execute(
+        self, table_reader: Union[TableReader, ParquetTableReader]
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Executes the query.
+
+        Parameters
+        ----------
+        table_reader : Union[TableReader, ParquetTableReader]
+            Reader for the table
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, int]
+            Rows of the requested page and total number of result rows
+
+        Raises
+        ------
+        UnknownTableColumns
+            If a used column is not part of the table
+        ValueError
+            If a filter, aggregation or sort can not be applied
+        """
+        result = table_reader.read_filtered(
+            self.get_required_columns(table_reader.columns), self.get_table_filters()
+        )
+
+        if self.is_aggregating:
+            try:
+                result = self.__aggregate(result)
+            except TypeError as error:
+                raise ValueError(f"aggregation not applicable: {error}") from error
+
+        if len(self.sort) > 0:
+            unknown_columns = {sort.column for sort in self.sort} - set(result.columns)
+            if len(unknown_columns) > 0:
+                raise UnknownTableColumns(sorted(unknown_columns))
+            try:
+                result = result.sort_values(
+                    by=[sort.column for sort in self.sort],
+                    ascending=[sort.ascending for sort in self.sort],
+                    kind="stable",
+                    na_position="last",
+                )
+            except TypeError as error:
+                raise ValueError("sort columns contain values which can not be compared") from error
+
+        if not self.is_aggregating and self.columns is not None:
+            result = result[self.columns]
+
+        return result.iloc[self.offset : self.offset + self.limit], len(result)
+
+    def __aggregate(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Groups and aggregates the given rows.
+
+        Parameters
+        ----------
+        dataframe : pd.DataFrame
+            Filtered rows
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per group, group columns first followed by the aggregated columns.
+        """
+        if len(self.group_by) == 0:
+            return pd.DataFrame(
+                {
+                    f"{aggregation.column}_{aggregation.function}": [
+                        dataframe[aggregation.column].agg(aggregation.function)
+                    ]
+                    for aggregation in self.aggregations
+                }
+            )
+
+        groups = dataframe.groupby(self.group_by, dropna=False, sort=False)
+        if len(self.aggregations) == 0:
+            return groups.size().reset_index(name="count")
+        return groups.agg(
+            **{
+                f"{aggregation.column}_{aggregation.function}": (
+                    aggregation.column,
+                    aggregation.function,
+                )
+                for aggregation in self.aggregations
+            }
+        ).reset_index()
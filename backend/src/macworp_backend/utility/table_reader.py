@@ -0,0 +1,410 @@
+"""Windowed reading of large CSV, TSV and XLSX tables."""
+
+# std imports
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+# 3rd party imports
+from openpyxl import load_workbook
+import pandas as pd
+
+# internal imports
+from macworp_backend.errors.unknown_table_columns import UnknownTableColumns
+from macworp_backend.errors.unknown_table_format import UnknownTableFormat
+
+
+TableFilter = Tuple[str, str, Any]
+"""Filter `(column, operator, value)`, see `FILTER_OPERATORS` for supported operators."""
+
+FILTER_OPERATORS: Tuple[str, ...] = ("==", "!=", "<", "<=", ">", ">=", "in", "not in", "contains")
+"""Supported filter operators"""
+
+
+def apply_filters(dataframe: pd.DataFrame, filters: List[TableFilter]) -> pd.DataFrame:
+    """
+    Returns the rows matching all filters.
+
+    Parameters
+    ----------
+    dataframe : pd.DataFrame
+        Rows to filter
+    filters : List[TableFilter]
+        Filters, combined with logical AND
+
+    Returns
+    -------
+    pd.DataFrame
+        Matching rows
+
+    Raises
+    ------
+    ValueError
+        If an operator is not supported or value and column type can not be compared
+    """
+    if len(filters) == 0:
+        return dataframe
+    mask = pd.Series(True, index=dataframe.index)
+    for column, operator, value in filters:
+        series = dataframe[column]
+        try:
+            match operator:
+                case "==":
+                    mask &= series == value
+                case "!=":
+                    mask &= series != value
+                case "<":
+                    mask &= series < value
+                case "<=":
+                    mask &= series <= value
+                case ">":
+                    mask &= series > value
+                case ">=":
+                    mask &= series >= value
+                case "in":
+                    mask &= series.isin(value)
+                case "not in":
+                    mask &= ~series.isin(value)
+                case "contains":
+                    mask &= series.astype(str).str.contains(str(value), case=False, regex=False)
+                case _:
+                    raise ValueError(f"unsupported filter operator '{operator}'")
+        except TypeError as error:
+            raise ValueError(f"column '{column}' can not be compared with {value!r}") from error
+    return dataframe[mask]
+
+
+class TableReader:
+    """
+    Reads slices of a table without parsing the whole file.
+
+    For CSV and TSV files a sparse row-offset index is built once and stored in the given index directory.
+    It contains the byte offset of every `ROW_INDEX_INTERVAL`-th row, so reading a page only needs
+    a seek to the closest indexed row and parsing at most `ROW_INDEX_INTERVAL` rows more than requested.
+    The index is rebuilt when size or modification time of the table changes.
+    XLSX files have no byte addressable rows and are read with `skiprows`/`nrows`.
+    """
+
+    SUPPORTED_TABLE_FORMATS: ClassVar[List[str]] = ["CSV", "TSV", "XLSX"]
+    """Supported table formats"""
+
+    SEPARATORS: ClassVar[Dict[str, str]] = {".csv": ",", ".tsv": "\t"}
+    """Separators of the supported plain text formats by suffix"""
+
+    ROW_INDEX_INTERVAL: ClassVar[int] = 10_000
+    """Number of rows between two entries of the row-offset index"""
+
+    FILTER_CHUNK_SIZE: ClassVar[int] = 100_000
+    """Number of rows parsed at once when filtering CSV/TSV files"""
+
+    def __init__(self, path: Path, index_directory: Path):
+        """
+        Creates a new TableReader.
+
+        Parameters
+        ----------
+        path : Path
+            Full path to the table crated with `Project.get_path()`
+        index_directory : Path
+            Directory for storing the row-offset index
+
+        Raises
+        ------
+        UnknownTableFormat
+            If the table format is not supported
+        """
+        self.__path = path
+        self.__index_directory = index_directory
+        self.__suffix = path.suffix.lower()
+        if self.__suffix not in self.__class__.SEPARATORS and self.__suffix != ".xlsx":
+            raise UnknownTableFormat(self.__class__.SUPPORTED_TABLE_FORMATS)
+        self.__index: Optional[Dict] = None
+
+    @property
+    def path(self) -> Path:
+        """
+        Returns
+        -------
+        Path
+            Path to the table
+        """
+        return self.__path
+
+    @property
+    def is_excel(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if the table is an XLSX file
+        """
+        return self.__suffix == ".xlsx"
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Returns
+        -------
+        List[str]
+            Column names of the table
+        """
+        if self.is_excel:
+            try:
+                return [str(column) for column in pd.read_excel(self.__path, nrows=0).columns]
+            except ValueError:
+                return []
+        return self.__get_index()["columns"]
+
+    @property
+    def total_rows(self) -> int:
+        """
+        Returns
+        -------
+        int
+            Number of rows without header
+        """
+        if self.is_excel:
+            workbook = load_workbook(self.__path, read_only=True)
+            try:
+                # First sheet, like `pandas.read_excel()`, the active sheet might be another one
+                max_row = workbook.worksheets[0].max_row
+            finally:
+                workbook.close()
+            return max(0, (max_row or 0) - 1)
+        return self.__get_index()["total_rows"]
+
+    def validate_columns(self, columns: Optional[List[str]]):
+        """
+        Checks if the given columns are part of the table.
+
+        Parameters
+        ----------
+        columns : Optional[List[str]]
+            Columns to check, None for all columns
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        """
+        if columns is not None:
+            unknown_columns = set(columns) - set(self.columns)
+            if len(unknown_columns) > 0:
+                raise UnknownTableColumns(sorted(unknown_columns))
+
+    def read_filtered(
+        self, columns: Optional[List[str]], filters: List[TableFilter]
+    ) -> pd.DataFrame:
+        """
+        Reads all rows matching the given filters.
+        CSV/TSV files are parsed in chunks of `FILTER_CHUNK_SIZE` rows, so only matching rows are kept in memory.
+
+        Parameters
+        ----------
+        columns : Optional[List[str]]
+            Columns to read, None for all columns. Must contain the filtered columns.
+        filters : List[TableFilter]
+            Filters, combined with logical AND
+
+        Returns
+        -------
+        pd.DataFrame
+            Matching rows
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        ValueError
+            If a filter can not be applied
+        """
+        if self.is_excel:
+            return apply_filters(self.read(0, None, columns), filters)
+
+        self.validate_columns(columns)
+        if len(self.columns) == 0:
+            return pd.DataFrame(columns=columns)
+
+        chunks = [
+            apply_filters(chunk, filters)
+            for chunk in pd.read_csv(
+                self.__path,
+                sep=self.__class__.SEPARATORS[self.__suffix],
+                usecols=columns,
+                chunksize=self.__class__.FILTER_CHUNK_SIZE,
+            )
+        ]
+        if len(chunks) == 0:
+            return pd.DataFrame(columns=columns if columns is not None else self.columns)
+        return self.__class__.order_columns(pd.concat(chunks, ignore_index=True), columns)
+
+    @staticmethod
+    def order_columns(dataframe: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+        """
+        Orders the columns as requested, as `usecols` keeps the order of the file.
+
+        Parameters
+        ----------
+        dataframe : pd.DataFrame
+            Table
+        columns : Optional[List[str]]
+            Requested columns, None to keep the order of the file
+
+        Returns
+        -------
+        pd.DataFrame
+            Table with ordered columns
+        """
+        if columns is None:
+            return dataframe
+        return dataframe[columns]
+
+    def read(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Reads a slice of rows.
+
+        Parameters
+        ----------
+        offset : int, optional
+            Index of the first row (header excluded), by default 0
+        limit : Optional[int], optional
+            Maximum number of rows, by default None (all rows after offset)
+        columns : Optional[List[str]], optional
+            Columns to read, by default None (all columns)
+
+        Returns
+        -------
+        pd.DataFrame
+            Requested rows
+
+        Raises
+        ------
+        UnknownTableColumns
+            If requested columns are not part of the table
+        """
+        self.validate_columns(columns)
+
+        if self.is_excel:
+            try:
+                return self.__class__.order_columns(
+                    pd.read_excel(
+                        self.__path,
+                        skiprows=range(1, offset + 1),
+                        nrows=limit,
+                        usecols=columns,
+                    ),
+                    columns,
+                )
+            except ValueError:
+                # Empty workbook
+                return pd.DataFrame()
+
+        index = self.__get_index()
+        if len(index["columns"]) == 0 or offset >= index["total_rows"]:
+            return pd.DataFrame(columns=columns if columns is not None else index["columns"])
+
+        indexed_row = offset // self.__class__.ROW_INDEX_INTERVAL
+        # `skiprows` counts raw lines, including blank lines and line breaks within quoted fields,
+        # while the index counts rows like `nrows` does. So the rows before the offset are parsed and dropped.
+        skipped_rows = offset - indexed_row * self.__class__.ROW_INDEX_INTERVAL
+        with self.__path.open("rb") as table_file:
+            table_file.seek(index["offsets"][indexed_row])
+            rows = pd.read_csv(
+                table_file,
+                sep=self.__class__.SEPARATORS[self.__suffix],
+                header=None,
+                names=index["columns"],
+                nrows=skipped_rows + limit if limit is not None else None,
+                usecols=columns,
+            )
+        return self.__class__.order_columns(
+            rows.iloc[skipped_rows:].reset_index(drop=True), columns
+        )
+
+    def __get_index(self) -> Dict:
+        """
+        Returns the row-offset index. Loads it from the index directory or builds it, if missing or outdated.
+
+        Returns
+        -------
+        Dict
+            Index with keys `size`, `mtime`, `columns`, `total_rows` and `offsets`
+        """
+        if self.__index is not None:
+            return self.__index
+
+        table_stat = self.__path.stat()
+        index_path = self.__index_directory.joinpath(
+            f"{hashlib.sha1(str(self.__path).encode('utf-8')).hexdigest()}.rows.json"
+        )
+        if index_path.is_file():
+            try:
+                index = json.loads(index_path.read_text(encoding="utf-8"))
+                if (
+                    index["size"] == table_stat.st_size
+                    and index["mtime"] == table_stat.st_mtime_ns
+                ):
+                    self.__index = index
+                    return index
+            except (ValueError, KeyError):
+                pass
+
+        index = self.__build_index()
+        index["size"] = table_stat.st_size
+        index["mtime"] = table_stat.st_mtime_ns
+
+        self.__index_directory.mkdir(parents=True, exist_ok=True)
+        temporary_index_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+        temporary_index_path.write_text(json.dumps(index), encoding="utf-8")
+        os.replace(temporary_index_path, index_path)
+
+        self.__index = index
+        return index
+
+    def __build_index(self) -> Dict:
+        """
+        Scans the table once and records the byte offset of every `ROW_INDEX_INTERVAL`-th row.
+        Quoted fields may contain line breaks, so a row only ends at a line break
+        outside of quotes (even number of quotes seen so far within the row).
+
+        Returns
+        -------
+        Dict
+            Index with keys `columns`, `total_rows` and `offsets`
+        """
+        try:
+            columns = [
+                str(column)
+                for column in pd.read_csv(
+                    self.__path, sep=self.__class__.SEPARATORS[self.__suffix], nrows=0
+                ).columns
+            ]
+        except pd.errors.EmptyDataError:
+            return {"columns": [], "total_rows": 0, "offsets": []}
+
+        offsets: List[int] = []
+        total_rows = -1  # header is not counted
+        position = 0
+        row_start = 0
+        in_quotes = False
+        with self.__path.open("rb") as table_file:
+            for line in table_file:
+                position += len(line)
+                if line.count(b'"') % 2 == 1:
+                    in_quotes = not in_quotes
+                if in_quotes:
+                    continue
+                if line.strip():
+                    if total_rows >= 0 and total_rows % self.__class__.ROW_INDEX_INTERVAL == 0:
+                        offsets.append(row_start)
+                    total_rows += 1
+                row_start = position
+
+        return {"columns": columns, "total_rows": max(total_rows, 0), "offsets": offsets}
@@ -0,0 +1,340 @@
+"""Per-column summary statistics of result tables."""
+
+# std imports
+import json
+import os
+from pathlib import Path
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Union
+
+# 3rd party imports
+import numpy as np
+import pandas as pd
+
+# internal imports
+from macworp_backend.utility.table_cache import ParquetTableReader
+from macworp_backend.utility.table_reader import TableReader
+
+
+class ColumnStatisticsAccumulator:
+    """
+    Accumulates the statistics of a single column chunk by chunk.
+    The histogram needs the range of the whole column, so it is filled in a second pass
+    with `update_histogram()` after all chunks were passed to `update()`.
+    """
+
+    def __init__(self):
+        self.__dtypes: List[np.dtype] = []
+        self.__null_count = 0
+        self.__min: Any = None
+        self.__max: Any = None
+        self.__is_comparable = True
+        self.__distinct_hashes = np.empty(0, dtype=np.uint64)
+        self.__finite_min: Optional[float] = None
+        self.__finite_max: Optional[float] = None
+        self.__histogram_counts: Optional[np.ndarray] = None
+        self.__histogram_edges: Optional[np.ndarray] = None
+
+    @property
+    def dtype(self) -> str:
+        """
+        Returns
+        -------
+        str
+            Common dtype of all chunks, like pandas would infer it for the whole column
+        """
+        dtypes = set(self.__dtypes)
+        if len(dtypes) == 0:
+            return "object"
+        if len(dtypes) == 1:
+            return str(dtypes.pop())
+        if all(
+            pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+            for dtype in dtypes
+        ):
+            try:
+                return str(np.result_type(*dtypes))
+            except TypeError:
+                # Extension dtypes
+                pass
+        return "object"
+
+    @property
+    def is_numeric(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if the column is numeric (not boolean) and has finite values, so a histogram can be computed
+        """
+        # Finite values are only recorded for numeric chunks, the common dtype is object for numeric and other chunks
+        return self.__finite_min is not None and self.dtype != "object"
+
+    def update(self, series: pd.Series):
+        """
+        Adds a chunk of the column.
+
+        Parameters
+        ----------
+        series : pd.Series
+            Chunk of the column values
+        """
+        self.__dtypes.append(series.dtype)
+        values = series.dropna()
+        self.__null_count += len(series) - len(values)
+        if len(values) == 0:
+            return
+
+        self.__distinct_hashes = np.union1d(
+            self.__distinct_hashes,
+            pd.util.hash_pandas_object(values, index=False).to_numpy(),
+        )
+
+        if self.__is_comparable:
+            try:
+                chunk_min = values.min()
+                chunk_max = values.max()
+                self.__min = chunk_min if self.__min is None else min(self.__min, chunk_min)
+                self.__max = chunk_max if self.__max is None else max(self.__max, chunk_max)
+            except TypeError:
+                # Mixed types which can not be compared
+                self.__is_comparable = False
+                self.__min = None
+                self.__max = None
+
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(
+            values
+        ):
+            finite_values = self.__class__.get_finite_values(values)
+            if len(finite_values) > 0:
+                chunk_finite_min = float(finite_values.min())
+                chunk_finite_max = float(finite_values.max())
+                self.__finite_min = (
+                    chunk_finite_min
+                    if self.__finite_min is None
+                    else min(self.__finite_min, chunk_finite_min)
+                )
+                self.__finite_max = (
+                    chunk_finite_max
+                    if self.__finite_max is None
+                    else max(self.__finite_max, chunk_finite_max)
+                )
+
+    def update_histogram(self, series: pd.Series, bins: int):
+        """
+        Adds a chunk of the column to the histogram. Only for numeric columns after all chunks were passed to `update()`.
+
+        Parameters
+        ----------
+        series : pd.Series
+            Chunk of the column values
+        bins : int
+            Number of histogram bins
+        """
+        values = series.dropna()
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(
+            values
+        ):
+            return
+        counts, edges = np.histogram(
+            self.__class__.get_finite_values(values),
+            bins=bins,
+            range=(self.__finite_min, self.__finite_max),
+        )
+        if self.__histogram_counts is None:
+            self.__histogram_counts = counts
+        else:
+            self.__histogram_counts += counts
+        self.__histogram_edges = edges
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `dtype`, `null_count`, `min`, `max`, `distinct_count` and
+            `histogram` (`edges` and `counts`, None for non-numeric columns)
+        """
+        return {
+            "dtype": self.dtype,
+            "null_count": int(self.__null_count),
+            "min": (
+                TableStatistics.to_json_value(self.__min) if self.__min is not None else None
+            ),
+            "max": (
+                TableStatistics.to_json_value(self.__max) if self.__max is not None else None
+            ),
+            "distinct_count": int(len(self.__distinct_hashes)),
+            "histogram": (
+                {
+                    "edges": self.__histogram_edges.tolist(),
+                    "counts": self.__histogram_counts.tolist(),
+                }
+                if self.__histogram_counts is not None
+                and self.__histogram_edges is not None
+                else None
+            ),
+        }
+
+    @staticmethod
+    def get_finite_values(values: pd.Series) -> np.ndarray:
+        """
+        Parameters
+        ----------
+        values : pd.Series
+            Numeric values without nulls
+
+        Returns
+        -------
+        np.ndarray
+            Finite values as float
+        """
+        float_values = values.to_numpy(dtype=float)
+        return float_values[np.isfinite(float_values)]
+
+
+class TableStatistics:
+    """
+    Computes per-column statistics (dtype, null count, min, max, distinct count and
+    a fixed-bin histogram for numeric columns) and stores them in a JSON sidecar file.
+    The table is read in chunks of `CHUNK_SIZE` rows and every chunk updates the statistics of all columns.
+    The numeric columns are read a second time for the histograms, whose bins depend on the range of the whole column.
+    """
+
+    HISTOGRAM_BINS: ClassVar[int] = 20
+    """Number of histogram bins for numeric columns"""
+
+    CHUNK_SIZE: ClassVar[int] = 100_000
+    """
+    Number of rows read at once. A multiple of `TableReader.ROW_INDEX_INTERVAL`,
+    so each chunk starts at an indexed row of CSV/TSV files.
+    """
+
+    @classmethod
+    def get(
+        cls, table_reader: Union[TableReader, ParquetTableReader], cache_path: Path
+    ) -> Dict[str, Any]:
+        """
+        Returns the statistics of the given table from the cache file or computes and caches them.
+
+        Parameters
+        ----------
+        table_reader : Union[TableReader, ParquetTableReader]
+            Reader for the table
+        cache_path : Path
+            Path of the cache file. Must change when the table changes, e.g. `TableCache.get_sidecar_path()`.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `total_rows` and `columns`, which maps each column name to its statistics
+        """
+        if cache_path.is_file():
+            try:
+                return json.loads(cache_path.read_text(encoding="utf-8"))
+            except ValueError:
+                pass
+
+        statistics = cls.compute(table_reader)
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_cache_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        temporary_cache_path.write_text(json.dumps(statistics), encoding="utf-8")
+        os.replace(temporary_cache_path, cache_path)
+        return statistics
+
+    @classmethod
+    def compute(
+        cls, table_reader: Union[TableReader, ParquetTableReader]
+    ) -> Dict[str, Any]:
+        """
+        Computes the statistics of the given table.
+
+        Parameters
+        ----------
+        table_reader : Union[TableReader, ParquetTableReader]
+            Reader for the table
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `total_rows` and `columns`, which maps each column name to its statistics
+        """
+        accumulators = {
+            column: ColumnStatisticsAccumulator() for column in table_reader.columns
+        }
+        for chunk in cls.iter_chunks(table_reader, None):
+            for column, accumulator in accumulators.items():
+                accumulator.update(chunk[column])
+
+        numeric_columns = [
+            column
+            for column, accumulator in accumulators.items()
+            if accumulator.is_numeric
+        ]
+        if len(numeric_columns) > 0:
+            for chunk in cls.iter_chunks(table_reader, numeric_columns):
+                for column in numeric_columns:
+                    accumulators[column].update_histogram(
+                        chunk[column], cls.HISTOGRAM_BINS
+                    )
+
+        return {
+            "total_rows": table_reader.total_rows,
+            "columns": {
+                column: accumulator.to_dict()
+                for column, accumulator in accumulators.items()
+            },
+        }
+
+    @classmethod
+    def iter_chunks(
+        cls,
+        table_reader: Union[TableReader, ParquetTableReader],
+        columns: Optional[List[str]],
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Reads the table in chunks of `CHUNK_SIZE` rows.
+        XLSX files are read at once, as they can not be read from an offset without parsing the preceding rows.
+
+        Parameters
+        ----------
+        table_reader : Union[TableReader, ParquetTableReader]
+            Reader for the table
+        columns : Optional[List[str]]
+            Columns to read, None for all columns
+
+        Yields
+        ------
+        Iterator[pd.DataFrame]
+            Chunks of the table
+        """
+        if isinstance(table_reader, TableReader) and table_reader.is_excel:
+            yield table_reader.read(0, None, columns)
+            return
+        for offset in range(0, table_reader.total_rows, cls.CHUNK_SIZE):
+            yield table_reader.read(offset, cls.CHUNK_SIZE, columns)
+
+    @staticmethod
+    def to_json_value(value: Any) -> Any:
+        """
+        Converts numpy/pandas scalars into JSON serializable values.
+
+        Parameters
+        ----------
+        value : Any
+            Scalar
+
+        Returns
+        -------
+        Any
+            JSON serializable value
+        """
+        if isinstance(value, pd.Timestamp):
+            return value.isoformat()
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and not np.isfinite(value):
+            return None
+        if not isinstance(value, (str, int, float, bool)):
+            return str(value)
+        return value
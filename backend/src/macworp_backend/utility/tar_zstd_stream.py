@@ -0,0 +1,116 @@
+"""Streaming tar archiver with multi-threaded Zstandard compression."""
+
+# std imports
+from pathlib import Path
+import tarfile
+from typing import Callable, ClassVar, Iterator, List, Tuple
+
+# 3rd party imports
+import eventlet
+from eventlet import tpool
+import zstandard
+
+
+class TarZstdStream:
+    """
+    Creates a Zstandard compressed tar archive (`.tar.zst`) on the fly, without temporary files.
+
+    Tar headers use the PAX format, so long names and files larger than 8 GiB are supported.
+    Compression is done by zstd's own worker threads (`threads=-1` uses all CPU cores).
+    When running with eventlet, each compression call is executed in eventlet's native thread pool
+    (`tpool`), so waiting for the zstd workers does not block the hub.
+    """
+
+    CHUNK_SIZE: ClassVar[int] = 1 << 20
+    """Bytes read from a file at once"""
+
+    COMPRESSION_LEVEL: ClassVar[int] = 3
+    """Zstandard compression level"""
+
+    THREADS: ClassVar[int] = -1
+    """Number of zstd worker threads, -1 for one per CPU core"""
+
+    def __init__(self, files: List[Tuple[Path, str]]):
+        """
+        Creates a new TarZstdStream.
+
+        Parameters
+        ----------
+        files : List[Tuple[Path, str]]
+            Files to add as `(path, name within archive)`
+        """
+        self.__files = files
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Streams the archive.
+
+        Yields
+        ------
+        Iterator[bytes]
+            Compressed archive chunks
+        """
+        compressor = zstandard.ZstdCompressor(
+            level=self.__class__.COMPRESSION_LEVEL, threads=self.__class__.THREADS
+        ).compressobj()
+        compress = self.__offload(compressor.compress)
+        for chunk in self.__iter_tar():
+            compressed_chunk = compress(chunk)
+            if len(compressed_chunk) > 0:
+                yield compressed_chunk
+        yield self.__offload(compressor.flush)()
+
+    def __iter_tar(self) -> Iterator[bytes]:
+        """
+        Streams the uncompressed tar archive.
+
+        Yields
+        ------
+        Iterator[bytes]
+            Tar chunks
+
+        Raises
+        ------
+        IOError
+            If a file shrank since its header was written
+        """
+        for path, arcname in self.__files:
+            file_stat = path.stat()
+            tar_info = tarfile.TarInfo(arcname.lstrip("/"))
+            tar_info.size = file_stat.st_size
+            tar_info.mtime = int(file_stat.st_mtime)
+            tar_info.mode = 0o644
+            yield tar_info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")
+
+            remaining = tar_info.size
+            with path.open("rb") as file:
+                while remaining > 0:
+                    chunk = file.read(min(remaining, self.__class__.CHUNK_SIZE))
+                    if len(chunk) == 0:
+                        raise IOError(f"{path} shrank while archiving")
+                    remaining -= len(chunk)
+                    yield chunk
+            padding = -tar_info.size % tarfile.BLOCKSIZE
+            if padding > 0:
+                yield tarfile.NUL * padding
+        # End of archive
+        yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+    @staticmethod
+    def __offload(function: Callable[..., bytes]) -> Callable[..., bytes]:
+        """
+        Wraps the given function to run in eventlet's native thread pool, if threads are monkey patched.
+
+        Parameters
+        ----------
+        function : Callable[..., bytes]
+            Function
+
+        Returns
+        -------
+        Callable[..., bytes]
+            Wrapped or given function
+        """
+        if eventlet.patcher.is_monkey_patched("thread"):
+            return lambda *args: tpool.execute(function, *args)
+        return function
@@ -0,0 +1,333 @@
+"""Per-task resource metrics of Nextflow runs."""
+
+# std imports
+import os
+from pathlib import Path
+import re
+from typing import Any, ClassVar, Dict, List, Optional
+
+# 3rd party imports
+import pandas as pd
+import pyarrow as pa  # type: ignore[import-untyped]
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+# internal imports
+from macworp_backend.models.project import Project
+
+
+class TaskMetrics:
+    """
+    Resource usage of each task of a run, taken from the Nextflow trace file.
+    The worker lets Nextflow write the trace (TSV, human readable values) to
+    `.macworp_cache/task_metrics/run_<run_id>.tsv` in the project directory. When the run is finished
+    the trace is converted into a Parquet file next to it and removed.
+    Running runs are read from the trace directly.
+    """
+
+    DIRECTORY_NAME: ClassVar[str] = "task_metrics"
+    """Folder within the project's cache directory, must match the worker's `NextflowCmdGenerator.TRACE_DIRECTORY`"""
+
+    COMPLETED_STATUSES: ClassVar[List[str]] = ["COMPLETED"]
+    """Tasks with these status are used for the resource statistics, failed and cached tasks are only counted"""
+
+    DURATION_REGEX: ClassVar[re.Pattern] = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d)")
+    """Matches the parts of a Nextflow duration, e.g. `1h 2m 3s` or `532ms`"""
+
+    DURATION_UNITS: ClassVar[Dict[str, float]] = {
+        "ms": 0.001,
+        "s": 1.0,
+        "m": 60.0,
+        "h": 3600.0,
+        "d": 86400.0,
+    }
+    """Seconds per duration unit"""
+
+    MEMORY_REGEX: ClassVar[re.Pattern] = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGTPE]?B)$")
+    """Matches a Nextflow memory unit, e.g. `1.2 GB`"""
+
+    MEMORY_UNITS: ClassVar[Dict[str, int]] = {
+        unit: 1024**exponent
+        for exponent, unit in enumerate(["B", "KB", "MB", "GB", "TB", "PB", "EB"])
+    }
+    """Bytes per memory unit"""
+
+    PROCESS_NAME_REGEX: ClassVar[re.Pattern] = re.compile(r"\s+\(.*\)$")
+    """Matches the tag of a task name, e.g. ` (sample_1)` in `ALIGN (sample_1)`"""
+
+    QUANTILES: ClassVar[Dict[str, float]] = {"p50": 0.5, "p95": 0.95}
+    """Quantiles of the statistics"""
+
+    @classmethod
+    def get_directory(cls, project_id: int) -> Path:
+        """
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+
+        Returns
+        -------
+        Path
+            Folder containing the traces and metrics of the project's runs
+        """
+        # Only the ID is needed to compute the project directory, no need to query the database
+        return Project(id=project_id).file_directory.joinpath(
+            ".macworp_cache", cls.DIRECTORY_NAME
+        )
+
+    @classmethod
+    def get_trace_path(cls, project_id: int, run_id: int) -> Path:
+        """
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Path
+            Trace written by Nextflow
+        """
+        return cls.get_directory(project_id).joinpath(f"run_{run_id}.tsv")
+
+    @classmethod
+    def get_store_path(cls, project_id: int, run_id: int) -> Path:
+        """
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Path
+            Parquet file with the converted metrics
+        """
+        return cls.get_directory(project_id).joinpath(f"run_{run_id}.parquet")
+
+    @classmethod
+    def store(cls, project_id: int, run_id: int) -> bool:
+        """
+        Converts the trace of a finished run into Parquet and removes the trace.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        bool
+            False if there is no trace, e.g. Snakemake workflows
+        """
+        trace_path = cls.get_trace_path(project_id, run_id)
+        if not trace_path.is_file():
+            return False
+        store_path = cls.get_store_path(project_id, run_id)
+        temporary_store_path = store_path.with_suffix(f".{os.getpid()}.tmp")
+        pq.write_table(
+            pa.Table.from_pandas(cls.parse_trace(trace_path), preserve_index=False),
+            temporary_store_path,
+            compression="zstd",
+        )
+        os.replace(temporary_store_path, store_path)
+        trace_path.unlink()
+        return True
+
+    @classmethod
+    def load(cls, project_id: int, run_id: int) -> Optional[pd.DataFrame]:
+        """
+        Loads the metrics of a run, from the Parquet file if already converted, otherwise from the trace.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Optional[pd.DataFrame]
+            Metrics or None if neither Parquet file nor (parsable) trace exist
+        """
+        store_path = cls.get_store_path(project_id, run_id)
+        if store_path.is_file():
+            return pq.read_table(store_path).to_pandas()
+        trace_path = cls.get_trace_path(project_id, run_id)
+        if trace_path.is_file():
+            try:
+                return cls.parse_trace(trace_path)
+            except FileNotFoundError:
+                # Converted meanwhile, as the run finished
+                if store_path.is_file():
+                    return pq.read_table(store_path).to_pandas()
+            except ValueError:
+                # The trace of a running workflow might still be empty or end with a partially written line,
+                # e.g. `pd.errors.EmptyDataError` or `pd.errors.ParserError`, so there are no metrics yet
+                return None
+        return None
+
+    @classmethod
+    def parse_trace(cls, trace_path: Path) -> pd.DataFrame:
+        """
+        Parses a Nextflow trace with the default fields.
+
+        Parameters
+        ----------
+        trace_path : Path
+            Trace file
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per task with `task_id`, `process`, `name`, `status`, `exit_code`, `duration` & `realtime`
+            (seconds), `cpu_percent`, `peak_rss`, `read_bytes` & `write_bytes` (bytes). Missing values are NaN.
+        """
+        trace = pd.read_csv(
+            trace_path, sep="\t", dtype=str, na_values=["-"], keep_default_na=False
+        )
+
+        def column(name: str) -> pd.Series:
+            if name in trace.columns:
+                return trace[name]
+            return pd.Series([None] * len(trace), dtype=object)
+
+        names = column("name").fillna("")
+        return pd.DataFrame(
+            {
+                "task_id": pd.to_numeric(column("task_id"), errors="coerce").astype(
+                    "Int64"
+                ),
+                "process": (
+                    column("process")
+                    if "process" in trace.columns
+                    else names.str.replace(cls.PROCESS_NAME_REGEX, "", regex=True)
+                ),
+                "name": names,
+                "status": column("status").fillna(""),
+                "exit_code": pd.to_numeric(column("exit"), errors="coerce").astype(
+                    "Int64"
+                ),
+                "duration": column("duration").map(cls.parse_duration).astype(float),
+                "realtime": column("realtime").map(cls.parse_duration).astype(float),
+                "cpu_percent": pd.to_numeric(
+                    column("%cpu").str.rstrip("%"), errors="coerce"
+                ).astype(float),
+                "peak_rss": column("peak_rss").map(cls.parse_memory).astype(float),
+                "read_bytes": column("rchar").map(cls.parse_memory).astype(float),
+                "write_bytes": column("wchar").map(cls.parse_memory).astype(float),
+            }
+        )
+
+    @classmethod
+    def parse_duration(cls, value: Any) -> Optional[float]:
+        """
+        Parameters
+        ----------
+        value : Any
+            Nextflow duration, e.g. `1h 2m 3s`, or raw milliseconds
+
+        Returns
+        -------
+        Optional[float]
+            Seconds, None if missing or malformed
+        """
+        if not isinstance(value, str):
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return int(value) / 1000
+        parts = cls.DURATION_REGEX.findall(value)
+        if len(parts) == 0:
+            return None
+        return sum(float(number) * cls.DURATION_UNITS[unit] for number, unit in parts)
+
+    @classmethod
+    def parse_memory(cls, value: Any) -> Optional[float]:
+        """
+        Parameters
+        ----------
+        value : Any
+            Nextflow memory unit, e.g. `1.2 GB`, or raw bytes
+
+        Returns
+        -------
+        Optional[float]
+            Bytes, None if missing or malformed
+        """
+        if not isinstance(value, str):
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        match = cls.MEMORY_REGEX.match(value)
+        if match is None:
+            return None
+        return float(match.group(1)) * cls.MEMORY_UNITS[match.group(2)]
+
+    @classmethod
+    def aggregate(cls, metrics: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Aggregates the metrics per process, sorted by total realtime, so the slowest steps come first.
+
+        Parameters
+        ----------
+        metrics : pd.DataFrame
+            Metrics of one or more runs, see `parse_trace()`
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Per process: `process`, `tasks`, `completed`, `failed`, `total_realtime`,
+            `realtime`, `peak_rss` & `cpu_percent` (each with `p50`, `p95` & `max`, null without completed tasks),
+            `read_bytes` & `write_bytes` (sums)
+        """
+        statistics: List[Dict[str, Any]] = []
+        for process, tasks in metrics.groupby("process", sort=False):
+            completed = tasks[tasks["status"].isin(cls.COMPLETED_STATUSES)]
+            statistics.append(
+                {
+                    "process": process,
+                    "tasks": len(tasks),
+                    "completed": len(completed),
+                    "failed": int((tasks["status"] == "FAILED").sum()),
+                    "total_realtime": float(completed["realtime"].sum()),
+                    "realtime": cls.__to_distribution(completed["realtime"]),
+                    "peak_rss": cls.__to_distribution(completed["peak_rss"]),
+                    "cpu_percent": cls.__to_distribution(completed["cpu_percent"]),
+                    "read_bytes": float(completed["read_bytes"].sum()),
+                    "write_bytes": float(completed["write_bytes"].sum()),
+                }
+            )
+        statistics.sort(key=lambda process: process["total_realtime"], reverse=True)
+        return statistics
+
+    @classmethod
+    def __to_distribution(cls, values: pd.Series) -> Optional[Dict[str, float]]:
+        """
+        Parameters
+        ----------
+        values : pd.Series
+            Values, NaN are ignored
+
+        Returns
+        -------
+        Optional[Dict[str, float]]
+            Quantiles and maximum, None if there are no values
+        """
+        values = values.dropna()
+        if len(values) == 0:
+            return None
+        distribution = {
+            name: float(values.quantile(quantile))
+            for name, quantile in cls.QUANTILES.items()
+        }
+        distribution["max"] = float(values.max())
+        return distribution
@@ -0,0 +1,471 @@
+"""Resumable uploads with out-of-order chunks."""
+
+# std imports
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import tempfile
+import time
+from typing import Any, ClassVar, Dict, IO, Iterator, List, Optional, Tuple
+import uuid
+
+# 3rd party imports
+from macworp_utils.path import is_within_path, secure_joinpath
+
+# internal imports
+from macworp_backend.utility.file_lock import FileLock
+
+ByteRange = Tuple[int, int]
+"""Byte range `(start, end)`, end is exclusive"""
+
+
+class UploadSession:
+    """
+    Upload of a single file in chunks, which can be sent in any order and in parallel.
+
+    The file is preallocated in the sessions directory when the session is created. Each chunk is first
+    written to a temporary file while its checksum is computed and only copied to its offset with `os.pwrite`
+    if the checksum matches, so a corrupted retry can not overwrite received data. Received ranges are recorded
+    in a JSON manifest next to the file, which is updated under an exclusive lock (see `FileLock`),
+    so concurrent requests in different worker processes do not lose updates.
+    Once all bytes are received the file is moved to its target path.
+    The manifest only contains the target path relative to the root directory, which is resolved again on completion,
+    as the sessions directory might be writable by users.
+
+    Sessions older than `MAX_SESSION_AGE` are removed when a new session is created,
+    so abandoned uploads do not keep their preallocated files forever.
+    """
+
+    SESSION_ID_PATTERN: ClassVar[re.Pattern] = re.compile(r"^[0-9a-f]{32}$")
+    """Valid session IDs (UUID4 hex)"""
+
+    READ_SIZE: ClassVar[int] = 1 << 20
+    """Bytes read from the request body at once"""
+
+    MAX_CHUNK_SIZE: ClassVar[int] = 1 << 30
+    """Maximum size of a single chunk"""
+
+    MAX_SESSION_AGE: ClassVar[int] = 7 * 24 * 60 * 60
+    """Seconds after which an unfinished session is removed"""
+
+    def __init__(self, sessions_directory: Path, root_directory: Path, session_id: str):
+        """
+        Opens an existing upload session.
+
+        Parameters
+        ----------
+        sessions_directory : Path
+            Directory containing the sessions, e.g. `<project cache>/uploads`
+        root_directory : Path
+            Directory the target paths are relative to, e.g. the project directory
+        session_id : str
+            Session ID
+
+        Raises
+        ------
+        FileNotFoundError
+            If the session does not exist (anymore)
+        """
+        if self.__class__.SESSION_ID_PATTERN.match(session_id) is None:
+            raise FileNotFoundError(f"upload session {session_id} not found")
+        self.__session_id = session_id
+        self.__root_directory = root_directory
+        self.__manifest_path = sessions_directory.joinpath(f"{session_id}.json")
+        self.__data_path = sessions_directory.joinpath(f"{session_id}.part")
+        self.__lock_path = sessions_directory.joinpath(f"{session_id}.lock")
+        if not self.__manifest_path.is_file():
+            raise FileNotFoundError(f"upload session {session_id} not found")
+
+    @property
+    def session_id(self) -> str:
+        """
+        Returns
+        -------
+        str
+            Session ID
+        """
+        return self.__session_id
+
+    @classmethod
+    def create(
+        cls,
+        sessions_directory: Path,
+        root_directory: Path,
+        file_path: Path,
+        size: int,
+    ) -> Dict[str, Any]:
+        """
+        Creates a new upload session and preallocates the file.
+        Empty files are moved to their target immediately.
+
+        Parameters
+        ----------
+        sessions_directory : Path
+            Directory containing the sessions, e.g. `<project cache>/uploads`
+        root_directory : Path
+            Directory the file path is relative to, e.g. the project directory
+        file_path : Path
+            Path within the root directory the file is moved to after the upload is complete
+        size : int
+            Size of the file in bytes
+
+        Returns
+        -------
+        Dict[str, Any]
+            Status of the new session, see `get_status()`
+
+        Raises
+        ------
+        PermissionError
+            If the file path is not within the root directory
+        """
+        file_path = cls.resolve_file_path(root_directory, file_path).relative_to(
+            root_directory
+        )
+        sessions_directory.mkdir(parents=True, exist_ok=True)
+        cls.remove_expired(sessions_directory)
+        session_id = uuid.uuid4().hex
+        data_path = sessions_directory.joinpath(f"{session_id}.part")
+        file_descriptor = os.open(data_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if size > 0:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(file_descriptor, 0, size)
+                else:
+                    os.ftruncate(file_descriptor, size)
+        finally:
+            os.close(file_descriptor)
+
+        cls.__write_manifest(
+            sessions_directory.joinpath(f"{session_id}.json"),
+            {
+                "file_path": str(file_path),
+                "size": size,
+                "received": [],
+                "created_at": time.time(),
+            },
+        )
+        session = cls(sessions_directory, root_directory, session_id)
+        with session.__lock():
+            manifest = session.__read_manifest()
+            if size == 0:
+                return session.__complete(manifest)
+            return session.__status(manifest)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `session_id`, `size`, `received` and `missing` (lists of `[start, end)` ranges)
+            and `is_complete`
+        """
+        with self.__lock():
+            return self.__status(self.__read_manifest())
+
+    def write_chunk(
+        self, offset: int, chunk: IO[bytes], length: int, sha256: str
+    ) -> Dict[str, Any]:
+        """
+        Writes a chunk at the given offset. The range is only recorded as received if
+        the chunk is complete and matches the given checksum.
+
+        Parameters
+        ----------
+        offset : int
+            Byte offset of the chunk
+        chunk : IO[bytes]
+            Chunk data, e.g. the request stream
+        length : int
+            Number of bytes of the chunk
+        sha256 : str
+            Expected SHA-256 hex digest of the chunk
+
+        Returns
+        -------
+        Dict[str, Any]
+            Status, see `get_status()`
+
+        Raises
+        ------
+        ValueError
+            If the chunk exceeds the file, is incomplete or the checksum does not match
+        FileNotFoundError
+            If the session was completed or removed meanwhile
+        PermissionError
+            If the file path of the manifest is not within the root directory
+        """
+        with self.__lock():
+            size = self.__read_manifest()["size"]
+        if offset < 0 or length < 1 or offset + length > size:
+            raise ValueError(f"chunk [{offset}, {offset + length}) exceeds file size {size}")
+        if length > self.__class__.MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk exceeds {self.__class__.MAX_CHUNK_SIZE} bytes")
+
+        # Verify the chunk before writing it to the file, a corrupted chunk might overlap received ranges
+        checksum = hashlib.sha256()
+        written = 0
+        with tempfile.TemporaryFile(dir=self.__data_path.parent) as chunk_file:
+            while written < length:
+                data = chunk.read(min(self.__class__.READ_SIZE, length - written))
+                if not data:
+                    break
+                checksum.update(data)
+                chunk_file.write(data)
+                written += len(data)
+            if written != length:
+                raise ValueError(
+                    f"chunk incomplete, received {written} of {length} bytes"
+                )
+            if checksum.hexdigest() != sha256.lower():
+                raise ValueError("checksum mismatch")
+
+            # Verified chunks of the same range contain the same bytes, so writing is done without lock
+            chunk_file.seek(0)
+            written = 0
+            file_descriptor = os.open(self.__data_path, os.O_WRONLY | os.O_NOFOLLOW)
+            try:
+                while written < length:
+                    data = chunk_file.read(self.__class__.READ_SIZE)
+                    os.pwrite(file_descriptor, data, offset + written)
+                    written += len(data)
+            finally:
+                os.close(file_descriptor)
+
+        with self.__lock():
+            manifest = self.__read_manifest()
+            manifest["received"] = self.add_range(
+                [tuple(byte_range) for byte_range in manifest["received"]],
+                (offset, offset + length),
+            )
+            if manifest["received"] == [(0, size)]:
+                return self.__complete(manifest)
+            self.__write_manifest(self.__manifest_path, manifest)
+            return self.__status(manifest)
+
+    def remove(self):
+        """
+        Aborts the session and removes the uploaded data.
+        """
+        with self.__lock():
+            self.__manifest_path.unlink(missing_ok=True)
+            self.__data_path.unlink(missing_ok=True)
+        self.__lock_path.unlink(missing_ok=True)
+
+    @classmethod
+    def remove_expired(cls, sessions_directory: Path):
+        """
+        Removes sessions created more than `MAX_SESSION_AGE` seconds ago
+        and leftovers of removed sessions, e.g. lock files.
+
+        Parameters
+        ----------
+        sessions_directory : Path
+            Directory containing the sessions
+        """
+        expired_before = time.time() - cls.MAX_SESSION_AGE
+        for file_path in sessions_directory.iterdir():
+            session_id = file_path.name.split(".", 1)[0]
+            if cls.SESSION_ID_PATTERN.match(session_id) is None:
+                continue
+            try:
+                if file_path.suffix == ".json":
+                    manifest = json.loads(file_path.read_text(encoding="utf-8"))
+                    created_at = (
+                        manifest.get("created_at") if isinstance(manifest, dict) else None
+                    )
+                    if isinstance(created_at, (int, float)) and created_at >= expired_before:
+                        continue
+                    cls(sessions_directory, sessions_directory, session_id).remove()
+                elif file_path.stat().st_mtime < expired_before and not (
+                    sessions_directory.joinpath(f"{session_id}.json").is_file()
+                ):
+                    # Data, lock or temporary manifest of a removed session
+                    file_path.unlink(missing_ok=True)
+            except (FileNotFoundError, ValueError):
+                # Removed or completed meanwhile, or invalid manifest of a concurrent write
+                continue
+
+    @staticmethod
+    def resolve_file_path(root_directory: Path, file_path: Path) -> Path:
+        """
+        Parameters
+        ----------
+        root_directory : Path
+            Absolute root directory
+        file_path : Path
+            Path within the root directory
+
+        Returns
+        -------
+        Path
+            Absolute path within the root directory
+
+        Raises
+        ------
+        PermissionError
+            If the path is not within the root directory
+        """
+        path = secure_joinpath(root_directory, file_path)
+        if path == root_directory or not is_within_path(root_directory, path):
+            raise PermissionError("Path is not within the root directory.")
+        return path
+
+    @staticmethod
+    def add_range(ranges: List[ByteRange], new_range: ByteRange) -> List[ByteRange]:
+        """
+        Adds a range to a sorted list of disjoint ranges and merges overlapping or adjacent ranges.
+
+        Parameters
+        ----------
+        ranges : List[ByteRange]
+            Sorted, disjoint ranges
+        new_range : ByteRange
+            Range to add
+
+        Returns
+        -------
+        List[ByteRange]
+            Sorted, disjoint ranges
+        """
+        merged: List[ByteRange] = []
+        start, end = new_range
+        for range_start, range_end in ranges:
+            if range_end < start or range_start > end:
+                merged.append((range_start, range_end))
+            else:
+                start = min(start, range_start)
+                end = max(end, range_end)
+        merged.append((start, end))
+        merged.sort()
+        return merged
+
+    @staticmethod
+    def get_missing_ranges(ranges: List[ByteRange], size: int) -> List[ByteRange]:
+        """
+        Parameters
+        ----------
+        ranges : List[ByteRange]
+            Sorted, disjoint received ranges
+        size : int
+            File size
+
+        Returns
+        -------
+        List[ByteRange]
+            Ranges not received yet
+        """
+        missing: List[ByteRange] = []
+        position = 0
+        for start, end in ranges:
+            if start > position:
+                missing.append((position, start))
+            position = max(position, end)
+        if position < size:
+            missing.append((position, size))
+        return missing
+
+    def __status(self, manifest: Dict[str, Any], is_complete: bool = False) -> Dict[str, Any]:
+        """
+        Parameters
+        ----------
+        manifest : Dict[str, Any]
+            Manifest
+        is_complete : bool, optional
+            True if the file was moved to its target, by default False
+
+        Returns
+        -------
+        Dict[str, Any]
+            Status, see `get_status()`
+        """
+        received = [tuple(byte_range) for byte_range in manifest["received"]]
+        return {
+            "session_id": self.__session_id,
+            "size": manifest["size"],
+            "received": received,
+            "missing": self.get_missing_ranges(received, manifest["size"]),
+            "is_complete": is_complete,
+        }
+
+    def __complete(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Moves the file to its target and removes the manifest. Must be called under lock.
+        The target is resolved from the file path of the manifest again, so a modified manifest
+        can not move the file outside of the root directory.
+
+        Parameters
+        ----------
+        manifest : Dict[str, Any]
+            Manifest
+
+        Returns
+        -------
+        Dict[str, Any]
+            Status, see `get_status()`
+
+        Raises
+        ------
+        PermissionError
+            If the file path of the manifest is not within the root directory
+        """
+        target_path = self.__class__.resolve_file_path(
+            self.__root_directory, Path(manifest["file_path"])
+        )
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.__data_path, target_path)
+        self.__manifest_path.unlink(missing_ok=True)
+        self.__lock_path.unlink(missing_ok=True)
+        return self.__status(manifest, is_complete=True)
+
+    def __read_manifest(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            Manifest with keys `file_path`, `size`, `received` and `created_at`
+
+        Raises
+        ------
+        FileNotFoundError
+            If the session was completed or removed meanwhile or the manifest is invalid
+        """
+        try:
+            manifest = json.loads(self.__manifest_path.read_text(encoding="utf-8"))
+        except ValueError as error:
+            raise FileNotFoundError(f"upload session {self.__session_id} is invalid") from error
+        if (
+            not isinstance(manifest, dict)
+            or not isinstance(manifest.get("file_path"), str)
+            or not isinstance(manifest.get("size"), int)
+            or not isinstance(manifest.get("received"), list)
+        ):
+            raise FileNotFoundError(f"upload session {self.__session_id} is invalid")
+        return manifest
+
+    @staticmethod
+    def __write_manifest(manifest_path: Path, manifest: Dict[str, Any]):
+        """
+        Writes the manifest atomically.
+
+        Parameters
+        ----------
+        manifest_path : Path
+            Path of the manifest
+        manifest : Dict[str, Any]
+            Manifest
+        """
+        temporary_manifest_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        temporary_manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(temporary_manifest_path, manifest_path)
+
+    @contextmanager
+    def __lock(self) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the session, see `FileLock`.
+        """
+        with FileLock.exclusive(self.__lock_path):
+            yield
@@ -0,0 +1,224 @@
+"""Batched consumption of workflow logs from RabbitMQ."""
+
+# std imports
+from collections import defaultdict
+import json
+import time
+from typing import Any, ClassVar, DefaultDict, Dict, List, Tuple
+
+# 3rd party imports
+import peewee
+import pika
+from pydantic import ValidationError
+
+# internal imports
+from macworp_backend import app, db_wrapper as db
+from macworp_backend.models.project import (
+    LogProcessingResult,
+    LogProcessingResultType,
+    Project,
+)
+from macworp_backend.utility.configuration import Configuration
+from macworp_backend.utility.progress_emitter import ProgressEmitter
+from macworp_utils.constants import SupportedWorkflowEngine
+from macworp_utils.exchange.workflow_log import WorkflowLog  # type: ignore[import-untyped]
+
+
+class WorkflowLogConsumer:
+    """
+    Drains the workflow log queue in batches. The process counter changes of a batch are summed up
+    per project and applied with one `UPDATE ... SET x = x + n` per project, instead of one
+    read-modify-write of the project row per log entry. Each batch is applied in one transaction
+    and its messages are acknowledged after the commit, so a crash or database error results in
+    redelivery of the whole batch instead of lost or partially applied logs. Only a connection loss
+    between commit and acknowledgement counts the batch twice.
+    """
+
+    MAX_BATCH_SIZE: ClassVar[int] = 1000
+    """Maximum number of logs processed at once, also the prefetch count"""
+
+    MAX_BATCH_DELAY: ClassVar[float] = 0.5
+    """Maximum seconds a received log waits for the batch to be processed"""
+
+    RECONNECT_DELAY: ClassVar[int] = 2
+    """Seconds to wait before reconnecting to RabbitMQ and the database"""
+
+    @classmethod
+    def consume(cls):
+        """
+        Consumes the workflow log queue until interrupted, reconnecting on RabbitMQ and database errors.
+        Unacknowledged messages are redelivered after reconnecting.
+        """
+        queue = Configuration.values()["rabbit_mq"]["workflow_log_queue"]
+        while True:
+            try:
+                connection = pika.BlockingConnection(
+                    pika.URLParameters(Configuration.values()["rabbit_mq"]["url"])
+                )
+                try:
+                    channel = connection.channel()
+                    channel.queue_declare(queue=queue, durable=True)
+                    channel.basic_qos(prefetch_count=cls.MAX_BATCH_SIZE)
+                    cls.__consume_batches(channel, queue)
+                finally:
+                    if connection.is_open:
+                        connection.close()
+            except (
+                pika.exceptions.AMQPConnectionError,
+                pika.exceptions.AMQPChannelError,
+            ) as error:
+                app.logger.warning(  # pylint: disable=no-member
+                    "Lost connection to RabbitMQ, reconnecting in %i seconds: %s",
+                    cls.RECONNECT_DELAY,
+                    error,
+                )
+                time.sleep(cls.RECONNECT_DELAY)
+            except (peewee.OperationalError, peewee.InterfaceError) as error:
+                app.logger.warning(  # pylint: disable=no-member
+                    "Database error, reconnecting in %i seconds: %s",
+                    cls.RECONNECT_DELAY,
+                    error,
+                )
+                # The connection might be broken, the next query opens a new one
+                if not db.database.is_closed():
+                    try:
+                        db.database.close()
+                    except peewee.DatabaseError:
+                        pass
+                time.sleep(cls.RECONNECT_DELAY)
+
+    @classmethod
+    def __consume_batches(cls, channel, queue: str):
+        """
+        Collects messages until the batch is full or the oldest message waited `MAX_BATCH_DELAY` seconds.
+
+        Parameters
+        ----------
+        channel : BlockingChannel
+            Channel with prefetch count
+        queue : str
+            Workflow log queue
+        """
+        batch: List[bytes] = []
+        last_delivery_tag = 0
+        batch_started_at = 0.0
+        for method_frame, _, body in channel.consume(
+            queue, inactivity_timeout=cls.MAX_BATCH_DELAY, auto_ack=False
+        ):
+            if method_frame is not None:
+                if len(batch) == 0:
+                    batch_started_at = time.monotonic()
+                batch.append(body)
+                last_delivery_tag = method_frame.delivery_tag
+            if len(batch) > 0 and (
+                len(batch) >= cls.MAX_BATCH_SIZE
+                or method_frame is None
+                or time.monotonic() - batch_started_at >= cls.MAX_BATCH_DELAY
+            ):
+                cls.process_batch(batch)
+                channel.basic_ack(last_delivery_tag, multiple=True)
+                batch = []
+            # Sends progress events which were throttled in previous iterations
+            ProgressEmitter.flush()
+
+    @classmethod
+    def process_batch(cls, batch: List[bytes]):
+        """
+        Parses the messages and applies the logs in one transaction, see `apply_logs()`.
+        Malformed messages are skipped.
+        Progress events are only queued, they are sent by `ProgressEmitter.flush()`.
+
+        Parameters
+        ----------
+        batch : List[bytes]
+            Serialized `WorkflowLog`s
+        """
+        logs: List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]] = []
+        for body in batch:
+            try:
+                workflow_log = WorkflowLog.model_validate_json(body)
+                log = json.loads(workflow_log.log)
+                if not isinstance(log, dict):
+                    raise ValueError("log is not a JSON object")
+                logs.append(
+                    (
+                        workflow_log.project_id,
+                        SupportedWorkflowEngine.from_str(workflow_log.workflow_engine),
+                        log,
+                    )
+                )
+            except (ValidationError, ValueError) as error:
+                app.logger.warning(  # pylint: disable=no-member
+                    "Skipping malformed workflow log: %s", error
+                )
+        with db.database.atomic():
+            cls.apply_logs(logs, start_flusher=False)
+
+    @staticmethod
+    def apply_logs(
+        logs: List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]],
+        start_flusher: bool = True,
+    ):
+        """
+        Sums up the process counter changes of all logs per project, applies them with one `UPDATE` per project
+        and notifies the browsers afterwards. Logs of unknown format and of deleted projects are skipped.
+
+        Parameters
+        ----------
+        logs : List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]]
+            Project ID, workflow engine and parsed log, in order of creation
+        start_flusher : bool, optional
+            Passed to `ProgressEmitter.add()`, False if the caller flushes the progress events itself,
+            by default True
+        """
+        increments: DefaultDict[int, List[int]] = defaultdict(lambda: [0, 0])
+        results: List[Tuple[int, LogProcessingResult]] = []
+        for project_id, workflow_engine, log in logs:
+            try:
+                result = Project.parse_workflow_log(log, workflow_engine)
+            except (ValueError, KeyError, TypeError) as error:
+                app.logger.warning(  # pylint: disable=no-member
+                    "Skipping malformed workflow log: %s", error
+                )
+                continue
+            increments[project_id][0] += result.submitted_processes
+            increments[project_id][1] += result.completed_processes
+            results.append((project_id, result))
+
+        counters: Dict[int, Tuple[int, int]] = Project.increment_processes(
+            {
+                project_id: (submitted, completed)
+                for project_id, (submitted, completed) in increments.items()
+                if submitted != 0 or completed != 0
+            }
+        )
+        unchanged_project_ids = increments.keys() - counters.keys()
+        if len(unchanged_project_ids) > 0:
+            # Projects with only messages in this batch, counters are read instead of updated
+            for row in (
+                Project.select(
+                    Project.id, Project.submitted_processes, Project.completed_processes
+                )
+                .where(Project.id.in_(list(unchanged_project_ids)))
+                .dicts()
+            ):
+                counters[row["id"]] = (
+                    row["submitted_processes"],
+                    row["completed_processes"],
+                )
+
+        for project_id, result in results:
+            if project_id not in counters:
+                # Project was deleted
+                continue
+            match result.type:
+                case LogProcessingResultType.PROGRESS | LogProcessingResultType.MESSAGE:
+                    ProgressEmitter.add(
+                        project_id,
+                        counters[project_id][0],
+                        counters[project_id][1],
+                        result.message,
+                        start_flusher=start_flusher,
+                    )
+                case LogProcessingResultType.ERROR:
+                    ProgressEmitter.error(project_id, result.message)
@@ -0,0 +1,461 @@
+"""Streaming ZIP archiver with parallel compression."""
+
+# std imports
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+from pathlib import Path
+import struct
+from typing import Any, Callable, ClassVar, Deque, Iterator, List, Optional, Set, Tuple
+import zlib
+
+# 3rd party imports
+import eventlet
+from eventlet import tpool
+
+
+class ZipStreamEntry:
+    """
+    File within the archive
+    """
+
+    def __init__(self, path: Path, arcname: str, is_stored: bool):
+        """
+        Creates a new entry.
+
+        Parameters
+        ----------
+        path : Path
+            Path to the file
+        arcname : str
+            Name within the archive
+        is_stored : bool
+            If true, the file is stored without compression
+        """
+        file_stat = path.stat()
+        self.path: Path = path
+        self.arcname: bytes = arcname.lstrip("/").encode("utf-8")
+        self.is_stored: bool = is_stored
+        self.size: int = file_stat.st_size
+        self.dos_time, self.dos_date = ZipStream.to_dos_datetime(file_stat.st_mtime)
+        self.is_zip64: bool = (
+            ZipStream.max_compressed_size(self.size) >= ZipStream.ZIP64_LIMIT
+        )
+        self.crc: int = 0
+        self.compressed_size: int = 0
+        self.offset: int = 0
+
+
+class ZipStream:
+    """
+    Creates a ZIP archive on the fly, without temporary files.
+
+    * Every entry uses a data descriptor, so CRC and compressed size are written after the data
+      and the local header is sent before the file is read.
+    * Already compressed formats (`STORED_SUFFIXES`) are stored instead of being deflated again.
+    * Other files are split into blocks of `BLOCK_SIZE` bytes, which are deflated in a thread pool
+      (zlib releases the GIL). Each block is primed with the last 32 KiB of its predecessor and
+      ends with a sync flush, so the concatenated blocks form a single valid deflate stream
+      (same approach as pigz). Blocks are emitted in order, the CRC is computed sequentially.
+    * ZIP64 records are added for entries or offsets exceeding 4 GiB and for more than 65535 entries.
+    * If all entries are stored, the archive size is known before streaming, see `content_length`.
+
+    When running with eventlet, blocks are compressed in eventlet's native thread pool (`tpool`),
+    as monkey patched threads are green threads and would compress on the hub.
+    """
+
+    STORED_SUFFIXES: ClassVar[Set[str]] = {
+        ".7z", ".bam", ".bcf", ".bgz", ".bz2", ".cram", ".gif", ".gz", ".jpeg", ".jpg", ".mp4",
+        ".parquet", ".png", ".rar", ".tgz", ".webp", ".xz", ".zip", ".zst",
+    }
+    """Suffixes of already compressed files, stored without compression"""
+
+    BLOCK_SIZE: ClassVar[int] = 1 << 20
+    """Bytes per independently deflated block"""
+
+    DICTIONARY_SIZE: ClassVar[int] = 1 << 15
+    """Bytes of the previous block used as dictionary (deflate window size)"""
+
+    COMPRESSION_LEVEL: ClassVar[int] = 6
+    """Deflate compression level"""
+
+    MAX_WORKERS: ClassVar[int] = min(8, os.cpu_count() or 1)
+    """Number of compression threads"""
+
+    ZIP64_LIMIT: ClassVar[int] = 0xFFFFFFFF
+    """Sizes and offsets from here on need ZIP64 records"""
+
+    ZIP64_ENTRY_LIMIT: ClassVar[int] = 0xFFFF
+    """Entry counts from here on need ZIP64 records"""
+
+    def __init__(self, files: List[Tuple[Path, str]]):
+        """
+        Creates a new ZipStream.
+
+        Parameters
+        ----------
+        files : List[Tuple[Path, str]]
+            Files to add as `(path, name within archive)`
+        """
+        self.__entries: List[ZipStreamEntry] = [
+            ZipStreamEntry(path, arcname, self.is_stored_format(path))
+            for path, arcname in files
+        ]
+
+    @classmethod
+    def is_stored_format(cls, path: Path) -> bool:
+        """
+        Parameters
+        ----------
+        path : Path
+            Path to file
+
+        Returns
+        -------
+        bool
+            True if the file is already compressed and is stored without compression
+        """
+        return path.suffix.lower() in cls.STORED_SUFFIXES
+
+    @staticmethod
+    def max_compressed_size(size: int) -> int:
+        """
+        Upper bound of the deflated size, including the sync flush markers of all blocks.
+
+        Parameters
+        ----------
+        size : int
+            Uncompressed size
+
+        Returns
+        -------
+        int
+            Upper bound of the compressed size
+        """
+        return size + (size >> 12) + (size >> 14) + 1024
+
+    @staticmethod
+    def to_dos_datetime(timestamp: float) -> Tuple[int, int]:
+        """
+        Converts a timestamp into MS-DOS time and date.
+
+        Parameters
+        ----------
+        timestamp : float
+            Unix timestamp
+
+        Returns
+        -------
+        Tuple[int, int]
+            Time and date
+        """
+        moment = datetime.fromtimestamp(timestamp)
+        if moment.year < 1980:
+            moment = datetime(1980, 1, 1)
+        return (
+            (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+            ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day,
+        )
+
+    @property
+    def content_length(self) -> Optional[int]:
+        """
+        Returns
+        -------
+        Optional[int]
+            Size of the archive in bytes if all entries are stored, otherwise None
+        """
+        if not all(entry.is_stored for entry in self.__entries):
+            return None
+        offset = 0
+        for entry in self.__entries:
+            entry.offset = offset
+            entry.compressed_size = entry.size
+            offset += (
+                len(self.__local_header(entry)) + entry.size + len(self.__data_descriptor(entry))
+            )
+        return offset + len(self.__central_directory(offset))
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Streams the archive.
+
+        Yields
+        ------
+        Iterator[bytes]
+            Archive chunks
+        """
+        submit, wait, shutdown = self.__create_worker_pool()
+        # Chunks in archive order as `(kind, chunk, entry)`, data chunks may be pending compression jobs
+        pending: Deque[Tuple[str, Any, ZipStreamEntry]] = deque()
+        offset = 0
+        max_pending = self.__class__.MAX_WORKERS * 2
+
+        def drain(keep: int) -> Iterator[bytes]:
+            nonlocal offset
+            while len(pending) > keep:
+                kind, chunk, entry = pending.popleft()
+                if kind == "header":
+                    entry.offset = offset
+                elif kind == "data":
+                    if not isinstance(chunk, bytes):
+                        chunk = wait(chunk)
+                    entry.compressed_size += len(chunk)
+                else:
+                    chunk = self.__data_descriptor(entry)
+                offset += len(chunk)
+                yield chunk
+
+        try:
+            for entry in self.__entries:
+                entry.crc = 0
+                entry.compressed_size = 0
+                pending.append(("header", self.__local_header(entry), entry))
+                for chunk, entry_crc in self.__read_blocks(entry, submit):
+                    entry.crc = entry_crc
+                    pending.append(("data", chunk, entry))
+                    yield from drain(max_pending)
+                pending.append(("descriptor", None, entry))
+                yield from drain(max_pending)
+            yield from drain(0)
+            yield self.__central_directory(offset)
+        finally:
+            shutdown()
+
+    def __read_blocks(
+        self, entry: ZipStreamEntry, submit: Callable[..., Any]
+    ) -> Iterator[Tuple[Any, int]]:
+        """
+        Reads the file of the given entry block by block.
+
+        Parameters
+        ----------
+        entry : ZipStreamEntry
+            Entry
+        submit : Callable[..., Any]
+            Submits a compression job to the worker pool
+
+        Yields
+        ------
+        Iterator[Tuple[Any, int]]
+            Raw block (stored entries) or pending compression job and the CRC up to this block
+
+        Raises
+        ------
+        IOError
+            If the file shrank since the archive was created
+        """
+        crc = 0
+        remaining = entry.size
+        dictionary = b""
+        with entry.path.open("rb") as file:
+            while remaining > 0:
+                block = file.read(min(remaining, self.__class__.BLOCK_SIZE))
+                if len(block) == 0:
+                    raise IOError(f"{entry.path} shrank while archiving")
+                remaining -= len(block)
+                crc = zlib.crc32(block, crc)
+                if entry.is_stored:
+                    yield block, crc
+                else:
+                    yield submit(self.deflate_block, block, dictionary, remaining == 0), crc
+                    dictionary = block[-self.__class__.DICTIONARY_SIZE :]
+        if not entry.is_stored and entry.size == 0:
+            yield submit(self.deflate_block, b"", b"", True), crc
+
+    @classmethod
+    def deflate_block(cls, block: bytes, dictionary: bytes, is_last: bool) -> bytes:
+        """
+        Deflates a block into a raw deflate stream fragment.
+
+        Parameters
+        ----------
+        block : bytes
+            Uncompressed block
+        dictionary : bytes
+            End of the previous block, empty for the first block
+        is_last : bool
+            If true, the deflate stream is finished, otherwise it is sync flushed
+
+        Returns
+        -------
+        bytes
+            Compressed block
+        """
+        if len(dictionary) > 0:
+            compressor = zlib.compressobj(
+                cls.COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary
+            )
+        else:
+            compressor = zlib.compressobj(cls.COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(block) + compressor.flush(
+            zlib.Z_FINISH if is_last else zlib.Z_SYNC_FLUSH
+        )
+
+    @classmethod
+    def __create_worker_pool(
+        cls,
+    ) -> Tuple[Callable[..., Any], Callable[[Any], bytes], Callable[[], None]]:
+        """
+        Creates the compression worker pool, backed by native threads with and without eventlet.
+
+        Returns
+        -------
+        Tuple[Callable[..., Any], Callable[[Any], bytes], Callable[[], None]]
+            Functions to submit a job, wait for a job's result and shut the pool down
+        """
+        if eventlet.patcher.is_monkey_patched("thread"):
+            green_pool = eventlet.GreenPool(cls.MAX_WORKERS)
+            return (
+                lambda function, *args: green_pool.spawn(tpool.execute, function, *args),
+                lambda job: job.wait(),
+                green_pool.waitall,
+            )
+        executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS)
+        return (
+            executor.submit,
+            lambda job: job.result(),
+            lambda: executor.shutdown(wait=True, cancel_futures=True),
+        )
+
+    @staticmethod
+    def __local_header(entry: ZipStreamEntry) -> bytes:
+        """
+        Parameters
+        ----------
+        entry : ZipStreamEntry
+            Entry
+
+        Returns
+        -------
+        bytes
+            Local file header with data descriptor flag, CRC and sizes are zero
+        """
+        extra = b""
+        size_placeholder = 0
+        if entry.is_zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            size_placeholder = 0xFFFFFFFF
+        return (
+            struct.pack(
+                "<IHHHHHIIIHH",
+                0x04034B50,
+                45 if entry.is_zip64 else 20,
+                0x0808,  # data descriptor, UTF-8 names
+                0 if entry.is_stored else 8,
+                entry.dos_time,
+                entry.dos_date,
+                0,
+                size_placeholder,
+                size_placeholder,
+                len(entry.arcname),
+                len(extra),
+            )
+            + entry.arcname
+            + extra
+        )
+
+    @staticmethod
+    def __data_descriptor(entry: ZipStreamEntry) -> bytes:
+        """
+        Parameters
+        ----------
+        entry : ZipStreamEntry
+            Entry after its data is written
+
+        Returns
+        -------
+        bytes
+            Data descriptor with CRC and sizes
+        """
+        if entry.is_zip64:
+            return struct.pack(
+                "<IIQQ", 0x08074B50, entry.crc, entry.compressed_size, entry.size
+            )
+        return struct.pack("<IIII", 0x08074B50, entry.crc, entry.compressed_size, entry.size)
+
+    def __central_directory(self, offset: int) -> bytes:
+        """
+        Parameters
+        ----------
+        offset : int
+            Offset of the central directory, i.e. size of all entries
+
+        Returns
+        -------
+        bytes
+            Central directory and end of central directory records (including ZIP64 records if necessary)
+        """
+        limit = self.__class__.ZIP64_LIMIT
+        records: List[bytes] = []
+        for entry in self.__entries:
+            zip64_fields: List[int] = []
+            if entry.is_zip64:
+                zip64_fields.extend([entry.size, entry.compressed_size])
+            if entry.offset >= limit:
+                zip64_fields.append(entry.offset)
+            extra = b""
+            if len(zip64_fields) > 0:
+                extra = struct.pack(
+                    f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields
+                )
+            records.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    (3 << 8) | 45,  # made by UNIX, version 4.5
+                    45 if len(zip64_fields) > 0 else 20,
+                    0x0808,
+                    0 if entry.is_stored else 8,
+                    entry.dos_time,
+                    entry.dos_date,
+                    entry.crc,
+                    0xFFFFFFFF if entry.is_zip64 else entry.compressed_size,
+                    0xFFFFFFFF if entry.is_zip64 else entry.size,
+                    len(entry.arcname),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    0o100644 << 16,
+                    0xFFFFFFFF if entry.offset >= limit else entry.offset,
+                )
+                + entry.arcname
+                + extra
+            )
+
+        central_directory = b"".join(records)
+        entry_count = len(self.__entries)
+        end_records = b""
+        if (
+            entry_count >= self.__class__.ZIP64_ENTRY_LIMIT
+            or offset >= limit
+            or len(central_directory) >= limit
+        ):
+            zip64_end_offset = offset + len(central_directory)
+            end_records = struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50,
+                44,
+                45,
+                45,
+                0,
+                0,
+                entry_count,
+                entry_count,
+                len(central_directory),
+                offset,
+            ) + struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        end_records += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50,
+            0,
+            0,
+            min(entry_count, 0xFFFF),
+            min(entry_count, 0xFFFF),
+            0xFFFFFFFF if len(central_directory) >= limit else len(central_directory),
+            0xFFFFFFFF if offset >= limit else offset,
+            0,
+        )
+        return central_directory + end_records
@@ -0,0 +1,58 @@
+"""Test the parameter sweeps."""
+
+import unittest
+
+from macworp_backend.utility.parameter_sweep import ParameterSweep
+
+
+class ParameterSweepTest(unittest.TestCase):
+    """Test the parameter sweeps."""
+
+    def test_range_values(self):
+        """Check that ranges include the stop value and are rounded."""
+        self.assertEqual(
+            ParameterSweep.get_sweep_values(
+                {"type": "number", "sweep": {"start": 0.1, "stop": 0.5, "step": 0.1}}
+            ),
+            [0.1, 0.2, 0.3, 0.4, 0.5],
+        )
+        self.assertEqual(
+            ParameterSweep.get_sweep_values(
+                {"type": "number", "sweep": {"start": 1, "stop": 10, "step": 4}}
+            ),
+            [1, 5, 9],
+        )
+        with self.assertRaises(ValueError):
+            ParameterSweep.get_sweep_values(
+                {"type": "text", "sweep": {"start": 1, "stop": 2, "step": 1}}
+            )
+        with self.assertRaises(ValueError):
+            ParameterSweep.get_sweep_values(
+                {"type": "number", "sweep": {"start": 2, "stop": 1, "step": 1}}
+            )
+
+    def test_expand_and_count_runs(self):
+        """Check that the runs are the Cartesian product, varying the last swept parameter fastest."""
+        workflow_parameters = [
+            {"name": "a", "type": "number", "sweep": {"start": 1, "stop": 2, "step": 1}},
+            {"name": "fixed", "type": "text", "value": "x"},
+            {"name": "b", "type": "text", "sweep": {"values": ["u", "v", "w"]}},
+        ]
+
+        runs = ParameterSweep.expand(workflow_parameters)
+
+        self.assertEqual(ParameterSweep.count_runs(workflow_parameters), 6)
+        self.assertEqual(
+            [[param["value"] for param in run] for run in runs],
+            [
+                [1, "x", "u"],
+                [1, "x", "v"],
+                [1, "x", "w"],
+                [2, "x", "u"],
+                [2, "x", "v"],
+                [2, "x", "w"],
+            ],
+        )
+        self.assertTrue(all("sweep" not in param for run in runs for param in run))
+        # The input is not modified
+        self.assertIn("sweep", workflow_parameters[0])
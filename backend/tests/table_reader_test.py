@@ -0,0 +1,52 @@
+"""Test the table reader."""
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from macworp_backend.utility.table_reader import TableReader
+
+
+class TableReaderTest(unittest.TestCase):
+    """Test the table reader."""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def create_reader(self, content: str) -> TableReader:
+        """Writes the content to a CSV file and returns a reader for it."""
+        table_path = self.directory.joinpath("table.csv")
+        table_path.write_text(content, encoding="utf-8")
+        return TableReader(table_path, self.directory.joinpath("index"))
+
+    def test_read_with_blank_lines_and_multiline_fields(self):
+        """Check that offsets refer to rows, not lines, within and across indexed blocks."""
+        row_count = TableReader.ROW_INDEX_INTERVAL + 10
+        lines = ["id,text"]
+        for row in range(row_count):
+            if row == 5:
+                lines.append("")
+            if row == 7:
+                lines.append(f'{row},"line one\nline two"')
+            else:
+                lines.append(f"{row},row {row}")
+        reader = self.create_reader("\n".join(lines) + "\n")
+
+        self.assertEqual(reader.total_rows, row_count)
+        for offset in [0, 4, 5, 6, 7, 8, TableReader.ROW_INDEX_INTERVAL - 1, TableReader.ROW_INDEX_INTERVAL + 3]:
+            rows = reader.read(offset, 2)
+            self.assertEqual(rows["id"].tolist(), [offset, offset + 1])
+        self.assertEqual(reader.read(row_count - 1)["id"].tolist(), [row_count - 1])
+
+    def test_read_keeps_requested_column_order(self):
+        """Check that columns are returned in the requested order, not in file order."""
+        reader = self.create_reader("a,b,c\n1,2,3\n4,5,6\n")
+
+        self.assertEqual(list(reader.read(0, 1, ["c", "a"]).columns), ["c", "a"])
+        self.assertEqual(
+            list(reader.read_filtered(["c", "a"], [("a", ">", 1)]).columns), ["c", "a"]
+        )
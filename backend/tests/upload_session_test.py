@@ -0,0 +1,63 @@
+"""Test the upload sessions."""
+
+import hashlib
+import io
+from pathlib import Path
+import tempfile
+import unittest
+
+from macworp_backend.utility.upload_session import UploadSession
+
+
+class UploadSessionTest(unittest.TestCase):
+    """Test the upload sessions."""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.root_directory = Path(self.temporary_directory.name).joinpath("project")
+        self.sessions_directory = Path(self.temporary_directory.name).joinpath("uploads")
+        self.root_directory.mkdir()
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_add_range(self):
+        """Check that ranges are kept sorted and overlapping or adjacent ranges are merged."""
+        self.assertEqual(UploadSession.add_range([], (5, 10)), [(5, 10)])
+        self.assertEqual(UploadSession.add_range([(5, 10)], (0, 2)), [(0, 2), (5, 10)])
+        self.assertEqual(UploadSession.add_range([(0, 2), (5, 10)], (2, 5)), [(0, 10)])
+        self.assertEqual(UploadSession.add_range([(0, 2), (5, 10)], (1, 6)), [(0, 10)])
+        self.assertEqual(UploadSession.add_range([(0, 10)], (3, 4)), [(0, 10)])
+        self.assertEqual(
+            UploadSession.add_range([(0, 2), (4, 6), (8, 10)], (12, 14)),
+            [(0, 2), (4, 6), (8, 10), (12, 14)],
+        )
+
+    def test_get_missing_ranges(self):
+        """Check that the gaps between received ranges and the end of the file are returned."""
+        self.assertEqual(UploadSession.get_missing_ranges([], 10), [(0, 10)])
+        self.assertEqual(UploadSession.get_missing_ranges([(0, 10)], 10), [])
+        self.assertEqual(
+            UploadSession.get_missing_ranges([(2, 4), (6, 8)], 10),
+            [(0, 2), (4, 6), (8, 10)],
+        )
+        self.assertEqual(UploadSession.get_missing_ranges([], 0), [])
+
+    def test_corrupted_retry_keeps_received_data(self):
+        """Check that a chunk with checksum mismatch does not overwrite received data."""
+        content = b"0123456789"
+        status = UploadSession.create(
+            self.sessions_directory, self.root_directory, Path("file.txt"), len(content)
+        )
+        session = UploadSession(
+            self.sessions_directory, self.root_directory, status["session_id"]
+        )
+        session.write_chunk(0, io.BytesIO(content[:5]), 5, hashlib.sha256(content[:5]).hexdigest())
+        with self.assertRaises(ValueError):
+            session.write_chunk(0, io.BytesIO(b"xxxxx"), 5, hashlib.sha256(content[:5]).hexdigest())
+        status = session.write_chunk(
+            5, io.BytesIO(content[5:]), 5, hashlib.sha256(content[5:]).hexdigest()
+        )
+
+        self.assertTrue(status["is_complete"])
+        self.assertEqual(self.root_directory.joinpath("file.txt").read_bytes(), content)
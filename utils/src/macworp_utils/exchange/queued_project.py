@@ -1,7 +1,7 @@
 """Functionality to work with QueuedProject objects."""
 
 # std imports
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 # 3rd party imports
 from pydantic import BaseModel, Field
@@ -18,3 +18,15 @@ class QueuedProject(BaseModel):
 
     workflow_arguments: List[Dict[str, Any]] = Field(default_factory=list)
     """List of dictionaries with workflow arguments"""
+
+    sweep_id: Optional[int] = None
+    """ID of the parameter sweep this run belongs to, None for a single run"""
+
+    run_index: Optional[int] = None
+    """Index of the run within the parameter sweep"""
+
+    run_directory: Optional[str] = None
+    """Output folder of the sweep run, relative to the project directory"""
+
+    run_id: Optional[int] = None
+    """ID of the run in the run history, None for messages queued before the run history existed"""
@@ -0,0 +1,17 @@
+"""Functionality to work with WorkflowLog objects."""
+
+# 3rd party imports
+from pydantic import BaseModel
+
+
+class WorkflowLog(BaseModel):
+    """Workflow log entry as published by the worker's log proxy to the message broker."""
+
+    project_id: int
+    """Project ID"""
+
+    workflow_engine: str
+    """Workflow engine which created the log, see `SupportedWorkflowEngine`"""
+
+    log: str
+    """Log entry as JSON string, as received from the workflow engine"""
@@ -10,6 +10,12 @@ from macworp_worker.comand_line_interface import ComandLineInterface as CLI
 from macworp_worker.logging import verbosity_to_log_level
 from macworp_worker.web.backend_web_api_client import BackendWebApiClient
 from macworp_worker.worker import Worker
+from macworp_worker.workflow_engine_cmd_generators.engine_asset_cache import (
+    EngineAssetCache,
+)
+from macworp_worker.workflow_engine_cmd_generators.git_mirror_cache import (
+    GitMirrorCache,
+)
 
 
 def main():
@@ -37,6 +43,8 @@ def main():
             cli.arguments.api_user,
             cli.arguments.api_password,
             not cli.arguments.skip_cert_verification,
+            pool_size=cli.arguments.api_pool_size,
+            timeout=cli.arguments.api_timeout,
         ),
         Path(cli.arguments.projects_data_path).absolute(),
         cli.arguments.rabbitmq_url,
@@ -45,6 +53,20 @@ def main():
         cli.arguments.keep_intermediate_files,
         stop_event,
         log_level,
+        cli.arguments.workflow_log_queue_name,
+        (
+            GitMirrorCache(Path(cli.arguments.git_cache_dir).absolute())
+            if cli.arguments.git_cache_dir is not None
+            else None
+        ),
+        (
+            EngineAssetCache(
+                Path(cli.arguments.engine_cache_dir).absolute(),
+                int(cli.arguments.engine_cache_size * 1024**3),
+            )
+            if cli.arguments.engine_cache_dir is not None
+            else None
+        ),
     )
     worker.start()
 
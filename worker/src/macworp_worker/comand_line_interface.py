@@ -31,6 +31,17 @@ class ComandLineInterface:
         self.__arg_parser.add_argument(
             "--project-queue-name", "-q", type=str, help="Name of the workflow queue"
         )
+        self.__arg_parser.add_argument(
+            "--workflow-log-queue-name",
+            type=str,
+            default=None,
+            required=False,
+            help=(
+                "Name of the workflow log queue. If set, workflow logs are published to RabbitMQ "
+                "instead of being posted to the MAcWorP API one by one. "
+                "Requires the backend's workflow log consumer. (default: None)"
+            ),
+        )
         self.__arg_parser.add_argument(
             "--projects-data-path",
             "-d",
@@ -49,6 +60,50 @@ class ComandLineInterface:
         self.__arg_parser.add_argument(
             "--api-password", "-p", type=str, help="API password."
         )
+        self.__arg_parser.add_argument(
+            "--api-pool-size",
+            type=int,
+            default=10,
+            required=False,
+            help="Maximum number of kept-alive connections to the MAcWorP API per process. (default: 10)",
+        )
+        self.__arg_parser.add_argument(
+            "--api-timeout",
+            type=float,
+            default=60.0,
+            required=False,
+            help="Timeout in seconds for connecting to and reading from the MAcWorP API. (default: 60)",
+        )
+        self.__arg_parser.add_argument(
+            "--git-cache-dir",
+            type=str,
+            default=None,
+            required=False,
+            help=(
+                "Folder for bare mirrors of remote workflow repositories, shared by all executors. "
+                "If not set, remote workflows are cloned for every run. (default: None)"
+            ),
+        )
+        self.__arg_parser.add_argument(
+            "--engine-cache-dir",
+            type=str,
+            default=None,
+            required=False,
+            help=(
+                "Folder for Nextflow's home, Conda environments and container images, "
+                "shared by all executors. If not set, the engines use their defaults. (default: None)"
+            ),
+        )
+        self.__arg_parser.add_argument(
+            "--engine-cache-size",
+            type=float,
+            default=100.0,
+            required=False,
+            help=(
+                "Maximum size in GiB of the Conda environments and container images in the engine cache. "
+                "Least recently used ones are removed when exceeded. (default: 100)"
+            ),
+        )
         self.__arg_parser.add_argument(
             "--verbose", "-v", default=0, action="count", help="Verbose"
         )
@@ -1,21 +1,36 @@
 """Executor for running workflows. """
 
+from contextlib import nullcontext
 import logging
 import re
 import shutil
+import socket
 import subprocess
+import time
 from multiprocessing import Process, Queue
 from multiprocessing.connection import Connection
 from multiprocessing.synchronize import Event as EventClass
 from pathlib import Path
 from queue import Empty as EmptyQueueError
-from typing import ClassVar, List, Optional, Self, Tuple
+from threading import Event, Thread
+from typing import Any, ClassVar, Dict, List, Optional, Self, Tuple
 
 from macworp_utils.constants import SupportedWorkflowEngine
+from macworp_utils.exchange.queued_project import QueuedProject
 from macworp_utils.path import secure_joinpath
+import requests
 
 from macworp_worker.logging import get_logger
-from macworp_worker.web.backend_web_api_client import BackendWebApiClient
+from macworp_worker.web.backend_web_api_client import (
+    BackendWebApiClient,
+    LeaseHeldError,
+)
+from macworp_worker.workflow_engine_cmd_generators.engine_asset_cache import (
+    EngineAssetCache,
+)
+from macworp_worker.workflow_engine_cmd_generators.git_mirror_cache import (
+    GitMirrorCache,
+)
 from macworp_worker.workflow_engine_cmd_generators.nextflow_cmd_generator import (
     NextflowCmdGenerator,
 )
@@ -24,6 +39,93 @@ from macworp_worker.workflow_engine_cmd_generators.snakemake_cmd_generator impor
 )
 
 
+class LeaseRenewer(Thread):
+    """
+    Renews the lease of a claimed run three times per lease period until stopped,
+    so the backend does not hand the run out again while it is executed.
+    If the lease is lost, e.g. the worker could not reach the API until the lease expired,
+    `is_lease_lost` is set, so the executor can stop the run, as another worker might execute it meanwhile.
+    """
+
+    def __init__(
+        self,
+        backend_web_api_client: BackendWebApiClient,
+        run_id: int,
+        lease_token: str,
+        lease_seconds: int,
+        logger: logging.Logger,
+    ):
+        """
+        Parameters
+        ----------
+        backend_web_api_client : BackendWebApiClient
+            Client for communicating with the MAcWorP API
+        run_id : int
+            Run ID
+        lease_token : str
+            Lease token of the claim
+        lease_seconds : int
+            Validity of the lease
+        logger : logging.Logger
+            Logger
+        """
+        super().__init__(daemon=True)
+        self.__backend_web_api_client = backend_web_api_client
+        self.__run_id = run_id
+        self.__lease_token = lease_token
+        self.__interval = max(lease_seconds / 3, 1.0)
+        self.__logger = logger
+        self.__stop_event = Event()
+        self.__lease_lost_event = Event()
+
+    @property
+    def lease_token(self) -> str:
+        """
+        Returns
+        -------
+        str
+            Lease token of the claim
+        """
+        return self.__lease_token
+
+    @property
+    def is_lease_lost(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if the lease was taken over by another claim
+        """
+        return self.__lease_lost_event.is_set()
+
+    def run(self):
+        """
+        Renews the lease until stopped or the lease is lost.
+        """
+        while not self.__stop_event.wait(self.__interval):
+            try:
+                if not self.__backend_web_api_client.renew_lease(
+                    self.__run_id, self.__lease_token
+                ):
+                    self.__logger.warning(
+                        "[WORKER / RUN %i] Lease lost, the run might be executed by another worker.",
+                        self.__run_id,
+                    )
+                    self.__lease_lost_event.set()
+                    return
+            except Exception as e:  # pylint: disable=broad-except
+                self.__logger.warning(
+                    "[WORKER / RUN %i] Could not renew lease: %s", self.__run_id, e
+                )
+
+    def stop(self):
+        """
+        Stops renewing and waits for the thread to end.
+        """
+        self.__stop_event.set()
+        self.join()
+
+
 class Executor(Process):
     """
     Executor for running workflows.
@@ -48,6 +150,11 @@ class Executor(Process):
         Log level
     weblog_proxy_port: int
         Port for the weblog proxy
+    git_mirror_cache: Optional[GitMirrorCache]
+        Shared cache for remote workflow repositories, if None they are cloned for every run.
+    engine_asset_cache: Optional[EngineAssetCache]
+        Shared caches for Conda environments, container images, etc.,
+        if None the engines use their defaults.
     """
 
     PRECEDING_SLASH_REGEX: ClassVar[re.Pattern] = re.compile(r"^/+")
@@ -60,6 +167,16 @@ class Executor(Process):
     WHITESPACE_REGEX: ClassVar[re.Pattern] = re.compile(r"\s+")
     """Regex matching whitespaces."""
 
+    MIN_REQUEUE_DELAY: ClassVar[float] = 5.0
+    """Minimum seconds before a job claimed by another worker is requeued"""
+
+    LEASE_CHECK_INTERVAL: ClassVar[float] = 5.0
+    """Seconds between checks whether the lease of the running workflow was lost"""
+
+    MAX_REQUEUE_DELAY: ClassVar[float] = 300.0
+    """Maximum seconds before a job claimed by another worker is requeued,
+    must be lower than the consumer acknowledgement timeout of the broker"""
+
     def __init__(
         self,
         nextflow_executable: Path,
@@ -72,6 +189,8 @@ class Executor(Process):
         stop_event: EventClass,
         log_level: int,
         weblog_proxy_port: int,
+        git_mirror_cache: Optional[GitMirrorCache] = None,
+        engine_asset_cache: Optional[EngineAssetCache] = None,
     ):
         super().__init__()
         self.nextflow_executable: Path = nextflow_executable
@@ -84,6 +203,8 @@ class Executor(Process):
         self.stop_event: EventClass = stop_event
         self.log_level: int = log_level
         self.weblog_proxy_port: int = weblog_proxy_port
+        self.git_mirror_cache: Optional[GitMirrorCache] = git_mirror_cache
+        self.engine_asset_cache: Optional[EngineAssetCache] = engine_asset_cache
 
     def run(self):
         """
@@ -100,21 +221,28 @@ class Executor(Process):
 
             logger.info("[WORKER / PROJECT %i] Start", project_params.id)
 
+            setup_started_at = time.monotonic()
             try:
-                if self.backend_web_api_client.is_project_ignored(project_params.id):
-                    logger.warning(
-                        (
-                            "[WORKER / PROJECT %i] Project is ignored. "
-                            "Removing from queue and moving on.",
-                        ),
-                        project_params.id,
-                    )
-                    self.communication_channel.send((delivery_tag, True))
-                    continue
+                claim = self.backend_web_api_client.claim_project(
+                    project_params, socket.gethostname()
+                )
+            except LeaseHeldError as e:
+                # The other worker might crash, so keep the job until its lease expired
+                requeue_delay = min(
+                    max(e.retry_after, self.__class__.MIN_REQUEUE_DELAY),
+                    self.__class__.MAX_REQUEUE_DELAY,
+                )
+                logger.info(
+                    "[WORKER / PROJECT %i] Run is claimed by another worker. Requeueing in %.0f seconds.",
+                    project_params.id,
+                    requeue_delay,
+                )
+                self.communication_channel.send((delivery_tag, False, requeue_delay))
+                continue
             except Exception as e:  # pylint: disable=broad-except
                 logging.error(
                     (
-                        "[WORKER / PROJECT %i] Not able to fetch project ignore status from API. "
+                        "[WORKER / PROJECT %i] Not able to claim project. "
                         "Rejecting message and moving on: %s"
                     ),
                     project_params.id,
@@ -122,140 +250,313 @@ class Executor(Process):
                 )
                 self.communication_channel.send((delivery_tag, False))
                 continue
-
-            # Project work dir
-            project_dir = self.project_data_path.joinpath(f"{project_params.id}/")
-            # Get workflow settings
-            workflow = {}
-
-            try:
-                workflow = self.backend_web_api_client.get_workflow(
-                    project_params.workflow_id
-                )
-            except Exception as e:  # pylint: disable=broad-except
-                logging.error(
+            if claim is None:
+                logger.warning(
                     (
-                        "[WORKER / PROJECT %i] Not able to fetch workflow from API. "
-                        "Rejecting message and moving on: %s",
+                        "[WORKER / PROJECT %i] Project is ignored, deleted or the run is finished. "
+                        "Removing from queue and moving on."
                     ),
                     project_params.id,
-                    e,
                 )
-                self.communication_channel.send((delivery_tag, False))
+                self.communication_channel.send((delivery_tag, True))
                 continue
-
-            # Create a temporary work directory for the workflow
-            sanitized_workflow_name = self.sanitize_workflow_name(workflow["name"])
-            work_dir = secure_joinpath(
-                project_dir, Path(f".{sanitized_workflow_name}_work")
+            project_params.run_id = claim["run_id"]
+            workflow = claim["workflow"]
+
+            lease_renewer = LeaseRenewer(
+                self.backend_web_api_client,
+                claim["run_id"],
+                claim["lease_token"],
+                claim["lease_seconds"],
+                logger,
             )
-            if not work_dir.is_dir():
-                work_dir.mkdir(parents=True, exist_ok=True)
-
-            command = []
-
+            lease_renewer.start()
             try:
-                (workflow_engine, workflow_engine_version) = self.__class__.split_engine(workflow["definition"]["engine"])
-            except ValueError as e:
-                logger.error(
-                    "[WORKER / PROJECT %i] Unsupported workflow engine: %s",
-                    project_params.id,
-                    workflow["definition"]["engine"],
+                self.execute(
+                    project_params,
+                    workflow,
+                    lease_renewer,
+                    delivery_tag,
+                    setup_started_at,
+                    logger,
                 )
-                self.communication_channel.send((delivery_tag, False))
-                continue
+            finally:
+                lease_renewer.stop()
 
-            try:
-                match workflow_engine:
-                    case SupportedWorkflowEngine.NEXTFLOW:
-                        command = NextflowCmdGenerator(
-                            self.nextflow_executable,
-                            self.backend_web_api_client,
-                            logger,
-                            self.weblog_proxy_port,
-                        ).generate_command(
-                            project_dir, work_dir, project_params, workflow["definition"], nextflow_version = workflow_engine_version
-                        )
-                    case SupportedWorkflowEngine.SNAKEMAKE:
-                        command = SnakemakeCmdGenerator(
-                            self.snakemake_executable,
-                            self.backend_web_api_client,
-                            logger,
-                            self.weblog_proxy_port,
-                        ).generate_command(
-                            project_dir, work_dir, project_params, workflow["definition"]
-                        )
-            except Exception as e:
-                logger.error(
-                    "[WORKER / PROJECT %i] Error generating command for workflow: %s",
-                    project_params.id,
-                    e,
-                )
-                self.communication_channel.send((delivery_tag, False))
-                continue
+    def execute(
+        self,
+        project_params: QueuedProject,
+        workflow: Dict[str, Any],
+        lease_renewer: LeaseRenewer,
+        delivery_tag: Any,
+        setup_started_at: float,
+        logger: logging.Logger,
+    ):
+        """
+        Executes a claimed job and reports the result.
 
-            logger.debug(
-                "[WORKER / PROJECT %i] %s",
+        Parameters
+        ----------
+        project_params : QueuedProject
+            Queued project
+        workflow : Dict[str, Any]
+            Workflow
+        lease_renewer : LeaseRenewer
+            Renewer of the lease of the claim, the workflow is stopped if the lease is lost
+        delivery_tag : Any
+            Delivery tag of the message
+        setup_started_at : float
+            Start of the setup phase (monotonic clock)
+        logger : logging.Logger
+            Logger
+        """
+        # Project work dir
+        project_dir = self.project_data_path.joinpath(f"{project_params.id}/")
+        # Sweep runs are executed in their own folder, so concurrent runs do not share outputs
+        execution_dir = project_dir
+        if project_params.run_directory is not None:
+            execution_dir = secure_joinpath(
+                project_dir, Path(project_params.run_directory)
+            )
+            execution_dir.mkdir(parents=True, exist_ok=True)
+        # Create a temporary work directory for the workflow
+        sanitized_workflow_name = self.sanitize_workflow_name(workflow["name"])
+        work_dir = secure_joinpath(
+            execution_dir, Path(f".{sanitized_workflow_name}_work")
+        )
+        if not work_dir.is_dir():
+            work_dir.mkdir(parents=True, exist_ok=True)
+
+        command = []
+
+        try:
+            (workflow_engine, workflow_engine_version) = self.__class__.split_engine(workflow["definition"]["engine"])
+        except ValueError as e:
+            logger.error(
+                "[WORKER / PROJECT %i] Unsupported workflow engine: %s",
                 project_params.id,
-                " ".join(command),
+                workflow["definition"]["engine"],
             )
-
-            workflow_process = subprocess.Popen(
-                command,
-                cwd=project_dir,
-                text=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+            self.report_run_finish(
+                project_params,
+                lease_renewer.lease_token,
+                None,
+                {"setup": time.monotonic() - setup_started_at},
             )
-            workflow_stdout, workflow_stderr = workflow_process.communicate()
+            self.communication_channel.send((delivery_tag, False))
+            return
 
+        try:
             match workflow_engine:
                 case SupportedWorkflowEngine.NEXTFLOW:
-                    NextflowCmdGenerator.cleanup(
+                    command = NextflowCmdGenerator(
+                        self.nextflow_executable,
+                        self.backend_web_api_client,
+                        logger,
+                        self.weblog_proxy_port,
+                        self.git_mirror_cache,
+                        self.engine_asset_cache,
+                    ).generate_command(
                         project_dir,
                         work_dir,
-                        workflow_process.returncode == 0,
-                        self.keep_intermediate_files,
+                        project_params,
+                        workflow["definition"],
+                        nextflow_version=workflow_engine_version,
+                        execution_dir=execution_dir,
                     )
                 case SupportedWorkflowEngine.SNAKEMAKE:
-                    SnakemakeCmdGenerator.cleanup(
+                    command = SnakemakeCmdGenerator(
+                        self.snakemake_executable,
+                        self.backend_web_api_client,
+                        logger,
+                        self.weblog_proxy_port,
+                        self.git_mirror_cache,
+                        self.engine_asset_cache,
+                    ).generate_command(
                         project_dir,
                         work_dir,
-                        workflow_process.returncode == 0,
-                        self.keep_intermediate_files,
+                        project_params,
+                        workflow["definition"],
+                        execution_dir=execution_dir,
                     )
+        except Exception as e:
+            logger.error(
+                "[WORKER / PROJECT %i] Error generating command for workflow: %s",
+                project_params.id,
+                e,
+            )
+            self.report_run_finish(
+                project_params,
+                lease_renewer.lease_token,
+                None,
+                {"setup": time.monotonic() - setup_started_at},
+            )
+            self.communication_channel.send((delivery_tag, False))
+            return
+
+        logger.debug(
+            "[WORKER / PROJECT %i] %s",
+            project_params.id,
+            " ".join(command),
+        )
+
+        execution_started_at = time.monotonic()
+        with (
+            self.engine_asset_cache.in_use()
+            if self.engine_asset_cache is not None
+            else nullcontext()
+        ):
+            workflow_process = subprocess.Popen(
+                command,
+                cwd=execution_dir,
+                text=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            while True:
+                try:
+                    workflow_stdout, workflow_stderr = workflow_process.communicate(
+                        timeout=self.__class__.LEASE_CHECK_INTERVAL
+                    )
+                    break
+                except subprocess.TimeoutExpired:
+                    if lease_renewer.is_lease_lost and workflow_process.returncode is None:
+                        logger.error(
+                            "[WORKER / PROJECT %i] Lease lost, stopping the workflow.",
+                            project_params.id,
+                        )
+                        workflow_process.terminate()
+        cleanup_started_at = time.monotonic()
 
-            if workflow_process.returncode != 0:
-                logger.error(
-                    (
-                        "[WORKER / PROJECT %i] Workflow execution failed:"
-                        "\n----stdout----\n%s"
-                        "\n----stderr----\n%s"
-                    ),
-                    project_params.id,
-                    workflow_stdout.replace("\n", "\n\t"),
-                    workflow_stderr.replace("\n", "\n\t"),
+        if lease_renewer.is_lease_lost:
+            # Another worker executes the run in the same folders and reports it
+            logger.warning(
+                "[WORKER / PROJECT %i] Lease lost, leaving cleanup and reports to the other worker.",
+                project_params.id,
+            )
+            self.communication_channel.send((delivery_tag, True))
+            return
+
+        match workflow_engine:
+            case SupportedWorkflowEngine.NEXTFLOW:
+                NextflowCmdGenerator.cleanup(
+                    execution_dir,
+                    work_dir,
+                    workflow_process.returncode == 0,
+                    self.keep_intermediate_files,
+                )
+            case SupportedWorkflowEngine.SNAKEMAKE:
+                SnakemakeCmdGenerator.cleanup(
+                    execution_dir,
+                    work_dir,
+                    workflow_process.returncode == 0,
+                    self.keep_intermediate_files,
                 )
 
-            # Send delivery tag to thread for acknowledgement
-            self.communication_channel.send((delivery_tag, True))
+        is_lease_kept = self.report_run_finish(
+            project_params,
+            lease_renewer.lease_token,
+            workflow_process.returncode,
+            {
+                "setup": execution_started_at - setup_started_at,
+                "execution": cleanup_started_at - execution_started_at,
+                "cleanup": time.monotonic() - cleanup_started_at,
+            },
+        )
+
+        if workflow_process.returncode != 0:
+            logger.error(
+                (
+                    "[WORKER / PROJECT %i] Workflow execution failed:"
+                    "\n----stdout----\n%s"
+                    "\n----stderr----\n%s"
+                ),
+                project_params.id,
+                workflow_stdout.replace("\n", "\n\t"),
+                workflow_stderr.replace("\n", "\n\t"),
+            )
 
-            logger.debug("send delivery tag")
+        # Send delivery tag to thread for acknowledgement
+        self.communication_channel.send((delivery_tag, True))
 
-            try:
-                self.backend_web_api_client.post_finish(project_params.id)
-                logger.debug("finished")
-            except ConnectionError as e:
-                logging.error(
-                    (
-                        "[WORKER / PROJECT %i] Could not mark the project as finished. "
-                        "Please do that manually an check why the web API is not available: %s"
-                    ),
+        logger.debug("send delivery tag")
+
+        if not is_lease_kept:
+            logger.warning(
+                "[WORKER / PROJECT %i] Lease lost, the run is finished by the other worker.",
+                project_params.id,
+            )
+            return
+
+        try:
+            if project_params.sweep_id is not None:
+                self.backend_web_api_client.post_sweep_run_finish(
                     project_params.id,
-                    e,
+                    project_params.sweep_id,
+                    project_params.run_index,
+                )
+            else:
+                self.backend_web_api_client.post_finish(project_params.id)
+            logger.debug("finished")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(
+                (
+                    "[WORKER / PROJECT %i] Could not mark the project as finished. "
+                    "Please do that manually an check why the web API is not available: %s"
+                ),
+                project_params.id,
+                e,
+            )
+
+        logger.info("[WORKER / PROJECT %i] finished", project_params.id)
+
+        if self.engine_asset_cache is not None:
+            freed_size = self.engine_asset_cache.evict()
+            if freed_size > 0:
+                logger.info(
+                    "Evicted %i bytes of engine assets from the shared cache.", freed_size
                 )
 
-            logger.info("[WORKER / PROJECT %i] finished", project_params.id)
+    def report_run_finish(
+        self,
+        project_params: QueuedProject,
+        lease_token: str,
+        exit_code: Optional[int],
+        phase_durations: Dict[str, float],
+    ) -> bool:
+        """
+        Records the end of the run in the run history. Errors are only logged.
+
+        Parameters
+        ----------
+        project_params : QueuedProject
+            Queued project, skipped if it has no run ID
+        lease_token : str
+            Lease token of the claim
+        exit_code : Optional[int]
+            Exit code of the workflow engine, None if it was not executed
+        phase_durations : Dict[str, float]
+            Seconds spent in each phase
+
+        Returns
+        -------
+        bool
+            False if the lease was taken over by another worker, which then reports the run
+        """
+        if project_params.run_id is None:
+            return True
+        try:
+            return self.backend_web_api_client.post_run_finish(
+                project_params.run_id, exit_code, phase_durations, lease_token
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            logging.warning(
+                "[WORKER / PROJECT %i] Could not record end of run %i: %s",
+                project_params.id,
+                project_params.run_id,
+                e,
+            )
+            return True
 
     def sanitize_workflow_name(self, name: str) -> str:
         """
@@ -2,8 +2,11 @@
 
 # std imports
 import logging
+import os
+import random
+from threading import Lock
 from time import sleep
-from typing import ClassVar, Dict
+from typing import Any, ClassVar, Dict, Optional
 
 # 3rd party imports
 import requests
@@ -11,27 +14,65 @@ from macworp_utils.constants import (
     WEBLOG_WORKFLOW_ENGINE_HEADER,
     SupportedWorkflowEngine,
 )
+from macworp_utils.exchange.queued_project import QueuedProject
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 
+# internal imports
+from macworp_worker.web.log_proxy.async_weblog_client import AsyncWeblogClient
+from macworp_worker.web.workflow_cache import WorkflowCache
 
-class BackendWebApiClient:
+
+class LeaseHeldError(Exception):
     """
-    Client for communicating with the MAcWorP API.
+    Raised if a run can not be claimed, as another worker holds a valid lease on it.
     """
 
-    HEADERS: Dict[str, str] = {"Connection": "close"}
-    """Default header for requests
+    def __init__(self, run_id: Optional[int], retry_after: float):
+        """
+        Parameters
+        ----------
+        run_id : Optional[int]
+            Run ID
+        retry_after : float
+            Seconds until the lease expires
+        """
+        super().__init__(f"run {run_id} is claimed by another worker")
+        self.run_id = run_id
+        self.retry_after = retry_after
+
+
+class BackendWebApiClient:
     """
+    Client for communicating with the MAcWorP API.
 
-    TIMEOUT: int = 60
-    """Timeout for connections
+    Requests are sent through one `requests.Session` per process, whose connection pool keeps
+    connections to the API alive, so only the first request pays for the TCP and TLS handshake.
+    The session is shared by all threads of a process. Child processes, e.g. executors and the log proxy,
+    create their own session on first use, as sockets must not be shared across processes.
+
+    Workflows are kept in a `WorkflowCache` and only transferred again after they were changed.
     """
 
+    DEFAULT_POOL_SIZE: ClassVar[int] = 10
+    """Default maximum number of kept-alive connections per process"""
+
+    DEFAULT_TIMEOUT: ClassVar[float] = 60.0
+    """Default timeout for connecting and reading in seconds"""
+
     API_CALL_TRIES: ClassVar[int] = 3
     """Number of tries for each API calls before giving up."""
 
-    RETRY_TIMEOUT: ClassVar[int] = 3
-    """Timeout between retries in seconds"""
+    RETRY_BASE_DELAY: ClassVar[float] = 1.0
+    """Delay before the first retry in seconds, doubled on each further try"""
+
+    RETRY_MAX_DELAY: ClassVar[float] = 30.0
+    """Maximum delay between retries in seconds"""
+
+    RETRY_STATUS_CODES: ClassVar[frozenset] = frozenset({502, 503, 504})
+    """Status codes of temporary unavailability (e.g. a restarting backend behind a proxy)
+    which are retried for idempotent requests"""
 
     def __init__(
         self,
@@ -39,6 +80,8 @@ class BackendWebApiClient:
         macworp_api_user: str,
         macworp_api_password: str,
         verify_cert: bool,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
     ):
         """
         Creates a new BackendWebApiClient.
@@ -53,15 +96,81 @@ class BackendWebApiClient:
             Password for the MAcWorP API
         verify_cert : bool
             Whether to verify the certificate
+        pool_size : int, optional
+            Maximum number of kept-alive connections per process, by default `DEFAULT_POOL_SIZE`
+        timeout : float, optional
+            Timeout for connecting and reading in seconds, by default `DEFAULT_TIMEOUT`
         """
         self.__macworp_base_url = macworp_base_url
         self.__macworp_api_usr = macworp_api_user
         self.__macworp_api_pwd = macworp_api_password
         self.__verify_cert = verify_cert
+        self.__pool_size = pool_size
+        self.__timeout = timeout
+        self.__session: Optional[requests.Session] = None
+        self.__session_pid: Optional[int] = None
+        self.__session_lock = Lock()
+        self.__workflow_cache = WorkflowCache()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Excludes session and lock when the client is passed to a spawned process.
+
+        Returns
+        -------
+        Dict[str, Any]
+            State
+        """
+        state = self.__dict__.copy()
+        state["_BackendWebApiClient__session"] = None
+        state["_BackendWebApiClient__session_pid"] = None
+        del state["_BackendWebApiClient__session_lock"]
+        del state["_BackendWebApiClient__workflow_cache"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restores the state and creates a new lock and workflow cache.
+
+        Parameters
+        ----------
+        state : Dict[str, Any]
+            State
+        """
+        self.__dict__.update(state)
+        self.__session_lock = Lock()
+        self.__workflow_cache = WorkflowCache()
+
+    def create_async_weblog_client(self) -> AsyncWeblogClient:
+        """
+        Creates an asynchronous, batching weblog client with the same URL and credentials.
+
+        Returns
+        -------
+        AsyncWeblogClient
+            Client, needs to be started within the event loop
+        """
+        return AsyncWeblogClient(
+            self.__macworp_base_url,
+            self.__macworp_api_usr,
+            self.__macworp_api_pwd,
+            self.__verify_cert,
+        )
+
+    def close(self):
+        """
+        Closes the kept-alive connections of this process.
+        """
+        with self.__session_lock:
+            if self.__session is not None and self.__session_pid == os.getpid():
+                self.__session.close()
+            self.__session = None
+            self.__session_pid = None
 
     def get_workflow(self, workflow_id: int):
         """
-        Get a workflow by ID.
+        Get a workflow by ID. A cached workflow is revalidated with `If-None-Match`,
+        so it is only transferred again if it was changed.
 
         Parameters
         ----------
@@ -78,32 +187,22 @@ class BackendWebApiClient:
         ValueError
             If the request was not successful.
         """
-        url = f"{self.__macworp_base_url}/api/workflows/{workflow_id}"
-        for i in range(self.__class__.API_CALL_TRIES):
-            try:
-                with requests.get(
-                    url,
-                    headers=self.__class__.HEADERS,
-                    timeout=self.__class__.TIMEOUT,
-                    verify=self.__verify_cert,
-                ) as response:
-                    if not response.ok:
-                        raise ValueError(f"Error posting finish: {response.text}")
-
-                    workflow = response.json()
-
-                    return workflow
-            except requests.exceptions.ConnectionError as e:
-                if i < self.__class__.API_CALL_TRIES - 1:
-                    logging.error(
-                        "[WORKER / API CLIENT / ATTEMPT %i] Error while getting workflow from API: %s",
-                        i + 1,
-                        e,
-                    )
-                    sleep(self.__class__.RETRY_TIMEOUT)
-                    continue
-
-                raise e
+        cached_workflow = self.__workflow_cache.get(workflow_id)
+        headers: Dict[str, str] = {}
+        if cached_workflow is not None:
+            # The backend uses the revision as ETag
+            headers["If-None-Match"] = f'"{cached_workflow[0]}"'
+        with self.__request(
+            "GET", f"/api/workflows/{workflow_id}", "getting workflow", headers=headers
+        ) as response:
+            if response.status_code == 304 and cached_workflow is not None:
+                return cached_workflow[1]
+            if not response.ok:
+                raise ValueError(f"Error getting workflow: {response.text}")
+            workflow = response.json()
+            if isinstance(workflow.get("revision", None), int):
+                self.__workflow_cache.put(workflow_id, workflow["revision"], workflow)
+            return workflow
 
     def is_project_ignored(self, project_id: int) -> bool:
         """
@@ -124,48 +223,137 @@ class BackendWebApiClient:
         ValueError
             If the request was not successful.
         """
-        url = f"{self.__macworp_base_url}/api/projects/{project_id}/is-ignored"
-        for i in range(self.__class__.API_CALL_TRIES):
-            try:
-                with requests.get(
-                    url,
-                    auth=HTTPBasicAuth(self.__macworp_api_usr, self.__macworp_api_pwd),
-                    headers=self.__class__.HEADERS,
-                    timeout=self.__class__.TIMEOUT,
-                    verify=self.__verify_cert,
-                ) as response:
-                    print(
-                        f"Checking ignore status for project {project_id}: {response.text} - {response.status_code}"
-                    )
-                    logging.debug(
-                        f"Checking ignore status for project {project_id}: {response.text} - {response.status_code}"
+        with self.__request(
+            "GET",
+            f"/api/projects/{project_id}/is-ignored",
+            "getting ignore status",
+        ) as response:
+            logging.debug(
+                "Checking ignore status for project %i: %s - %i",
+                project_id,
+                response.text,
+                response.status_code,
+            )
+            match response.status_code:
+                case 200:
+                    return True
+                case 204:
+                    return False
+                case 404:
+                    return True
+                case _:
+                    raise ValueError(f"Error getting ignore status: {response.text}")
+
+    def claim_project(
+        self, project_params: QueuedProject, worker_host: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Claims a queued run: checks the ignore flag, records the start with a lease
+        and fetches the workflow in one request. The workflow is only transferred if
+        the cached revision is outdated.
+
+        Parameters
+        ----------
+        project_params : QueuedProject
+            Queued project
+        worker_host : str
+            Host name of this worker
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            Claim with `run_id`, `lease_token`, `lease_seconds` and `workflow` or None if the job must be dropped,
+            i.e. project ignored or deleted or run finished
+
+        Raises
+        ------
+        LeaseHeldError
+            If another worker holds the lease, the job must be requeued.
+        ValueError
+            If the request was not successful.
+        """
+        cached_workflow = self.__workflow_cache.get(project_params.workflow_id)
+        data: Dict[str, Any] = {
+            "workflow_id": project_params.workflow_id,
+            "run_id": project_params.run_id,
+            "worker_host": worker_host,
+            "workflow_revision": (
+                cached_workflow[0] if cached_workflow is not None else None
+            ),
+        }
+        if project_params.run_id is None:
+            data["workflow_arguments"] = project_params.workflow_arguments
+        with self.__request(
+            "POST",
+            f"/api/projects/{project_params.id}/claim",
+            "claiming project",
+            retry_on_connection_error=False,
+            json=data,
+        ) as response:
+            match response.status_code:
+                case 200:
+                    claim = response.json()
+                case 404 | 409:
+                    logging.info(
+                        "Project %i not claimed: %s", project_params.id, response.text
                     )
-                    match response.status_code:
-                        case 200:
-                            return True
-                        case 204:
-                            return False
-                        case 404:
-                            return True
-                        case _:
-                            raise ValueError(
-                                f"Error getting ignore status: {response.text}"
-                            )
-            except requests.exceptions.ConnectionError as e:
-                if i < self.__class__.API_CALL_TRIES - 1:
-                    logging.error(
-                        (
-                            "[WORKER / API CLIENT / ATTEMPT %i]"
-                            "Error while getting workflow from API: %s"
-                        ),
-                        i + 1,
-                        e,
+                    return None
+                case 423:
+                    raise LeaseHeldError(
+                        project_params.run_id, float(response.json()["retry_after"])
                     )
-                    sleep(self.__class__.RETRY_TIMEOUT)
-                    continue
+                case _:
+                    raise ValueError(f"Error claiming project: {response.text}")
+        if claim["workflow"] is not None:
+            self.__workflow_cache.put(
+                project_params.workflow_id, claim["workflow_revision"], claim["workflow"]
+            )
+        elif (
+            cached_workflow is not None
+            and cached_workflow[0] == claim["workflow_revision"]
+        ):
+            claim["workflow"] = cached_workflow[1]
+        else:
+            # Not expected, as the revision was sent, but keeps the claim usable
+            claim["workflow"] = self.get_workflow(project_params.workflow_id)
+        return claim
+
+    def renew_lease(self, run_id: int, lease_token: str) -> bool:
+        """
+        Renews the lease of a claimed run.
 
-                raise e
-        return False
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        lease_token : str
+            Lease token from `claim_project()`
+
+        Returns
+        -------
+        bool
+            False if the lease is lost
+
+        Raises
+        ------
+        ValueError
+            If the request was not successful.
+        """
+        with self.__request(
+            "POST",
+            f"/api/runs/{run_id}/lease",
+            "renewing lease",
+            # Only extends the lease
+            retry_on_status=True,
+            json={"lease_token": lease_token},
+        ) as response:
+            match response.status_code:
+                case 200:
+                    return True
+                case 409:
+                    return False
+                case _:
+                    raise ValueError(f"Error renewing lease: {response.text}")
 
     def post_finish(self, project_id: int):
         """
@@ -181,28 +369,87 @@ class BackendWebApiClient:
         ValueError
             If the request was not successful.
         """
-        url = f"{self.__macworp_base_url}/api/projects/{project_id}/finished"
-        for i in range(self.__class__.API_CALL_TRIES):
-            try:
-                with requests.post(
-                    url,
-                    auth=HTTPBasicAuth(self.__macworp_api_usr, self.__macworp_api_pwd),
-                    headers=self.__class__.HEADERS,
-                    timeout=self.__class__.TIMEOUT,
-                    verify=self.__verify_cert,
-                ) as response:
-                    if not response.ok:
-                        raise ValueError(f"Error posting finish: {response.text}")
-            except requests.exceptions.ConnectionError as e:
-                if i < self.__class__.API_CALL_TRIES - 1:
-                    logging.error(
-                        "[WORKER / API CLIENT / ATTEMPT %i] Error while sending sending finish to API: %s",
-                        i + 1,
-                        e,
-                    )
-                    sleep(self.__class__.RETRY_TIMEOUT)
-                    continue
-                raise e
+        with self.__request(
+            "POST", f"/api/projects/{project_id}/finished", "sending finish"
+        ) as response:
+            if not response.ok:
+                raise ValueError(f"Error posting finish: {response.text}")
+
+    def post_sweep_run_finish(self, project_id: int, sweep_id: int, run_index: int):
+        """
+        Marks a run of a parameter sweep as finished.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        sweep_id : int
+            Sweep ID
+        run_index : int
+            Index of the run within the sweep
+
+        Raises
+        ------
+        ValueError
+            If the request was not successful.
+        """
+        with self.__request(
+            "POST",
+            f"/api/projects/{project_id}/sweeps/{sweep_id}/runs/{run_index}/finished",
+            "sending sweep run finish",
+        ) as response:
+            if not response.ok:
+                raise ValueError(f"Error posting sweep run finish: {response.text}")
+
+    def post_run_finish(
+        self,
+        run_id: int,
+        exit_code: Optional[int],
+        phase_durations: Dict[str, float],
+        lease_token: Optional[str] = None,
+    ) -> bool:
+        """
+        Records the end of a run in the run history.
+
+        Parameters
+        ----------
+        run_id : int
+            Run ID
+        exit_code : Optional[int]
+            Exit code of the workflow engine, None if it was not executed
+        phase_durations : Dict[str, float]
+            Seconds spent in each phase
+        lease_token : Optional[str], optional
+            Lease token from `claim_project()`, the end is not recorded if the lease was taken over
+            by another worker, by default None
+
+        Returns
+        -------
+        bool
+            False if the lease was taken over by another worker
+
+        Raises
+        ------
+        ValueError
+            If the request was not successful.
+        """
+        with self.__request(
+            "POST",
+            f"/api/runs/{run_id}/finished",
+            "sending run finished",
+            json={
+                "exit_code": exit_code,
+                "phase_durations": phase_durations,
+                "lease_token": lease_token,
+            },
+        ) as response:
+            match response.status_code:
+                case 200:
+                    return True
+                case 409:
+                    return False
+                case _:
+                    raise ValueError(f"Error posting run finished: {response.text}")
 
     def post_weblog(
         self, project_id: int, workflow_engine: SupportedWorkflowEngine, log: bytes
@@ -224,33 +471,18 @@ class BackendWebApiClient:
         ValueError
             If the request was not successful.
         """
-        headers = self.__class__.HEADERS.copy()
-        headers["Content-Type"] = "application/json"
-        headers[WEBLOG_WORKFLOW_ENGINE_HEADER] = str(workflow_engine)
-
-        for i in range(self.__class__.API_CALL_TRIES):
-            try:
-                with requests.post(
-                    f"{self.__macworp_base_url}/api/projects/{project_id}/workflow-log",
-                    auth=HTTPBasicAuth(self.__macworp_api_usr, self.__macworp_api_pwd),
-                    headers=headers,
-                    timeout=self.__class__.TIMEOUT,
-                    verify=self.__verify_cert,
-                    data=log,
-                ) as response:
-                    if not response.ok:
-                        raise ValueError(f"Error posting weblog: {response.text}")
-            except requests.exceptions.ConnectionError as e:
-                if i < self.__class__.API_CALL_TRIES - 1:
-                    logging.error(
-                        "[WORKER / API CLIENT / ATTEMPT %i] Error while sending weblog to MAcWorP API: %s",
-                        i + 1,
-                        e,
-                    )
-                    sleep(self.__class__.RETRY_TIMEOUT)
-                    continue
-
-                raise e
+        with self.__request(
+            "POST",
+            f"/api/projects/{project_id}/workflow-log",
+            "sending weblog",
+            headers={
+                "Content-Type": "application/json",
+                WEBLOG_WORKFLOW_ENGINE_HEADER: str(workflow_engine),
+            },
+            data=log,
+        ) as response:
+            if not response.ok:
+                raise ValueError(f"Error posting weblog: {response.text}")
 
     def get_exec_uuid(self) -> str:
         """
@@ -266,27 +498,150 @@ class BackendWebApiClient:
         ValueError
             If the request was not successful.
         """
-        url = f"{self.__macworp_base_url}/api/utilities/exec-uuid"
+        with self.__request(
+            "GET", "/api/utilities/exec-uuid", "getting exec UUID"
+        ) as response:
+            if not response.ok:
+                raise ValueError(f"Error getting exec uuid: {response.text}")
+            return response.text.strip()
+
+    def __get_session(self) -> requests.Session:
+        """
+        Returns the session of the current process, creates it if necessary.
+        A session inherited from the parent process by forking is replaced, without closing its sockets,
+        as they still belong to the parent.
+
+        Returns
+        -------
+        requests.Session
+            Session with authentication and connection pool
+        """
+        with self.__session_lock:
+            if self.__session is None or self.__session_pid != os.getpid():
+                session = requests.Session()
+                session.auth = HTTPBasicAuth(
+                    self.__macworp_api_usr, self.__macworp_api_pwd
+                )
+                session.verify = self.__verify_cert
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.__pool_size,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.__session = session
+                self.__session_pid = os.getpid()
+            return self.__session
+
+    def __request(
+        self,
+        method: str,
+        path: str,
+        action: str,
+        retry_on_status: Optional[bool] = None,
+        retry_on_connection_error: bool = True,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Sends a request over the pooled session. Connection errors (including connect timeouts) are retried
+        with exponential backoff and jitter, so retries of many workers do not hit the API at the same time.
+        Temporary unavailability (`RETRY_STATUS_CODES`) is only retried for idempotent requests, as a proxy
+        might answer with 502 or 504 although the backend processed the request, e.g. claimed a run.
+        Read timeouts are never retried for the same reason.
+        For the same reason, non-idempotent requests can disable retries of connection errors, e.g. a
+        connection closed after the backend claimed the run. Errors while establishing the connection are
+        still retried, as the request was not sent yet.
+
+        Parameters
+        ----------
+        method : str
+            HTTP method
+        path : str
+            Path of the endpoint
+        action : str
+            Description for the log, e.g. `sending finish`
+        retry_on_status : Optional[bool], optional
+            Whether to retry on `RETRY_STATUS_CODES`, i.e. the request is idempotent, by default only for `GET`
+        retry_on_connection_error : bool, optional
+            Whether to retry connection errors which occurred after the request might have been sent,
+            by default True
+        kwargs :
+            Passed to `requests.Session.request()`
+
+        Returns
+        -------
+        requests.Response
+            Response, use as context manager to return the connection to the pool
+
+        Raises
+        ------
+        requests.exceptions.ConnectionError
+            If the API is not reachable after all tries
+        requests.exceptions.ReadTimeout
+            If the API did not respond in time
+        """
+        url = f"{self.__macworp_base_url}{path}"
+        if retry_on_status is None:
+            retry_on_status = method == "GET"
         for i in range(self.__class__.API_CALL_TRIES):
+            is_last_try = i == self.__class__.API_CALL_TRIES - 1
             try:
-                with requests.get(
-                    url,
-                    headers=self.__class__.HEADERS,
-                    timeout=self.__class__.TIMEOUT,
-                    verify=self.__verify_cert,
-                ) as response:
-                    if not response.ok:
-                        raise ValueError(f"Error getting exec uuid: {response.text}")
-
-                    return response.text.strip()
+                response = self.__get_session().request(
+                    method, url, timeout=self.__timeout, **kwargs
+                )
+                if (
+                    not retry_on_status
+                    or response.status_code not in self.__class__.RETRY_STATUS_CODES
+                    or is_last_try
+                ):
+                    return response
+                response.close()
+                logging.error(
+                    "[WORKER / API CLIENT / ATTEMPT %i] API unavailable while %s: %i",
+                    i + 1,
+                    action,
+                    response.status_code,
+                )
             except requests.exceptions.ConnectionError as e:
-                if i < self.__class__.API_CALL_TRIES - 1:
-                    logging.error(
-                        "[WORKER / API CLIENT / ATTEMPT %i] Error while getting exec UUID from API: %s",
-                        i + 1,
-                        e,
-                    )
-                    sleep(self.__class__.RETRY_TIMEOUT)
-                    continue
+                if is_last_try or (
+                    not retry_on_connection_error
+                    and not self.__class__.__is_connection_not_established(e)
+                ):
+                    raise e
+                logging.error(
+                    "[WORKER / API CLIENT / ATTEMPT %i] Error while %s: %s",
+                    i + 1,
+                    action,
+                    e,
+                )
+            delay = min(
+                self.__class__.RETRY_BASE_DELAY * 2**i, self.__class__.RETRY_MAX_DELAY
+            )
+            sleep(random.uniform(delay / 2, delay))
+        # Not reachable, the last try either returns or raises
+        raise requests.exceptions.ConnectionError(f"Error while {action}")
+
+    @staticmethod
+    def __is_connection_not_established(
+        error: requests.exceptions.ConnectionError,
+    ) -> bool:
+        """
+        Checks if the connection failed before the request was sent,
+        e.g. connect timeout or connection refused.
+
+        Parameters
+        ----------
+        error : requests.exceptions.ConnectionError
+            Error raised by `requests`
 
-                raise e
+        Returns
+        -------
+        bool
+            True if the request was not sent
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, NewConnectionError)
@@ -0,0 +1,259 @@
+"""Asynchronous, batching client for sending workflow logs to the MAcWorP API."""
+
+# std imports
+import asyncio
+from collections import defaultdict
+import json
+import logging
+import random
+from typing import Any, ClassVar, DefaultDict, Dict, List, Optional, Tuple
+
+# 3rd party imports
+import httpx
+from macworp_utils.constants import (  # type: ignore[import]
+    WEBLOG_WORKFLOW_ENGINE_HEADER,
+    SupportedWorkflowEngine,
+)
+
+
+class AsyncWeblogClient:
+    """
+    Collects workflow logs in a bounded in-memory queue and sends them in batches per project
+    to the MAcWorP API. A background task flushes the queue over a pooled keep-alive connection,
+    so request handlers return immediately and the workflow engine is never stalled by the API.
+    If the queue is full, e.g. while the API is unreachable, new logs are dropped.
+    """
+
+    MAX_QUEUED_LOGS: ClassVar[int] = 100_000
+    """Maximum number of logs waiting to be sent"""
+
+    MAX_BATCH_SIZE: ClassVar[int] = 500
+    """Maximum number of logs sent in one request"""
+
+    FLUSH_INTERVAL: ClassVar[float] = 0.25
+    """Seconds to wait for more logs before a batch is sent"""
+
+    SEND_ATTEMPTS: ClassVar[int] = 5
+    """Number of attempts to send a batch before it is dropped"""
+
+    RETRY_BASE_DELAY: ClassVar[float] = 0.5
+    """Delay before the first retry in seconds, doubled on each further attempt"""
+
+    TIMEOUT: ClassVar[float] = 30.0
+    """Timeout for requests in seconds"""
+
+    def __init__(
+        self,
+        macworp_base_url: str,
+        macworp_api_user: str,
+        macworp_api_password: str,
+        verify_cert: bool,
+    ):
+        """
+        Parameters
+        ----------
+        macworp_base_url : str
+            Base URL of the MAcWorP API
+        macworp_api_user : str
+            Username for the MAcWorP API
+        macworp_api_password : str
+            Password for the MAcWorP API
+        verify_cert : bool
+            Whether to verify the certificate
+        """
+        self.__macworp_base_url = macworp_base_url
+        self.__auth = httpx.BasicAuth(macworp_api_user, macworp_api_password)
+        self.__verify_cert = verify_cert
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__http_client: Optional[httpx.AsyncClient] = None
+        self.__flusher: Optional[asyncio.Task] = None
+        self.__dropped_logs = 0
+
+    async def start(self):
+        """
+        Opens the HTTP client and starts the background flusher. Must be called within the event loop.
+        """
+        self.__queue = asyncio.Queue(maxsize=self.__class__.MAX_QUEUED_LOGS)
+        self.__http_client = httpx.AsyncClient(
+            base_url=self.__macworp_base_url,
+            auth=self.__auth,
+            verify=self.__verify_cert,
+            timeout=self.__class__.TIMEOUT,
+        )
+        self.__flusher = asyncio.create_task(self.__flush_continuously())
+
+    async def close(self):
+        """
+        Sends the remaining logs, stops the background flusher and closes the HTTP client.
+        """
+        if self.__flusher is not None:
+            self.__flusher.cancel()
+            try:
+                await self.__flusher
+            except asyncio.CancelledError:
+                pass
+            self.__flusher = None
+        while self.__queue is not None and not self.__queue.empty():
+            await self.__send_batch(self.__drain(self.__class__.MAX_BATCH_SIZE))
+        if self.__http_client is not None:
+            await self.__http_client.aclose()
+            self.__http_client = None
+
+    def enqueue(
+        self, project_id: int, workflow_engine: SupportedWorkflowEngine, log: bytes
+    ):
+        """
+        Adds a log to the queue without blocking.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine type
+        log : bytes
+            Log entry as JSON
+
+        Raises
+        ------
+        RuntimeError
+            If the client was not started
+        ValueError
+            If the log is not a JSON object
+        """
+        if self.__queue is None:
+            raise RuntimeError("AsyncWeblogClient was not started")
+        parsed_log = json.loads(log)
+        if not isinstance(parsed_log, dict):
+            raise ValueError("log is not a JSON object")
+        try:
+            self.__queue.put_nowait((project_id, workflow_engine, parsed_log))
+        except asyncio.QueueFull:
+            self.__dropped_logs += 1
+            # Log only every thousandth drop, to not flood the log while the API is down
+            if self.__dropped_logs % 1000 == 1:
+                logging.error(
+                    "[WORKER / LOG PROXY] Weblog queue is full, %i logs dropped so far",
+                    self.__dropped_logs,
+                )
+
+    async def __flush_continuously(self):
+        """
+        Waits for the first log, collects more logs for `FLUSH_INTERVAL` seconds
+        or until the batch is full and sends them.
+        """
+        while True:
+            first_log = await self.__queue.get()  # type: ignore[union-attr]
+            batch = [first_log]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.__class__.FLUSH_INTERVAL
+            while len(batch) < self.__class__.MAX_BATCH_SIZE:
+                batch += self.__drain(self.__class__.MAX_BATCH_SIZE - len(batch))
+                remaining = deadline - loop.time()
+                if len(batch) >= self.__class__.MAX_BATCH_SIZE or remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.__queue.get(), remaining)  # type: ignore[union-attr]
+                    )
+                except asyncio.TimeoutError:
+                    break
+            await self.__send_batch(batch)
+
+    def __drain(self, limit: int) -> List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]]:
+        """
+        Takes up to `limit` logs from the queue without waiting.
+
+        Parameters
+        ----------
+        limit : int
+            Maximum number of logs
+
+        Returns
+        -------
+        List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]]
+            Project ID, workflow engine and log
+        """
+        logs = []
+        while len(logs) < limit and not self.__queue.empty():  # type: ignore[union-attr]
+            logs.append(self.__queue.get_nowait())  # type: ignore[union-attr]
+        return logs
+
+    async def __send_batch(
+        self, batch: List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]]
+    ):
+        """
+        Sends the logs grouped by project and workflow engine, keeping their order.
+        Unexpected errors are logged and drop only the logs of the affected project,
+        so they do not stop the background flusher.
+
+        Parameters
+        ----------
+        batch : List[Tuple[int, SupportedWorkflowEngine, Dict[str, Any]]]
+            Project ID, workflow engine and log
+        """
+        grouped_logs: DefaultDict[
+            Tuple[int, SupportedWorkflowEngine], List[Dict[str, Any]]
+        ] = defaultdict(list)
+        for project_id, workflow_engine, log in batch:
+            grouped_logs[(project_id, workflow_engine)].append(log)
+        for (project_id, workflow_engine), logs in grouped_logs.items():
+            try:
+                await self.__post_logs(project_id, workflow_engine, logs)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(
+                    "[WORKER / LOG PROXY] Dropping %i weblogs for project %i after unexpected error",
+                    len(logs),
+                    project_id,
+                )
+
+    async def __post_logs(
+        self,
+        project_id: int,
+        workflow_engine: SupportedWorkflowEngine,
+        logs: List[Dict[str, Any]],
+    ):
+        """
+        Posts the logs of one project to the batch endpoint.
+        Retries with exponential backoff and jitter, without blocking the event loop.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine type
+        logs : List[Dict[str, Any]]
+            Logs
+        """
+        for attempt in range(1, self.__class__.SEND_ATTEMPTS + 1):
+            try:
+                response = await self.__http_client.post(  # type: ignore[union-attr]
+                    f"/api/projects/{project_id}/workflow-logs",
+                    json={"logs": logs},
+                    headers={WEBLOG_WORKFLOW_ENGINE_HEADER: str(workflow_engine)},
+                )
+                if response.status_code < 500:
+                    if not response.is_success:
+                        # Client errors, e.g. deleted project, will not change on retry
+                        logging.error(
+                            "[WORKER / LOG PROXY] Weblogs for project %i rejected: %s",
+                            project_id,
+                            response.text,
+                        )
+                    return
+            except httpx.TransportError as error:
+                logging.warning(
+                    "[WORKER / LOG PROXY / ATTEMPT %i] Error while sending weblogs to MAcWorP API: %s",
+                    attempt,
+                    error,
+                )
+            if attempt < self.__class__.SEND_ATTEMPTS:
+                delay = self.__class__.RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+        logging.error(
+            "[WORKER / LOG PROXY] Dropping %i weblogs for project %i after %i attempts",
+            len(logs),
+            project_id,
+            self.__class__.SEND_ATTEMPTS,
+        )
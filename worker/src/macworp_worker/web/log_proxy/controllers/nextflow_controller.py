@@ -16,7 +16,7 @@ class NextflowController:
         settings: Settings = Depends(get_dummy_settings),
     ):
         """
-        Receives the weblogs from Nextflow and forwards them to the MAcWorP API.
+        Receives the weblogs from Nextflow and forwards them to the MAcWorP API or workflow log queue.
 
         Parameters
         ----------
@@ -25,10 +25,10 @@ class NextflowController:
         """
         log = await request.body()
         try:
-            settings.client.post_weblog(
+            settings.forward_log(
                 project_id, SupportedWorkflowEngine.NEXTFLOW, log
             )
         # pylint: disable=broad-except
         except Exception as e:
             # Catch everything to prevent the FastAPI server from crashing
-            logging.error("Error while sending weblog to MAcWorP API: %s", e)
+            logging.error("Error while forwarding weblog: %s", e)
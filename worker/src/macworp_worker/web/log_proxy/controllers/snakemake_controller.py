@@ -40,7 +40,7 @@ class SnakemakeController:
         request: Request, settings: Settings = Depends(get_dummy_settings)
     ):
         """
-        Converts log from form data to JSON and forwards it to the MAcWorP API.
+        Converts log from form data to JSON and forwards it to the MAcWorP API or workflow log queue.
         """
         form = await request.form()
         if "id" not in form or "msg" not in form:
@@ -52,13 +52,13 @@ class SnakemakeController:
                 raise ValueError("Project ID is not a string")
             if not isinstance(log, str):
                 raise ValueError("Log is not a string")
-            settings.client.post_weblog(
+            settings.forward_log(
                 int(project_id), SupportedWorkflowEngine.SNAKEMAKE, log.encode("utf-8")
             )
         # pylint: disable=broad-except
         except Exception as e:
             # Catch everything to prevent the FastAPI server from crashing
-            logging.error("Error while sending weblog to MAcWorP API: %s", e)
+            logging.error("Error while forwarding weblog: %s", e)
 
     @staticmethod
     async def workflow(project_id: int):
@@ -1,8 +1,11 @@
 """FastAPI server for proxying weblog requests to the MAcWorP API."""
 
+import asyncio
+from contextlib import asynccontextmanager
 import logging
 from multiprocessing import Process
 import socket
+from typing import Optional
 
 from fastapi import APIRouter, FastAPI
 from macworp_worker.web.log_proxy.controllers.snakemake_controller import (
@@ -15,6 +18,7 @@ from macworp_worker.web.log_proxy.settings import Settings, get_dummy_settings
 from macworp_worker.web.log_proxy.controllers.nextflow_controller import (
     NextflowController,
 )
+from macworp_worker.web.log_proxy.workflow_log_publisher import WorkflowLogPublisher
 
 
 class Server:
@@ -22,8 +26,13 @@ class Server:
     Proxy for sending weblog requests to the MAcWorP API using credentials.
     """
 
-    def __init__(self, client: BackendWebApiClient, log_level: int):
-        settings = Settings(client=client)
+    def __init__(
+        self,
+        client: BackendWebApiClient,
+        log_level: int,
+        publisher: Optional[WorkflowLogPublisher] = None,
+    ):
+        settings = Settings(client=client, publisher=publisher)
         # Get a free port
         self.__port = 0
         with socket.socket() as sock:
@@ -110,7 +119,25 @@ class Server:
         async def get_settings():
             return settings
 
-        app = FastAPI()
+        # Only needed without publisher. Created within the server process,
+        # as it is bound to uvicorn's event loop
+        if settings.publisher is None:
+            settings.weblog_client = settings.client.create_async_weblog_client()
+
+        @asynccontextmanager
+        async def lifespan(_app: FastAPI):
+            if settings.weblog_client is not None:
+                await settings.weblog_client.start()
+            if settings.publisher is not None:
+                settings.publisher.start()
+            yield
+            if settings.publisher is not None:
+                # Joins the publisher thread, so do not block the event loop
+                await asyncio.to_thread(settings.publisher.stop)
+            if settings.weblog_client is not None:
+                await settings.weblog_client.close()
+
+        app = FastAPI(lifespan=lifespan)
         app.include_router(cls.get_router())
 
         # Because the settings coming via CLI and getting passed through the executor etc.
@@ -1,8 +1,13 @@
 """Settings for the log proxy"""
 
+from typing import Optional
+
+from macworp_utils.constants import SupportedWorkflowEngine  # type: ignore[import]
 from pydantic_settings import BaseSettings
 
 from macworp_worker.web.backend_web_api_client import BackendWebApiClient
+from macworp_worker.web.log_proxy.async_weblog_client import AsyncWeblogClient
+from macworp_worker.web.log_proxy.workflow_log_publisher import WorkflowLogPublisher
 
 
 class Settings(BaseSettings):
@@ -13,6 +18,36 @@ class Settings(BaseSettings):
     client: BackendWebApiClient
     """Client for communicating with the MAcWorP API"""
 
+    publisher: Optional[WorkflowLogPublisher] = None
+    """Publisher for sending workflow logs via RabbitMQ, if None logs are posted to the MAcWorP API"""
+
+    weblog_client: Optional[AsyncWeblogClient] = None
+    """Batching client for sending workflow logs to the MAcWorP API, started by the log proxy process"""
+
+    def forward_log(
+        self, project_id: int, workflow_engine: SupportedWorkflowEngine, log: bytes
+    ):
+        """
+        Forwards a workflow log to the publisher if configured, otherwise to the MAcWorP API.
+        Logs are only enqueued and published by a background thread or sent in batches
+        if the publisher or weblog client is running.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine type
+        log : bytes
+            Log entry as JSON
+        """
+        if self.publisher is not None:
+            self.publisher.enqueue(project_id, workflow_engine, log)
+        elif self.weblog_client is not None:
+            self.weblog_client.enqueue(project_id, workflow_engine, log)
+        else:
+            self.client.post_weblog(project_id, workflow_engine, log)
+
 
 async def get_dummy_settings() -> Settings:
     """Returns settings with a dummy settings as default dependency for paths.
@@ -0,0 +1,224 @@
+"""Publishes workflow logs to the message broker."""
+
+# std imports
+import logging
+from queue import Full, Queue
+from threading import Thread
+from typing import ClassVar, Optional
+
+# 3rd party imports
+import pika
+from pika.adapters.blocking_connection import BlockingChannel
+from macworp_utils.constants import SupportedWorkflowEngine  # type: ignore[import]
+from macworp_utils.exchange.workflow_log import WorkflowLog  # type: ignore[import]
+
+
+class WorkflowLogPublisher:
+    """
+    Publishes workflow logs to a RabbitMQ queue, which is drained in batches by the backend,
+    instead of sending one HTTP request per log. The connection is opened lazily,
+    so the publisher can be passed to the log proxy process before it is used.
+
+    As pika's `BlockingConnection` must not be used within the event loop of the log proxy,
+    logs are only enqueued into a bounded in-memory queue by the request handlers
+    and published by a background thread, which owns the connection.
+    If the queue is full, e.g. while the broker is unreachable, new logs are dropped.
+    """
+
+    PUBLISH_ATTEMPTS: ClassVar[int] = 2
+    """Number of attempts to publish a log, reconnecting in between"""
+
+    MAX_QUEUED_LOGS: ClassVar[int] = 100_000
+    """Maximum number of logs waiting to be published"""
+
+    CLOSE_TIMEOUT: ClassVar[float] = 10.0
+    """Seconds to wait for the remaining logs to be published when stopping"""
+
+    def __init__(self, rabbit_mq_url: str, queue_name: str):
+        """
+        Parameters
+        ----------
+        rabbit_mq_url : str
+            Message broker URL (amqp://...)
+        queue_name : str
+            Workflow log queue
+        """
+        self.__rabbit_mq_url = rabbit_mq_url
+        self.__queue_name = queue_name
+        self.__connection: Optional[pika.BlockingConnection] = None
+        self.__channel: Optional[BlockingChannel] = None
+        self.__queue: Optional[Queue] = None
+        self.__publisher_thread: Optional[Thread] = None
+        self.__dropped_logs = 0
+
+    def __getstate__(self):
+        # Connections, queues and threads can not be transferred to other processes
+        state = self.__dict__.copy()
+        state["_WorkflowLogPublisher__connection"] = None
+        state["_WorkflowLogPublisher__channel"] = None
+        state["_WorkflowLogPublisher__queue"] = None
+        state["_WorkflowLogPublisher__publisher_thread"] = None
+        return state
+
+    def start(self):
+        """
+        Starts the background thread publishing the enqueued logs.
+        """
+        self.__queue = Queue(maxsize=self.__class__.MAX_QUEUED_LOGS)
+        self.__publisher_thread = Thread(
+            target=self.__publish_continuously, args=(self.__queue,), daemon=True
+        )
+        self.__publisher_thread.start()
+
+    def stop(self):
+        """
+        Publishes the remaining logs (waiting at most `CLOSE_TIMEOUT` seconds),
+        stops the background thread and closes the connection.
+        """
+        if self.__queue is not None and self.__publisher_thread is not None:
+            # Sentinel, so the thread finishes after the remaining logs
+            try:
+                self.__queue.put(None, timeout=self.__class__.CLOSE_TIMEOUT)
+            except Full:
+                pass
+            self.__publisher_thread.join(self.__class__.CLOSE_TIMEOUT)
+        self.__queue = None
+        self.__publisher_thread = None
+
+    def enqueue(
+        self, project_id: int, workflow_engine: SupportedWorkflowEngine, log: bytes
+    ):
+        """
+        Adds a log to the queue of the background thread without blocking.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine type
+        log : bytes
+            Log entry as JSON
+
+        Raises
+        ------
+        RuntimeError
+            If the publisher was not started
+        """
+        if self.__queue is None:
+            raise RuntimeError("WorkflowLogPublisher was not started")
+        try:
+            self.__queue.put_nowait((project_id, workflow_engine, log))
+        except Full:
+            self.__dropped_logs += 1
+            # Log only every thousandth drop, to not flood the log while the broker is down
+            if self.__dropped_logs % 1000 == 1:
+                logging.error(
+                    "[WORKER / LOG PROXY] Workflow log queue is full, %i logs dropped so far",
+                    self.__dropped_logs,
+                )
+
+    def __publish_continuously(self, log_queue: Queue):
+        """
+        Publishes the enqueued logs until the sentinel `None` is received.
+
+        Parameters
+        ----------
+        log_queue : Queue
+            Queue of project ID, workflow engine and log
+        """
+        try:
+            while True:
+                item = log_queue.get()
+                if item is None:
+                    return
+                try:
+                    self.publish(*item)
+                except pika.exceptions.AMQPError as error:
+                    logging.error(
+                        "[WORKER / LOG PROXY] Dropping workflow log for project %i: %s",
+                        item[0],
+                        error,
+                    )
+                # pylint: disable=broad-except
+                except Exception as error:
+                    # Catch everything to keep the thread alive
+                    logging.error(
+                        "[WORKER / LOG PROXY] Error while publishing workflow log: %s",
+                        error,
+                    )
+        finally:
+            self.close()
+
+    def publish(
+        self, project_id: int, workflow_engine: SupportedWorkflowEngine, log: bytes
+    ):
+        """
+        Publishes a workflow log as persistent message. Blocks until the broker confirms the connection,
+        so use `enqueue()` within the event loop.
+
+        Parameters
+        ----------
+        project_id : int
+            Project ID
+        workflow_engine : SupportedWorkflowEngine
+            Workflow engine type
+        log : bytes
+            Log entry as JSON
+
+        Raises
+        ------
+        pika.exceptions.AMQPError
+            If the log could not be published after `PUBLISH_ATTEMPTS` attempts
+        """
+        body = (
+            WorkflowLog(
+                project_id=project_id,
+                workflow_engine=str(workflow_engine),
+                log=log.decode("utf-8"),
+            )
+            .model_dump_json()
+            .encode()
+        )
+        for attempt in range(1, self.__class__.PUBLISH_ATTEMPTS + 1):
+            try:
+                if self.__channel is None or not self.__channel.is_open:
+                    self.__connect()
+                self.__channel.basic_publish(  # type: ignore[union-attr]
+                    exchange="",
+                    routing_key=self.__queue_name,
+                    body=body,
+                    properties=pika.BasicProperties(delivery_mode=2),
+                )
+                return
+            except pika.exceptions.AMQPError as error:
+                self.close()
+                if attempt == self.__class__.PUBLISH_ATTEMPTS:
+                    raise error
+                logging.warning(
+                    "[WORKER / LOG PROXY] Publishing workflow log failed, reconnecting: %s",
+                    error,
+                )
+
+    def close(self):
+        """
+        Closes the connection, ignoring errors of already broken connections.
+        """
+        try:
+            if self.__connection is not None and self.__connection.is_open:
+                self.__connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+        self.__connection = None
+        self.__channel = None
+
+    def __connect(self):
+        """
+        Opens the connection and declares the queue.
+        """
+        self.close()
+        self.__connection = pika.BlockingConnection(
+            pika.URLParameters(self.__rabbit_mq_url)
+        )
+        self.__channel = self.__connection.channel()
+        self.__channel.queue_declare(queue=self.__queue_name, durable=True)
@@ -0,0 +1,65 @@
+"""Least recently used cache for workflows."""
+
+# std imports
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, ClassVar, Dict, Optional, Tuple
+
+
+class WorkflowCache:
+    """
+    Keeps the most recently used workflows with their revision, so a workflow is only transferred
+    again after it was changed. Freshness is checked by the backend, see `BackendWebApiClient.claim_project()`
+    and `BackendWebApiClient.get_workflow()`. Thread-safe.
+    """
+
+    DEFAULT_MAX_ENTRIES: ClassVar[int] = 64
+    """Default maximum number of cached workflows"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Parameters
+        ----------
+        max_entries : int, optional
+            Maximum number of cached workflows, by default `DEFAULT_MAX_ENTRIES`
+        """
+        self.__max_entries = max_entries
+        self.__entries: OrderedDict[int, Tuple[int, Dict[str, Any]]] = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, workflow_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Parameters
+        ----------
+        workflow_id : int
+            Workflow ID
+
+        Returns
+        -------
+        Optional[Tuple[int, Dict[str, Any]]]
+            Revision and workflow or None if not cached
+        """
+        with self.__lock:
+            entry = self.__entries.get(workflow_id, None)
+            if entry is not None:
+                self.__entries.move_to_end(workflow_id)
+            return entry
+
+    def put(self, workflow_id: int, revision: int, workflow: Dict[str, Any]):
+        """
+        Adds or replaces a workflow, removes the least recently used workflow if the cache is full.
+
+        Parameters
+        ----------
+        workflow_id : int
+            Workflow ID
+        revision : int
+            Revision of the workflow
+        workflow : Dict[str, Any]
+            Workflow
+        """
+        with self.__lock:
+            self.__entries[workflow_id] = (revision, workflow)
+            self.__entries.move_to_end(workflow_id)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
@@ -23,13 +23,21 @@ from macworp_worker.executor import Executor
 from macworp_worker.logging import get_logger
 from macworp_worker.web.backend_web_api_client import BackendWebApiClient
 from macworp_worker.web.log_proxy.server import Server as LogProxy
+from macworp_worker.web.log_proxy.workflow_log_publisher import WorkflowLogPublisher
+from macworp_worker.workflow_engine_cmd_generators.engine_asset_cache import (
+    EngineAssetCache,
+)
+from macworp_worker.workflow_engine_cmd_generators.git_mirror_cache import (
+    GitMirrorCache,
+)
 
 
 class AckHandler(Thread):
     """
     A separate thread for handling message acknowledgement.
     The communication channel receives tuples with the delivery tag and
-    True (for ACK) or False (for NACK).
+    True (for ACK) or False (for NACK). NACKs may have a third element, the delay in seconds
+    before the message is requeued, e.g. while another worker holds the lease of the run.
 
     Attributes
     ----------
@@ -85,7 +93,7 @@ class AckHandler(Thread):
         while len(self.__comm_channels) > 0:
             for comm_channel in wait(self.__comm_channels):
                 try:
-                    (delivery_tag, is_ack) = comm_channel.recv()
+                    (delivery_tag, is_ack, *nack_delay) = comm_channel.recv()
 
                     # Send the ack threadsafe!
                     callback = (
@@ -93,6 +101,14 @@ class AckHandler(Thread):
                         if is_ack
                         else functools.partial(self.send_nack, delivery_tag)
                     )
+                    if not is_ack and len(nack_delay) > 0 and nack_delay[0] > 0:
+                        # Timers must be added within the connection's thread as well,
+                        # the message stays unacknowledged until then
+                        callback = functools.partial(
+                            self.__broker_connection.call_later,
+                            nack_delay[0],
+                            callback,
+                        )
                     self.__broker_connection.add_callback_threadsafe(callback)
 
                 except EOFError:
@@ -134,7 +150,13 @@ class Worker:
     __stop_event: Event
         Event for stopping worker processes and threads reliable.
     __log_proxy: LogProxy
-        Proxy for sending weblog requests to the NFCloud API using credentials.
+        Proxy for sending weblog requests to the NFCloud API using credentials
+        or to the workflow log queue, if a queue name is given.
+    __git_mirror_cache: Optional[GitMirrorCache]
+        Shared cache for remote workflow repositories, if None they are cloned for every run.
+    __engine_asset_cache: Optional[EngineAssetCache]
+        Shared caches for Conda environments, container images, etc.,
+        if None the engines use their defaults.
     """
 
     def __init__(
@@ -149,6 +171,9 @@ class Worker:
         keep_intermediate_files: bool,
         stop_event: EventClass,
         log_level: int,
+        workflow_log_queue_name: Optional[str] = None,
+        git_mirror_cache: Optional[GitMirrorCache] = None,
+        engine_asset_cache: Optional[EngineAssetCache] = None,
     ):
         # nextflow binary
         self.__nf_bin: Path = nf_bin
@@ -165,10 +190,20 @@ class Worker:
         self.__number_of_workers: int = number_of_workers
         # additional worker behavior
         self.__keep_intermediate_files: bool = keep_intermediate_files
+        self.__git_mirror_cache: Optional[GitMirrorCache] = git_mirror_cache
+        self.__engine_asset_cache: Optional[EngineAssetCache] = engine_asset_cache
         # control
         self.__stop_event: EventClass = stop_event
         self.__log_level: int = log_level
-        self.__log_proxy = LogProxy(backend_api_client, log_level)
+        self.__log_proxy = LogProxy(
+            backend_api_client,
+            log_level,
+            (
+                WorkflowLogPublisher(rabbit_mq_url, workflow_log_queue_name)
+                if workflow_log_queue_name is not None
+                else None
+            ),
+        )
 
     def preflight_exec_uuid(self, logger: logging.Logger):
         """
@@ -253,6 +288,8 @@ class Worker:
                         self.__stop_event,
                         self.__log_level,
                         self.__log_proxy.port,
+                        self.__git_mirror_cache,
+                        self.__engine_asset_cache,
                     )
                     executor.start()
                     comm_channels.append(ro_comm)
@@ -3,7 +3,7 @@
 import logging
 from pathlib import Path
 from time import sleep
-from typing import Any, ClassVar, Dict, List
+from typing import Any, ClassVar, Dict, List, Optional
 
 from git import Repo as GitRepo
 from git.exc import GitCommandError
@@ -11,6 +11,12 @@ from macworp_utils.exchange.queued_project import QueuedProject
 from macworp_utils.path import make_relative_to, secure_joinpath
 
 from macworp_worker.web.backend_web_api_client import BackendWebApiClient
+from macworp_worker.workflow_engine_cmd_generators.engine_asset_cache import (
+    EngineAssetCache,
+)
+from macworp_worker.workflow_engine_cmd_generators.git_mirror_cache import (
+    GitMirrorCache,
+)
 
 
 class CmdGenerator:
@@ -31,11 +37,15 @@ class CmdGenerator:
         backend_web_api_client: BackendWebApiClient,
         logger: logging.Logger,
         weblog_proxy_port: int,
+        git_mirror_cache: Optional[GitMirrorCache] = None,
+        engine_asset_cache: Optional[EngineAssetCache] = None,
     ):
         self.workflow_engine_executable = workflow_engine_executable
         self.backend_web_api_client = backend_web_api_client
         self.logger = logger
         self.weblog_proxy_port = weblog_proxy_port
+        self.git_mirror_cache = git_mirror_cache
+        self.engine_asset_cache = engine_asset_cache
 
     def generate_command(
         self,
@@ -59,6 +69,10 @@ class CmdGenerator:
             Workflow definition
         kwargs :
             Additional parameters for the command generation, e.g. workflow engine specific parameters
+                * `execution_dir`: Directory the workflow is executed in and writes its outputs to,
+                  e.g. the run folder of a parameter sweep. Defaults to the project directory.
+                  Paths of static parameters are resolved against it, paths of dynamic parameters
+                  (selected by the user from the project's files) against the project directory.
 
         Returns
         -------
@@ -174,6 +188,46 @@ class CmdGenerator:
         """
         raise NotImplementedError("Need to implement this method in a subclass.")
 
+    def checkout_workflow_repository(
+        self, workflow_source: Dict[str, Any], work_dir: Path
+    ) -> Path:
+        """
+        Checks out a remote workflow source into the work directory,
+        from the shared mirror cache if configured, otherwise by cloning it.
+
+        Parameters
+        ----------
+        workflow_source : Dict[str, Any]
+            Remote workflow source with `url` and `version`
+        work_dir : Path
+            Path to the work directory
+
+        Returns
+        -------
+        Path
+            Path of the local repository
+
+        Raises
+        ------
+        GitCommandError
+        """
+        local_repo_path = work_dir.joinpath("workflow_repo")
+        if self.git_mirror_cache is not None:
+            return self.git_mirror_cache.checkout(
+                workflow_source["url"], workflow_source["version"], local_repo_path
+            )
+        if not local_repo_path.exists():
+            self.__class__.clone_git_repository(
+                local_repo_path,
+                workflow_source["url"],
+                workflow_source["version"],
+            )
+        else:
+            self.__class__.update_git_repository(
+                local_repo_path, workflow_source["version"]
+            )
+        return local_repo_path
+
     @classmethod
     def clone_git_repository(
         cls,
@@ -0,0 +1,284 @@
+"""Shared caches of workflow engine assets, e.g. Conda environments and container images."""
+
+# std imports
+from contextlib import contextmanager
+import fcntl
+import os
+from pathlib import Path
+import shutil
+from stat import S_ISDIR
+import time
+from typing import ClassVar, Dict, Iterator, List, Optional, Tuple
+import uuid
+
+
+class EngineAssetCache:
+    """
+    Folders for assets the workflow engines download or build, shared by all runs of the worker,
+    instead of rebuilding them in every project:
+
+    * `nextflow/home`: `NXF_HOME` (plugins, pipelines, framework versions)
+    * `nextflow/conda`: `NXF_CONDA_CACHEDIR`
+    * `nextflow/containers`: `NXF_SINGULARITY_CACHEDIR` & `NXF_APPTAINER_CACHEDIR`
+    * `snakemake/conda`: `--conda-prefix`
+    * `snakemake/containers`: `--apptainer-prefix`
+
+    The Conda and container folders are limited in size. The entries in them (environments, images) are evicted
+    least recently used first, using the newest access or modification time of their files
+    (with `relatime` mounts access times are updated at most once a day, so the cache must not be mounted
+    with `noatime`).
+
+    As the engines do not tell which entries a run uses, each running workflow registers a marker file
+    in `.runs`, which it keeps locked (`flock`) until it is finished, so markers of crashed workers are detected.
+    Entries used since `ATIME_GRANULARITY` before the start of the oldest running workflow are kept,
+    older entries are evicted while other workflows are running. Registration and eviction are serialized
+    by a short `flock` on `.lock`, so a workflow does not start while entries are removed.
+    """
+
+    NEXTFLOW_HOME_DIR: ClassVar[Path] = Path("nextflow", "home")
+    """Nextflow home within the cache folder"""
+
+    NEXTFLOW_CONDA_DIR: ClassVar[Path] = Path("nextflow", "conda")
+    """Nextflow Conda environments within the cache folder"""
+
+    NEXTFLOW_CONTAINER_DIR: ClassVar[Path] = Path("nextflow", "containers")
+    """Nextflow Singularity/Apptainer images within the cache folder"""
+
+    SNAKEMAKE_CONDA_DIR: ClassVar[Path] = Path("snakemake", "conda")
+    """Snakemake Conda environments within the cache folder"""
+
+    SNAKEMAKE_CONTAINER_DIR: ClassVar[Path] = Path("snakemake", "containers")
+    """Snakemake Apptainer images within the cache folder"""
+
+    EVICTABLE_DIRS: ClassVar[List[Path]] = [
+        NEXTFLOW_CONDA_DIR,
+        NEXTFLOW_CONTAINER_DIR,
+        SNAKEMAKE_CONDA_DIR,
+        SNAKEMAKE_CONTAINER_DIR,
+    ]
+    """Folders whose entries are evicted when the cache exceeds its maximum size"""
+
+    RUNS_DIR: ClassVar[Path] = Path(".runs")
+    """Markers of the running workflows within the cache folder"""
+
+    EVICTION_INTERVAL: ClassVar[int] = 600
+    """Minimum seconds between two evictions, as summing up the size of environments is expensive"""
+
+    ATIME_GRANULARITY: ClassVar[int] = 86400
+    """Seconds the access time of a file may lag behind its last access (`relatime` mounts)"""
+
+    def __init__(self, cache_dir: Path, max_size: int):
+        """
+        Parameters
+        ----------
+        cache_dir : Path
+            Folder containing the caches, created if missing
+        max_size : int
+            Maximum size of the evictable entries in bytes
+        """
+        self.__cache_dir = cache_dir
+        self.__max_size = max_size
+        self.__lock_path = cache_dir.joinpath(".lock")
+        self.__eviction_stamp_path = cache_dir.joinpath(".last_eviction")
+        self.__runs_dir = cache_dir.joinpath(self.__class__.RUNS_DIR)
+        for directory in [
+            self.__class__.NEXTFLOW_HOME_DIR,
+            *self.__class__.EVICTABLE_DIRS,
+            self.__class__.RUNS_DIR,
+        ]:
+            cache_dir.joinpath(directory).mkdir(parents=True, exist_ok=True)
+
+    def get_nextflow_environment(self) -> Dict[str, str]:
+        """
+        Returns
+        -------
+        Dict[str, str]
+            Environment variables pointing Nextflow to the caches
+        """
+        container_dir = str(
+            self.__cache_dir.joinpath(self.__class__.NEXTFLOW_CONTAINER_DIR)
+        )
+        return {
+            "NXF_HOME": str(
+                self.__cache_dir.joinpath(self.__class__.NEXTFLOW_HOME_DIR)
+            ),
+            "NXF_CONDA_CACHEDIR": str(
+                self.__cache_dir.joinpath(self.__class__.NEXTFLOW_CONDA_DIR)
+            ),
+            "NXF_SINGULARITY_CACHEDIR": container_dir,
+            "NXF_APPTAINER_CACHEDIR": container_dir,
+        }
+
+    def get_snakemake_params(self) -> Dict[str, str]:
+        """
+        Returns
+        -------
+        Dict[str, str]
+            Snakemake parameters (without prefix) pointing Snakemake to the caches
+        """
+        return {
+            "conda-prefix": str(
+                self.__cache_dir.joinpath(self.__class__.SNAKEMAKE_CONDA_DIR)
+            ),
+            "apptainer-prefix": str(
+                self.__cache_dir.joinpath(self.__class__.SNAKEMAKE_CONTAINER_DIR)
+            ),
+        }
+
+    @contextmanager
+    def in_use(self) -> Iterator[None]:
+        """
+        Registers a running workflow, so the entries it uses are not evicted.
+        Waits for a running eviction to finish.
+        """
+        marker_path = self.__runs_dir.joinpath(uuid.uuid4().hex)
+        with self.__lock_path.open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                # The modification time of the marker is the start of the run
+                marker_file = marker_path.open("w")
+                fcntl.flock(marker_file, fcntl.LOCK_EX)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        try:
+            yield
+        finally:
+            marker_path.unlink(missing_ok=True)
+            marker_file.close()
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits into its maximum size,
+        keeping the entries which might be used by running workflows.
+        Skipped if another eviction is running or the last eviction was less than `EVICTION_INTERVAL` ago.
+
+        Returns
+        -------
+        int
+            Number of freed bytes
+        """
+        try:
+            if (
+                time.time() - self.__eviction_stamp_path.stat().st_mtime
+                < self.__class__.EVICTION_INTERVAL
+            ):
+                return 0
+        except FileNotFoundError:
+            pass
+        with self.__lock_path.open("a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            try:
+                self.__eviction_stamp_path.touch()
+                oldest_run_start = self.__get_oldest_run_start()
+                entries = sorted(self.__get_entries())
+                total_size = sum(size for _, size, _ in entries)
+                freed_size = 0
+                for last_used, size, path in entries:
+                    if total_size - freed_size <= self.__max_size:
+                        break
+                    # Entries are sorted by last usage, so all remaining ones might be in use as well
+                    if (
+                        oldest_run_start is not None
+                        and last_used
+                        >= oldest_run_start - self.__class__.ATIME_GRANULARITY
+                    ):
+                        break
+                    if path.is_dir() and not path.is_symlink():
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        path.unlink(missing_ok=True)
+                    freed_size += size
+                return freed_size
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __get_oldest_run_start(self) -> Optional[float]:
+        """
+        Removes markers of crashed workflows, i.e. markers which are not locked anymore.
+        Must be called with the exclusive lock held, so no marker is created meanwhile.
+
+        Returns
+        -------
+        Optional[float]
+            Start (timestamp) of the oldest running workflow or None if no workflow is running
+        """
+        oldest_run_start: Optional[float] = None
+        for marker_path in self.__runs_dir.iterdir():
+            try:
+                with marker_path.open("r") as marker_file:
+                    try:
+                        fcntl.flock(marker_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        run_start = os.fstat(marker_file.fileno()).st_mtime
+                        if oldest_run_start is None or run_start < oldest_run_start:
+                            oldest_run_start = run_start
+                        continue
+                    marker_path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                # Finished meanwhile
+                continue
+        return oldest_run_start
+
+    def __get_entries(self) -> List[Tuple[float, int, Path]]:
+        """
+        Returns
+        -------
+        List[Tuple[float, int, Path]]
+            Last usage (timestamp), size in bytes and path of each evictable entry
+        """
+        entries: List[Tuple[float, int, Path]] = []
+        for directory in self.__class__.EVICTABLE_DIRS:
+            for entry in self.__cache_dir.joinpath(directory).iterdir():
+                # Lock files of the engines
+                if entry.suffix == ".lock":
+                    continue
+                entries.append((*self.__class__.__get_usage(entry), entry))
+        return entries
+
+    @classmethod
+    def __get_usage(cls, path: Path) -> Tuple[float, int]:
+        """
+        Parameters
+        ----------
+        path : Path
+            File or folder
+
+        Returns
+        -------
+        Tuple[float, int]
+            Newest usage and size in bytes of the file or all files in the folder. Symlinks are not followed.
+        """
+        last_used, size = cls.__get_stat_usage(path.lstat())
+        if path.is_dir() and not path.is_symlink():
+            for root, directories, files in os.walk(path):
+                for name in directories + files:
+                    try:
+                        file_last_used, file_size = cls.__get_stat_usage(
+                            os.lstat(os.path.join(root, name))
+                        )
+                    except FileNotFoundError:
+                        continue
+                    last_used = max(last_used, file_last_used)
+                    size += file_size
+        return (last_used, size)
+
+    @classmethod
+    def __get_stat_usage(cls, stat: os.stat_result) -> Tuple[float, int]:
+        """
+        Parameters
+        ----------
+        stat : os.stat_result
+            Status of a file or folder
+
+        Returns
+        -------
+        Tuple[float, int]
+            Newest usage and size in bytes. For folders only the modification time is used,
+            as listing them, e.g. by `evict()` itself, updates their access time.
+        """
+        if S_ISDIR(stat.st_mode):
+            return (stat.st_mtime, stat.st_size)
+        return (max(stat.st_atime, stat.st_mtime), stat.st_size)
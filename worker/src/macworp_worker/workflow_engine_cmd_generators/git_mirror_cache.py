@@ -0,0 +1,188 @@
+"""Shared cache of bare mirrors for remote workflow repositories."""
+
+# std imports
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import os
+from pathlib import Path
+import shutil
+from time import sleep
+from typing import Any, Callable, ClassVar, Iterator
+
+# 3rd party imports
+from git import Repo as GitRepo
+from git.exc import GitCommandError
+
+
+class GitMirrorCache:
+    """
+    Keeps one bare mirror per repository URL, shared by all executors of the worker.
+    The mirror is cloned once and fetched incrementally afterwards. Pinned versions (tags, commits)
+    already contained in the mirror are checked out without contacting the remote,
+    branches are fetched before each checkout as they might have moved.
+    Checkouts are `git worktree`s of the mirror, so no objects are copied.
+
+    Each mirror is guarded by an exclusive `flock` on `<mirror>.lock`, so concurrent executors
+    do not fetch into or add worktrees to the same mirror simultaneously.
+    """
+
+    GIT_CMD_RETRIES: ClassVar[int] = 3
+    """Number of retries for cloning or fetching a mirror"""
+
+    GIT_CMD_RETRY_DELAY: ClassVar[int] = 10
+    """Seconds between retries"""
+
+    def __init__(self, cache_dir: Path):
+        """
+        Parameters
+        ----------
+        cache_dir : Path
+            Folder containing the mirrors, created if missing
+        """
+        self.__cache_dir = cache_dir
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_mirror_path(self, url: str) -> Path:
+        """
+        Parameters
+        ----------
+        url : str
+            Repository URL
+
+        Returns
+        -------
+        Path
+            Path of the bare mirror of the repository
+        """
+        return self.__cache_dir.joinpath(
+            f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.git"
+        )
+
+    def checkout(self, url: str, version: str, local_repo_path: Path) -> Path:
+        """
+        Checks out the given version of the repository as detached worktree.
+        An existing folder at `local_repo_path`, e.g. of a previous attempt, is replaced.
+
+        Parameters
+        ----------
+        url : str
+            Repository URL
+        version : str
+            Branch, tag or commit
+        local_repo_path : Path
+            Folder for the checkout
+
+        Returns
+        -------
+        Path
+            Path of the checkout
+
+        Raises
+        ------
+        GitCommandError
+            If the mirror could not be cloned or fetched or the version does not exist
+        """
+        mirror_path = self.get_mirror_path(url)
+        with self.__lock(mirror_path):
+            if not mirror_path.is_dir():
+                self.__class__.__clone_mirror(url, mirror_path)
+                repo = GitRepo(mirror_path)
+            else:
+                repo = GitRepo(mirror_path)
+                if not self.__class__.__is_pinned(repo, version):
+                    self.__class__.__with_retries(
+                        lambda: repo.remotes.origin.fetch(prune=True)
+                    )
+            if local_repo_path.exists():
+                shutil.rmtree(local_repo_path)
+            # Forget worktrees whose folders were removed by the cleanup of finished runs
+            repo.git.worktree("prune")
+            repo.git.worktree(
+                "add", "--detach", "--force", str(local_repo_path), f"{version}^{{commit}}"
+            )
+        return local_repo_path
+
+    @classmethod
+    def __is_pinned(cls, repo: GitRepo, version: str) -> bool:
+        """
+        Parameters
+        ----------
+        repo : GitRepo
+            Mirror
+        version : str
+            Branch, tag or commit
+
+        Returns
+        -------
+        bool
+            True if the version is contained in the mirror and is not a branch
+        """
+        try:
+            repo.git.rev_parse("--verify", "--quiet", f"refs/heads/{version}")
+            return False
+        except GitCommandError:
+            pass
+        try:
+            repo.git.rev_parse("--verify", "--quiet", f"{version}^{{commit}}")
+            return True
+        except GitCommandError:
+            return False
+
+    @classmethod
+    def __clone_mirror(cls, url: str, mirror_path: Path):
+        """
+        Clones the mirror into a temporary folder first,
+        so an interrupted clone does not leave a broken mirror behind.
+
+        Parameters
+        ----------
+        url : str
+            Repository URL
+        mirror_path : Path
+            Path of the mirror
+        """
+        temporary_mirror_path = mirror_path.with_suffix(f".{os.getpid()}.tmp")
+
+        def clone():
+            shutil.rmtree(temporary_mirror_path, ignore_errors=True)
+            GitRepo.clone_from(url, temporary_mirror_path, mirror=True)
+
+        cls.__with_retries(clone)
+        os.replace(temporary_mirror_path, mirror_path)
+
+    @classmethod
+    def __with_retries(cls, git_cmd: Callable[[], Any]):
+        """
+        Calls the given function, retrying on `GitCommandError`, e.g. due to network issues.
+
+        Parameters
+        ----------
+        git_cmd : Callable[[], Any]
+            Function executing the git command
+        """
+        for attempt in range(cls.GIT_CMD_RETRIES + 1):
+            try:
+                git_cmd()
+                return
+            except GitCommandError as e:
+                if attempt == cls.GIT_CMD_RETRIES:
+                    raise e
+                sleep(cls.GIT_CMD_RETRY_DELAY)
+
+    @contextmanager
+    def __lock(self, mirror_path: Path) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the mirror.
+
+        Parameters
+        ----------
+        mirror_path : Path
+            Path of the mirror
+        """
+        with mirror_path.with_suffix(".lock").open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
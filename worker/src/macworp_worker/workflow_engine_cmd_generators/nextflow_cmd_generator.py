@@ -21,6 +21,9 @@ class NextflowCmdGenerator(CmdGenerator):
     WORKFLOW_ENGINE_PARAMETER_PREFIX: ClassVar[str] = "-"
     """Prefix for workflow engine parameters"""
 
+    TRACE_DIRECTORY: ClassVar[Path] = Path(".macworp_cache", "task_metrics")
+    """Folder for the trace files within the project directory, read by the backend's `TaskMetrics`"""
+
     def generate_command(
         self,
         project_dir: Path,
@@ -45,6 +48,8 @@ class NextflowCmdGenerator(CmdGenerator):
         kwargs :
             Additional keyword arguments, e.g. workflow engine version.
                 * `nextflow_version`: Changes the used Nextflow version.
+                * `execution_dir`: Directory the workflow is executed in and writes its outputs to,
+                  e.g. the run folder of a parameter sweep. Defaults to the project directory.
 
         Returns
         -------
@@ -55,12 +60,22 @@ class NextflowCmdGenerator(CmdGenerator):
 
         command: List[str] = []
 
+        environment: List[str] = []
         if kwargs["nextflow_version"] is not None and isinstance(kwargs["nextflow_version"], str) and kwargs["nextflow_version"] != "":
-            command += [
-                "env",
-                f"NXF_VER={kwargs['nextflow_version']}"
+            environment.append(f"NXF_VER={kwargs['nextflow_version']}")
+
+        # Use the worker's shared caches for plugins, Conda environments and container images
+        if self.engine_asset_cache is not None:
+            environment += [
+                f"{name}={value}"
+                for name, value in (
+                    self.engine_asset_cache.get_nextflow_environment().items()
+                )
             ]
 
+        if len(environment) > 0:
+            command += ["env", *environment]
+
         # Start `nextflow run -work-dir ... -with-weblog ...`
         command += [
             str(self.workflow_engine_executable),
@@ -75,7 +90,17 @@ class NextflowCmdGenerator(CmdGenerator):
         ]
 
         # Add developer defined workflow engine parameters, e.g. "-profile docker"
-        command += self.__class__.get_workflow_engine_params(workflow_settings)
+        workflow_engine_params = self.__class__.get_workflow_engine_params(
+            workflow_settings
+        )
+        command += workflow_engine_params
+
+        # Record per-task resource usage, unless the developer configured a trace already
+        if project_params.run_id is not None and "-with-trace" not in workflow_engine_params:
+            command += [
+                "-with-trace",
+                str(self.__class__.prepare_trace_path(project_dir, project_params.run_id)),
+            ]
 
         # Add workflow source
         command += self.get_workflow_source(workflow_settings, work_dir)
@@ -85,13 +110,40 @@ class NextflowCmdGenerator(CmdGenerator):
             project_dir, project_params.workflow_arguments
         )
 
-        # Add workflow dynamic parameters
+        # Add workflow static parameters. Their paths, e.g. output folders, are resolved against
+        # the execution directory, so concurrent runs of a sweep do not write into the same folders.
         command += self.get_workflow_arguments(
-            project_dir, workflow_settings["parameters"]["static"], is_static=True
+            kwargs.get("execution_dir", project_dir),
+            workflow_settings["parameters"]["static"],
+            is_static=True,
         )
 
         return command
 
+    @classmethod
+    def prepare_trace_path(cls, project_dir: Path, run_id: int) -> Path:
+        """
+        Creates the trace folder and removes the trace of a previous attempt of the run,
+        as Nextflow refuses to overwrite existing trace files.
+
+        Parameters
+        ----------
+        project_dir : Path
+            Path to the project directory
+        run_id : int
+            Run ID
+
+        Returns
+        -------
+        Path
+            Path of the trace file
+        """
+        trace_directory = project_dir.joinpath(cls.TRACE_DIRECTORY)
+        trace_directory.mkdir(parents=True, exist_ok=True)
+        trace_path = trace_directory.joinpath(f"run_{run_id}.tsv")
+        trace_path.unlink(missing_ok=True)
+        return trace_path
+
     def get_workflow_source(
         self, workflow_settings: Dict[str, Any], work_dir: Path
     ) -> List[str]:
@@ -104,15 +156,9 @@ class NextflowCmdGenerator(CmdGenerator):
                 directory = directory.joinpath(workflow_source["script"])
                 return [str(directory)]
             case "remote":
-                local_repo_path = work_dir.joinpath("workflow_repo")
-                if not local_repo_path.exists():
-                    self.__class__.clone_git_repository(
-                        local_repo_path,
-                        workflow_source["url"],
-                        workflow_source["version"],
-                    )
-                else:
-                    self.__class__.update_git_repository(local_repo_path, workflow_source["version"])
+                local_repo_path = self.checkout_workflow_repository(
+                    workflow_source, work_dir
+                )
                 directory = local_repo_path.joinpath("main.nf")
                 return [str(directory)]
             case "nf-core":
@@ -36,7 +36,7 @@ class SnakemakeCmdGenerator(CmdGenerator):
         command = [
             str(self.workflow_engine_executable),
             "--directory",
-            str(project_dir),
+            str(kwargs.get("execution_dir", project_dir)),
             "--default-resources",
             f"tmpdir='{str(work_dir)}'",
             "--wms-monitor",
@@ -50,6 +50,19 @@ class SnakemakeCmdGenerator(CmdGenerator):
         # Add developer defined workflow engine parameters, e.g. "-profile docker"
         command += self.__class__.get_workflow_engine_params(workflow_settings)
 
+        # Use the worker's shared caches for Conda environments and container images,
+        # unless the developer configured other locations
+        if self.engine_asset_cache is not None:
+            developer_params = {
+                param["name"] for param in workflow_settings["engine_parameters"]
+            }
+            for name, value in self.engine_asset_cache.get_snakemake_params().items():
+                if name not in developer_params:
+                    command += [
+                        f"{self.__class__.WORKFLOW_ENGINE_PARAMETER_PREFIX}{name}",
+                        value,
+                    ]
+
         # Add workflow source
         command += self.get_workflow_source(workflow_settings, work_dir=work_dir)
 
@@ -60,9 +73,12 @@ class SnakemakeCmdGenerator(CmdGenerator):
             project_dir, project_params.workflow_arguments
         )
 
-        # Add workflow dynamic parameters
+        # Add workflow static parameters. Their paths, e.g. output folders, are resolved against
+        # the execution directory, so concurrent runs of a sweep do not write into the same folders.
         config_params += self.get_workflow_arguments(
-            project_dir, workflow_settings["parameters"]["static"], is_static=True
+            kwargs.get("execution_dir", project_dir),
+            workflow_settings["parameters"]["static"],
+            is_static=True,
         )
 
         if len(config_params) > 0:
@@ -102,15 +118,9 @@ class SnakemakeCmdGenerator(CmdGenerator):
                 directory = directory.joinpath(workflow_source["script"])
                 return ["--snakefile", str(directory)]
             case "remote":
-                local_repo_path = work_dir.joinpath("workflow_repo")
-                if not local_repo_path.exists():
-                    self.__class__.clone_git_repository(
-                        local_repo_path,
-                        workflow_source["url"],
-                        workflow_source["version"],
-                    )
-                else:
-                    self.__class__.update_git_repository(local_repo_path, workflow_source["version"])
+                local_repo_path = self.checkout_workflow_repository(
+                    workflow_source, work_dir
+                )
                 return [
                     "--snakefile",
                     str(local_repo_path.joinpath("Snakefile")),